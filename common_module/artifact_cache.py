@@ -0,0 +1,213 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+from common_module.aws_util import s3_client
+from common_module.logger_util import get_custom_logger
+from common_module import metrics_util
+
+logger = get_custom_logger()
+
+
+class ArtifactCache:
+    """S3上のモデルやLabelEncoderをデシリアライズした状態でプロセス内に保持するキャッシュ
+
+    Lambdaのウォームコンテナでは、前回の起動で読み込んだ成果物を再利用する。
+    保持しているETagで条件付きGET(If-None-Match)を行い、S3側が更新されていない場合はダウンロードしない。
+    disk_dirを指定した場合はダウンロードしたバイナリをローカルにも保持し、
+    プロセスの再起動後やプロセスプールの各プロセスからも再利用する。
+    存在しない(NoSuchKey, 404)オブジェクトもrevalidate_secの間は記憶し、S3へ再度確認せずに同じ内容のClientErrorを送出する。
+    """
+
+    def __init__(self, disk_dir: Optional[str] = None, revalidate_sec: float = 60):
+        """
+        Args:
+            disk_dir (Optional[str]): ローカルに保持するディレクトリ。未指定の場合はメモリのみ
+            revalidate_sec (float): 前回の確認からこの秒数以内はS3への確認を行わずにメモリ上の値(存在しない場合は例外)を返す
+        """
+        self._disk_dir = disk_dir
+        self._revalidate_sec = revalidate_sec
+
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        # (bucket, key) -> (etag, 値, 確認日時)
+        self._entries = {}
+        # (bucket, key) -> (存在しない場合のClientErrorの引数, 確認日時)
+        self._not_found = {}
+        self._stats = {
+            "hits": 0,
+            "revalidated": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "not_found": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "ArtifactCache":
+        """環境変数からキャッシュを作成する
+
+        ARTIFACT_CACHE_DIR(空文字の場合はメモリのみ), ARTIFACT_CACHE_REVALIDATE_SEC を参照する
+        """
+        default_disk_dir = os.path.join(tempfile.gettempdir(), "bid_optimisation_ml", "artifact_cache")
+        return cls(
+            disk_dir=os.environ.get("ARTIFACT_CACHE_DIR", default_disk_dir) or None,
+            revalidate_sec=float(os.environ.get("ARTIFACT_CACHE_REVALIDATE_SEC", 60)),
+        )
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def clear(self):
+        """メモリ上の値を破棄する"""
+        with self._lock:
+            self._entries.clear()
+            self._not_found.clear()
+
+    def _key_lock(self, cache_key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(cache_key, threading.Lock())
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _disk_path(self, bucket: str, key: str) -> str:
+        name = hashlib.sha1(f"{bucket}/{key}".encode()).hexdigest()
+        return os.path.join(self._disk_dir, name)
+
+    def _read_disk(self, bucket: str, key: str):
+        if self._disk_dir is None:
+            return None, None
+
+        path = self._disk_path(bucket, key)
+        try:
+            with open(f"{path}.etag") as f:
+                etag = f.read()
+            with open(f"{path}.bin", "rb") as f:
+                return etag, f.read()
+        except FileNotFoundError:
+            return None, None
+
+    def _write_disk(self, bucket: str, key: str, etag: str, binary: bytes):
+        if self._disk_dir is None:
+            return
+
+        os.makedirs(self._disk_dir, exist_ok=True)
+        path = self._disk_path(bucket, key)
+        # 他のプロセスが読み込み途中のファイルを壊さないよう、一時ファイルに書いてから置き換える
+        for suffix, data, mode in [(".bin", binary, "wb"), (".etag", etag, "w")]:
+            tmp_path = f"{path}{suffix}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, mode) as f:
+                f.write(data)
+            os.replace(tmp_path, f"{path}{suffix}")
+
+    @staticmethod
+    def _get_object(bucket: str, key: str, etag: Optional[str]):
+        """S3からオブジェクトを取得する。etagと一致する(更新されていない)場合はNoneを返す"""
+        params = {"Bucket": bucket, "Key": key}
+        if etag is not None:
+            params["IfNoneMatch"] = etag
+
+        try:
+            res = s3_client().get_object(**params)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ["304", "NotModified"]:
+                return None, None
+            raise
+
+        return res["ETag"], res["Body"].read()
+
+    def get(self, bucket: str, key: str, deserializer: Callable[[bytes], Any]) -> Any:
+        """S3のオブジェクトをデシリアライズした値を返す
+
+        Args:
+            bucket (str): バケット名
+            key (str): キー
+            deserializer (Callable[[bytes], Any]): バイナリをデシリアライズする関数
+
+        Returns:
+            Any: デシリアライズした値
+        """
+        cache_key = (bucket, key)
+        start = time.perf_counter()
+        with self._key_lock(cache_key):
+            with self._lock:
+                not_found = self._not_found.get(cache_key)
+            if not_found is not None and time.monotonic() - not_found[1] < self._revalidate_sec:
+                self._count("not_found")
+                raise ClientError(*not_found[0])
+
+            try:
+                status, value = self._get(bucket, key, deserializer)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ["NoSuchKey", "404"]:
+                    with self._lock:
+                        self._entries.pop(cache_key, None)
+                        self._not_found[cache_key] = ((e.response, e.operation_name), time.monotonic())
+                    self._count("not_found")
+                    logger.info(f"artifact cache not_found: s3://{bucket}/{key}")
+                raise
+
+        elapsed = time.perf_counter() - start
+        self._count(status)
+        logger.info(f"artifact cache {status}: s3://{bucket}/{key} ({elapsed:.3f}s)")
+        metrics_util.record("artifact_load", elapsed, key=key, cache=status)
+
+        return value
+
+    def _get(self, bucket: str, key: str, deserializer: Callable[[bytes], Any]):
+        cache_key = (bucket, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+
+        if entry is not None:
+            etag, value, checked_at = entry
+            if time.monotonic() - checked_at < self._revalidate_sec:
+                return "hits", value
+
+            new_etag, binary = self._get_object(bucket, key, etag)
+            if new_etag is None:
+                self._store(cache_key, etag, value)
+                return "revalidated", value
+            status = "misses"
+        else:
+            etag, binary = self._read_disk(bucket, key)
+            new_etag, new_binary = self._get_object(bucket, key, etag)
+            if new_etag is None:
+                status = "disk_hits"
+                new_etag = etag
+            else:
+                status = "misses"
+                binary = new_binary
+
+        if status == "misses":
+            self._write_disk(bucket, key, new_etag, binary)
+
+        value = deserializer(binary)
+        self._store(cache_key, new_etag, value)
+        return status, value
+
+    def _store(self, cache_key, etag: str, value: Any):
+        with self._lock:
+            self._entries[cache_key] = (etag, value, time.monotonic())
+            self._not_found.pop(cache_key, None)
+
+
+_artifact_cache = None
+_artifact_cache_lock = threading.Lock()
+
+
+def get_artifact_cache() -> ArtifactCache:
+    """プロセス内で共有するArtifactCacheを返す。初回の呼び出し時に環境変数から作成する"""
+    global _artifact_cache
+    with _artifact_cache_lock:
+        if _artifact_cache is None:
+            _artifact_cache = ArtifactCache.from_env()
+        return _artifact_cache
@@ -1,11 +1,19 @@
-from .bigqueryservice import BigQueryService
+from .bigqueryservice import BigQueryService, query_cache_key
+from .result_cache import QueryResultCache
+from .template_registry import TemplateRegistry, template_registry
 from .funcs import (
     load_output_table_schema,
     format_to_bq_schema,
+    arrow_table_to_df,
 )
 
 __all__ = [
     BigQueryService,
+    query_cache_key,
+    QueryResultCache,
+    TemplateRegistry,
+    template_registry,
     load_output_table_schema,
     format_to_bq_schema,
+    arrow_table_to_df,
 ]
@@ -3,7 +3,6 @@ import datetime
 import traceback
 import json
 import hashlib
-import pickle
 import pandas as pd
 from typing import List, Dict, Any, Optional, Callable
 from io import BytesIO
@@ -12,7 +11,6 @@ from google.cloud import (
     bigquery,
 )
 from google.oauth2 import service_account
-from jinja2 import Environment, FileSystemLoader
 
 from common_module.aws_util import (
     s3_client,
@@ -21,10 +19,33 @@ from common_module.aws_util import (
     get_bucket_key_from_s3_uri,
 )
 from common_module.logger_util import get_custom_logger
+from .funcs import arrow_table_to_df
+from .result_cache import QueryResultCache
+from .template_registry import template_registry
 
 logger = get_custom_logger()
 
 
+def query_cache_key(sql: str, dtypes: Optional[Dict[str, Any]] = None) -> str:
+    """SQLと変換先のdtypeから、実行結果のキャッシュキーを作成する
+
+    dtypesは列名の順に並べ、dtypeを文字列にしたJSONとしてキーに含める。
+    同じSQLでもdtypeが異なれば別の結果となるため、別のキーとする。
+
+    Args:
+        sql (str): 実行するSQL
+        dtypes (Optional[Dict[str, Any]]): 列名とpandasのdtype
+
+    Returns:
+        str: キャッシュキー
+    """
+    if dtypes is None:
+        return hashlib.md5(sql.encode()).hexdigest()
+
+    canonical_dtypes = json.dumps({column: str(dtype) for column, dtype in dtypes.items()}, sort_keys=True)
+    return hashlib.md5(f"{sql}\n{canonical_dtypes}".encode()).hexdigest()
+
+
 class BigQueryService:
 
     CACHE_DIR = "/tmp/bid_optimisation_ml/bq_cache"
@@ -57,6 +78,7 @@ class BigQueryService:
         self._bigquery_client = bigquery.Client(
             project=self._project,
             credentials=credentials)
+        self._result_cache = None
 
     def __del__(self):
         self._storage_client.close()
@@ -109,26 +131,45 @@ class BigQueryService:
 
         load_job.result()
 
-    def get_df_by_query(self, sql: str, use_cache: bool = False):
+    @property
+    def result_cache(self) -> QueryResultCache:
+        """SQL実行結果のキャッシュ。初回参照時に環境変数の設定で作成する"""
+        if self._result_cache is None:
+            self._result_cache = QueryResultCache.from_env(self.CACHE_DIR)
+        return self._result_cache
+
+    def _query_to_df(self, sql: str, dtypes: Optional[Dict[str, str]] = None):
+        if dtypes is None:
+            return self._bigquery_client.query(sql).to_dataframe()
+
+        # Storage Read APIでArrowのまま受け取り、指定のdtypeへ1回で変換する
+        table = self._bigquery_client.query(sql).result().to_arrow(create_bqstorage_client=True)
+        return arrow_table_to_df(table, dtypes)
+
+    def get_df_by_query(
+        self, sql: str, use_cache: bool = False, cache_ttl: Optional[int] = None,
+        dtypes: Optional[Dict[str, str]] = None,
+    ):
         """BQに対してSQLを実行し、結果をpandas.DataFrameで返す
 
         Args:
             sql (str): 実行するSQL
+            use_cache (bool): 実行結果のキャッシュを使うか
+            cache_ttl (Optional[int]): キャッシュの有効期間(秒)。未指定の場合はキャッシュの既定値
+            dtypes (Optional[Dict[str, str]]): 列名とpandasのdtype。
+                指定した場合は結果をArrowで取得し、指定のdtypeに変換する
         """
-        cache_key = hashlib.md5(sql.encode()).hexdigest()
-        cache_path = f"{self.CACHE_DIR}/{cache_key}.pkl"
+        if not use_cache:
+            return self._query_to_df(sql, dtypes)
 
-        if use_cache and os.path.exists(cache_path):
+        cache_key = query_cache_key(sql, dtypes)
+        df = self.result_cache.get(cache_key, cache_ttl)
+        if df is not None:
             logger.info("using cache")
-            with open(cache_path, 'rb') as f:
-                return pickle.load(f)
-
-        df = self._bigquery_client.query(sql).to_dataframe()
+            return df
 
-        if use_cache:
-            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-            with open(cache_path, 'wb') as f:
-                pickle.dump(df, f)
+        df = self._query_to_df(sql, dtypes)
+        self.result_cache.put(cache_key, df)
 
         return df
 
@@ -141,15 +182,7 @@ class BigQueryService:
     def _get_query(self, template_root_dir: str,
                    filename: str, parameters: Dict[str, Any]):
 
-        env = Environment(
-            loader=FileSystemLoader(
-                template_root_dir,
-                encoding='utf8',
-            )
-        )
-        tpl = env.get_template(filename)
-
-        return tpl.render(parameters)
+        return template_registry.render(template_root_dir, filename, parameters)
 
     def append_from_query_tpl(
         self, template_root_dir: str,
@@ -264,13 +297,17 @@ class BigQueryService:
 
     def extract_to_df(self, template_root_dir: str,
                       filename: str, parameters: Dict[str, Any],
-                      use_cache: bool = False):
+                      use_cache: bool = False, cache_ttl: Optional[int] = None,
+                      dtypes: Optional[Dict[str, str]] = None):
         """bqに対するsql実行結果をpd.DataFrameで返す
 
         Args:
             template_root_dir (str): SQLテンプレートファイルディレクトリ
             filename (str): SQLファイル名
             parameters (Dict[str, Any]): テンプレートに与えるパラメータ辞書
+            use_cache (bool): 実行結果のキャッシュを使うか
+            cache_ttl (Optional[int]): キャッシュの有効期間(秒)。テンプレートごとに指定する
+            dtypes (Optional[Dict[str, str]]): 列名とpandasのdtype。テンプレートごとに指定する
 
         Returns:
             pd.DataFrame: sql実行結果
@@ -280,7 +317,7 @@ class BigQueryService:
             filename,
             parameters,
         )
-        return self.get_df_by_query(sql=sql, use_cache=use_cache)
+        return self.get_df_by_query(sql=sql, use_cache=use_cache, cache_ttl=cache_ttl, dtypes=dtypes)
 
     def extract_to_s3(self, template_root_dir: str,
                       filename: str, parameters: Dict[str, Any], *,
@@ -1,5 +1,9 @@
 import os
 import json
+from typing import Dict
+
+import pandas as pd
+import pyarrow as pa
 
 
 def load_output_table_schema(table_name):
@@ -19,3 +23,44 @@ def format_to_bq_schema(_df, table_name):
         df[column] = None
 
     return df.reindex(columns=schema_columns)[schema_columns]
+
+
+def _arrow_column_to_series(column: "pa.ChunkedArray", dtype) -> "pd.Series":
+    dtype = pd.api.types.pandas_dtype(dtype)
+
+    if isinstance(dtype, pd.api.extensions.ExtensionDtype) and hasattr(dtype, "__from_arrow__"):
+        return pd.Series(dtype.__from_arrow__(column))
+
+    if pd.api.types.is_datetime64_dtype(dtype):
+        if pa.types.is_date(column.type):
+            return pd.Series(column.to_pandas(date_as_object=False))
+        if pa.types.is_timestamp(column.type):
+            return pd.Series(column.to_pandas())
+        return pd.Series(pd.to_datetime(column.to_pandas()))
+
+    try:
+        return pd.Series(column.cast(pa.from_numpy_dtype(dtype)).to_pandas())
+    except pa.ArrowNotImplementedError:
+        # pyarrowのバージョンによってはdecimalなどからのcastに対応していない
+        return column.to_pandas().astype(dtype)
+
+
+def arrow_table_to_df(table: "pa.Table", dtypes: Dict[str, str]) -> "pd.DataFrame":
+    """Arrowのテーブルを列ごとに指定のdtypeのpandas.DataFrameに変換する
+
+    dtypesに含まれない列はArrowの型からの既定の変換となる
+
+    Args:
+        table (pa.Table): 変換するテーブル
+        dtypes (Dict[str, str]): 列名とpandasのdtype
+
+    Returns:
+        pd.DataFrame: 変換後のDataFrame
+    """
+    return pd.DataFrame({
+        name: (
+            _arrow_column_to_series(table.column(name), dtypes[name])
+            if name in dtypes else table.column(name).to_pandas()
+        )
+        for name in table.column_names
+    }, columns=table.column_names)
@@ -0,0 +1,87 @@
+import os
+from io import BytesIO
+from typing import Dict, Optional
+
+import pandas as pd
+
+from common_module.byte_cache import ByteCache
+from common_module.logger_util import get_custom_logger
+
+logger = get_custom_logger()
+
+
+class QueryResultCache:
+    """SQL実行結果をParquetで保持するキャッシュ
+
+    ローカル(/tmp)のキャッシュはバイト数の上限を超えた場合に最も長く参照されていないものから削除する。
+    s3_bucketを指定した場合はS3(MinIO)を共有キャッシュとして併用し、
+    コンテナ間や再実行(RERUNNABLE=yes)時にも結果を再利用する。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int = 256 * 1024 ** 2,
+        ttl_sec: int = 12 * 60 * 60,
+        s3_bucket: Optional[str] = None,
+        s3_prefix: str = "bq_cache/",
+    ):
+        """
+        Args:
+            cache_dir (str): ローカルキャッシュのディレクトリ
+            max_bytes (int): ローカルキャッシュの合計バイト数の上限
+            ttl_sec (int): キャッシュの有効期間(秒)。get時に個別に指定しない場合に使う
+            s3_bucket (Optional[str]): 共有キャッシュのバケット。未指定の場合はローカルのみ
+            s3_prefix (str): 共有キャッシュのキーのprefix
+        """
+        self._ttl_sec = ttl_sec
+        self._store = ByteCache(cache_dir, ".parquet", max_bytes, s3_bucket, s3_prefix, name="bq cache")
+
+    @classmethod
+    def from_env(cls, default_cache_dir: str) -> "QueryResultCache":
+        """環境変数からキャッシュを作成する
+
+        BQ_CACHE_DIR, BQ_CACHE_MAX_BYTES, BQ_CACHE_TTL_SEC, BQ_CACHE_S3_BUCKET, BQ_CACHE_S3_PREFIX を参照する
+        """
+        return cls(
+            cache_dir=os.environ.get("BQ_CACHE_DIR", default_cache_dir),
+            max_bytes=int(os.environ.get("BQ_CACHE_MAX_BYTES", 256 * 1024 ** 2)),
+            ttl_sec=int(os.environ.get("BQ_CACHE_TTL_SEC", 12 * 60 * 60)),
+            s3_bucket=os.environ.get("BQ_CACHE_S3_BUCKET") or None,
+            s3_prefix=os.environ.get("BQ_CACHE_S3_PREFIX", "bq_cache/"),
+        )
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return self._store.stats
+
+    def get(self, key: str, ttl_sec: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """キャッシュされたDataFrameを返す。存在しないか有効期限切れの場合はNoneを返す
+
+        Args:
+            key (str): キャッシュキー
+            ttl_sec (Optional[int]): 有効期間(秒)。未指定の場合はコンストラクタの値を使う
+
+        Returns:
+            Optional[pd.DataFrame]: キャッシュされたDataFrame
+        """
+        body, _ = self._store.get(key, self._ttl_sec if ttl_sec is None else ttl_sec)
+        if body is None:
+            return None
+        return pd.read_parquet(BytesIO(body))
+
+    def put(self, key: str, df: pd.DataFrame):
+        """DataFrameをキャッシュに保存する。Parquetに変換できない場合は保存しない
+
+        Args:
+            key (str): キャッシュキー
+            df (pd.DataFrame): 保存するDataFrame
+        """
+        buffer = BytesIO()
+        try:
+            df.to_parquet(buffer)
+        except Exception as e:
+            logger.warning(f"skip bq cache: {e}")
+            return
+
+        self._store.put(key, buffer.getvalue())
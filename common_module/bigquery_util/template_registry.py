@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+
+from jinja2 import Environment, FileSystemLoader
+
+
+class TemplateRegistry:
+    """SQLテンプレートのディレクトリごとにJinjaのEnvironmentを1回だけ作成し、
+    テンプレートのコンパイル結果とパラメータごとのレンダリング結果を使い回す
+    """
+
+    def __init__(self, max_rendered: int = 1024):
+        """
+        Args:
+            max_rendered (int): 保持するレンダリング結果の最大数
+        """
+        self._max_rendered = max_rendered
+        self._lock = threading.Lock()
+        self._environments = {}
+        self._rendered = OrderedDict()
+        self._stats = {}
+
+    def _environment(self, template_root_dir: str) -> Environment:
+        root = os.path.abspath(template_root_dir)
+        with self._lock:
+            if root not in self._environments:
+                env = Environment(
+                    loader=FileSystemLoader(root, encoding="utf8"),
+                    auto_reload=False,
+                    cache_size=-1,
+                )
+                # ディレクトリ内のテンプレートをまとめてコンパイルしておく
+                for name in env.list_templates(filter_func=lambda name: name.endswith(".sql")):
+                    env.get_template(name)
+                self._environments[root] = env
+
+            return self._environments[root]
+
+    @staticmethod
+    def _parameters_key(parameters: Dict[str, Any]) -> str:
+        return json.dumps(
+            dict(parameters), sort_keys=True, default=lambda o: f"{type(o).__name__}:{o}")
+
+    def _record(self, filename: str, elapsed: float, hit: bool):
+        stats = self._stats.setdefault(filename, {"renders": 0, "hits": 0, "render_sec": 0.0})
+        if hit:
+            stats["hits"] += 1
+        else:
+            stats["renders"] += 1
+            stats["render_sec"] += elapsed
+
+    def render(self, template_root_dir: str, filename: str, parameters: Dict[str, Any]) -> str:
+        """テンプレートをレンダリングしたSQLを返す
+
+        Args:
+            template_root_dir (str): SQLテンプレートファイルディレクトリ
+            filename (str): SQLファイル名
+            parameters (Dict[str, Any]): テンプレートに与えるパラメータ辞書
+
+        Returns:
+            str: レンダリングしたSQL
+        """
+        env = self._environment(template_root_dir)
+        key = (os.path.abspath(template_root_dir), filename, self._parameters_key(parameters))
+
+        with self._lock:
+            if key in self._rendered:
+                self._rendered.move_to_end(key)
+                self._record(filename, 0.0, hit=True)
+                return self._rendered[key]
+
+        start = time.perf_counter()
+        sql = env.get_template(filename).render(parameters)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._record(filename, elapsed, hit=False)
+            self._rendered[key] = sql
+            while len(self._rendered) > self._max_rendered:
+                self._rendered.popitem(last=False)
+
+        return sql
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """テンプレートごとのレンダリング回数、キャッシュヒット数、レンダリング時間(秒)"""
+        with self._lock:
+            return {filename: dict(stats) for filename, stats in self._stats.items()}
+
+
+# プロセス内で共有するレジストリ
+template_registry = TemplateRegistry()
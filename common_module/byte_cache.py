@@ -0,0 +1,202 @@
+import os
+import time
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from common_module.aws_util import s3_client
+from common_module.logger_util import get_custom_logger
+
+logger = get_custom_logger()
+
+
+class ByteCache:
+    """バイナリをキーごとにローカル(/tmp)のファイルで保持し、S3(MinIO)を共有キャッシュとして併用するキャッシュ
+
+    QueryResultCache, PredictionCacheの保存先として、シリアライズ済みのバイナリのみを扱う。
+    ローカルのキャッシュはバイト数の上限を超えた場合に最も長く参照されていないものから削除する。
+    ファイルの更新日時(mtime)を作成日時、アクセス日時(atime)を最終参照日時として扱う。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        suffix: str,
+        max_bytes: int,
+        s3_bucket: Optional[str] = None,
+        s3_prefix: str = "",
+        name: str = "cache",
+    ):
+        """
+        Args:
+            cache_dir (str): ローカルキャッシュのディレクトリ
+            suffix (str): ファイル名・S3のキーの拡張子(.parquetなど)
+            max_bytes (int): ローカルキャッシュの合計バイト数の上限
+            s3_bucket (Optional[str]): 共有キャッシュのバケット。未指定の場合はローカルのみ
+            s3_prefix (str): 共有キャッシュのキーのprefix
+            name (str): ログに出力するキャッシュの名前
+        """
+        self._cache_dir = cache_dir
+        self._suffix = suffix
+        self._max_bytes = max_bytes
+        self._s3_bucket = s3_bucket
+        self._s3_prefix = s3_prefix
+        self._name = name
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "s3_hits": 0,
+            "misses": 0,
+            "bytes_read": 0,
+            "bytes_written": 0,
+            "evictions": 0,
+        }
+        self._index = self._load_index()
+        self._total_bytes = sum(self._index.values())
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self._stats[name] += value
+
+    def path(self, key: str) -> str:
+        """ローカルキャッシュのファイルのパス"""
+        return os.path.join(self._cache_dir, f"{key}{self._suffix}")
+
+    def _s3_key(self, key: str) -> str:
+        return f"{self._s3_prefix}{key}{self._suffix}"
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        """既存のローカルキャッシュを最終参照日時の古い順に並べる"""
+        if not os.path.isdir(self._cache_dir):
+            return OrderedDict()
+
+        entries = []
+        for filename in os.listdir(self._cache_dir):
+            if not filename.endswith(self._suffix):
+                continue
+            stat = os.stat(os.path.join(self._cache_dir, filename))
+            entries.append((stat.st_atime, filename[:-len(self._suffix)], stat.st_size))
+
+        return OrderedDict((key, size) for _, key, size in sorted(entries))
+
+    def _set_index(self, key: str, size: int):
+        self._total_bytes += size - self._index.get(key, 0)
+        self._index[key] = size
+        self._index.move_to_end(key)
+
+    def _remove(self, key: str):
+        self._total_bytes -= self._index.pop(key, 0)
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self._index and self._total_bytes > self._max_bytes:
+            self._remove(next(iter(self._index)))
+            self._stats["evictions"] += 1
+
+    def _write_local(self, key: str, body: bytes, created: float):
+        os.makedirs(self._cache_dir, exist_ok=True)
+        path = self.path(key)
+        # 並行するプロセスが書きかけのファイルを読まないよう、一時ファイルから置き換える
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.utime(tmp_path, (time.time(), created))
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._set_index(key, len(body))
+            self._evict()
+
+    def _get_local(self, key: str, ttl_sec: Optional[float]) -> Optional[bytes]:
+        path = self.path(key)
+        try:
+            created = os.stat(path).st_mtime
+            if ttl_sec is not None and time.time() - created > ttl_sec:
+                with self._lock:
+                    self._remove(key)
+                return None
+
+            with open(path, "rb") as f:
+                body = f.read()
+            os.utime(path, (time.time(), created))
+        except FileNotFoundError:
+            with self._lock:
+                self._total_bytes -= self._index.pop(key, 0)
+            return None
+
+        with self._lock:
+            self._set_index(key, len(body))
+
+        return body
+
+    def _get_s3(self, key: str, ttl_sec: Optional[float]) -> Optional[bytes]:
+        try:
+            response = s3_client().get_object(Bucket=self._s3_bucket, Key=self._s3_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ["NoSuchKey", "404"]:
+                logger.warning(f"failed to read {self._name} from s3: {e}")
+            return None
+        except Exception as e:
+            logger.warning(f"failed to read {self._name} from s3: {e}")
+            return None
+
+        created = response["LastModified"].timestamp()
+        if ttl_sec is not None and time.time() - created > ttl_sec:
+            return None
+
+        body = response["Body"].read()
+        self._write_local(key, body, created)
+
+        return body
+
+    def get(self, key: str, ttl_sec: Optional[float] = None) -> Tuple[Optional[bytes], str]:
+        """キャッシュされたバイナリを、ローカル・S3の順に探して返す
+
+        Args:
+            key (str): キャッシュキー
+            ttl_sec (Optional[float]): 有効期間(秒)。未指定の場合は期限なし
+
+        Returns:
+            Tuple[Optional[bytes], str]: バイナリ(存在しないか有効期限切れの場合はNone)と、hits, s3_hits, missesのいずれか
+        """
+        body = self._get_local(key, ttl_sec)
+        status = "hits"
+        if body is None and self._s3_bucket is not None:
+            body = self._get_s3(key, ttl_sec)
+            status = "s3_hits"
+        if body is None:
+            status = "misses"
+
+        self._count(status)
+        if body is not None:
+            self._count("bytes_read", len(body))
+
+        return body, status
+
+    def put(self, key: str, body: bytes):
+        """バイナリをローカルと、s3_bucketを指定した場合はS3に保存する
+
+        Args:
+            key (str): キャッシュキー
+            body (bytes): 保存するバイナリ
+        """
+        self._write_local(key, body, time.time())
+        if self._s3_bucket is not None:
+            try:
+                s3_client().put_object(Bucket=self._s3_bucket, Key=self._s3_key(key), Body=body)
+            except Exception as e:
+                logger.warning(f"failed to write {self._name} to s3: {e}")
+
+        self._count("bytes_written", len(body))
@@ -3,6 +3,7 @@ import time
 import random
 from common_module.logger_util import get_custom_logger
 from common_module.aws_util import write_df_to_s3, write_binary_to_s3, read_binary_from_s3, copy_s3_file
+from common_module.artifact_cache import get_artifact_cache
 
 logger = get_custom_logger()
 
@@ -16,6 +17,10 @@ CVR_LATEST_MODEL_BIN_KEY = "cvr/model/latest.bin"
 SPA_LATEST_LABEL_ENCODER_PREFIX = "spa/model/latest_le/"
 SPA_LATEST_MODEL_BIN_KEY = "spa/model/latest.bin"
 
+CPC_LATEST_BUNDLE_KEY = "cpc/model/latest_bundle.bin"
+CVR_LATEST_BUNDLE_KEY = "cvr/model/latest_bundle.bin"
+SPA_LATEST_BUNDLE_KEY = "spa/model/latest_bundle.bin"
+
 
 def output_preprocess_to_s3_manager(s3_bucket, s3_key):
     def _output_preprocess_to_s3(df):
@@ -94,6 +99,31 @@ def write_latest_model_manager(s3_bucket, s3_key, s3_latest_key=None):
     return _write_latest_model
 
 
+def write_latest_bundle_manager(s3_bucket, s3_key, s3_latest_key, bundle):
+    """モデルとLabelEncoderを1つの成果物(bundle)にまとめて出力する関数を作成する
+
+    LabelEncoderはbundleに追加するのみで、モデルを受け取った時点でbundleをs3_keyに出力し、
+    s3_latest_keyにコピーする。そのためLabelEncoderを全て書き込んだ後にモデルを書き込むこと。
+
+    Args:
+        s3_bucket (str): バケット名
+        s3_key (str): 出力するキー
+        s3_latest_key (str): 最新の成果物のキー
+        bundle (ModelBundle): まとめる先のbundle
+
+    Returns:
+        Tuple[Callable[[bytes, str], None], Callable[[bytes], None]]: LabelEncoderとモデルの書き込み関数
+    """
+    def _write_labelencoder(binary, name):
+        bundle.add_label_encoder(name, binary)
+
+    def _write_model(binary):
+        bundle.set_model(binary)
+        write_latest_model_manager(s3_bucket, s3_key, s3_latest_key)(bundle.to_bytes())
+
+    return _write_labelencoder, _write_model
+
+
 def _get_labelencoder_name(s3_prefix, name):
     return f"{os.path.join(s3_prefix, name)}.bin"
 
@@ -128,3 +158,31 @@ def read_s3_manager(s3_bucket, s3_key):
         return read_binary_from_s3(s3_bucket, s3_key)
 
     return _read_s3_manager
+
+
+def read_cached_s3_manager(s3_bucket, s3_key, deserializer):
+    """S3のバイナリをデシリアライズした値を、プロセス内のArtifactCacheを介して返す関数を作成する
+
+    Args:
+        s3_bucket (str): バケット名
+        s3_key (str): キー
+        deserializer (Callable[[bytes], Any]): バイナリをデシリアライズする関数
+    """
+    def _read_cached_s3():
+        return get_artifact_cache().get(s3_bucket, s3_key, deserializer)
+
+    return _read_cached_s3
+
+
+def read_cached_labelencoder_manager(s3_bucket, s3_prefix, deserializer):
+    """LabelEncoderをデシリアライズした値を、プロセス内のArtifactCacheを介して返す関数を作成する
+
+    Args:
+        s3_bucket (str): バケット名
+        s3_prefix (str): LabelEncoderのprefix
+        deserializer (Callable[[bytes], Any]): バイナリをデシリアライズする関数
+    """
+    def _read_cached_labelencoder(name):
+        return get_artifact_cache().get(s3_bucket, _get_labelencoder_name(s3_prefix, name), deserializer)
+
+    return _read_cached_labelencoder
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List
+
+import pandas as pd
+
+from common_module.logger_util import get_custom_logger
+
+logger = get_custom_logger()
+
+_lock = threading.Lock()
+# 実行中のunitのタグ。スレッド・タスクごとに保持し、並行に処理するunitのタグが混ざらないようにする
+_tags = contextvars.ContextVar("metrics_tags", default={})
+# collect内で記録したメトリクスの格納先。Noneの場合は_recordsに保持して出力する
+_collector = contextvars.ContextVar("metrics_collector", default=None)
+_records = []
+
+
+def _frames(values) -> List[pd.DataFrame]:
+    if isinstance(values, pd.DataFrame):
+        return [values]
+    if isinstance(values, (list, tuple)):
+        return [v for value in values for v in _frames(value)]
+    if isinstance(values, dict):
+        return _frames(list(values.values()))
+    return []
+
+
+def _rows(values) -> int:
+    return sum(len(df) for df in _frames(values))
+
+
+def _memory_bytes(values) -> int:
+    return int(sum(df.memory_usage(index=True, deep=False).sum() for df in _frames(values)))
+
+
+def _emit(record: Dict[str, Any]):
+    """METRICS_FORMAT=datadogの場合はDatadogのログ形式、それ以外はJSONで出力する"""
+    if os.environ.get("METRICS_FORMAT", "json") == "datadog":
+        tags = ",".join(
+            f"{k}:{v}" for k, v in record.items()
+            if k not in ["metric", "duration_sec", "rows_in", "rows_out", "memory_bytes"]
+        )
+        timestamp = int(time.time())
+        for value_name in ["duration_sec", "rows_in", "rows_out", "memory_bytes"]:
+            logger.info(
+                f"MONITORING|{timestamp}|{record[value_name]}|gauge"
+                f"|bid_optimisation_ml.{record['metric']}.{value_name}|#{tags}"
+            )
+    else:
+        logger.info(json.dumps(record, default=str))
+
+
+def set_tags(**tags):
+    """以降に記録するメトリクスに付与するタグ(unitの識別子など)を設定する
+
+    タグは現在のコンテキスト(スレッド・asyncioのタスク)にのみ設定する。
+    スレッドプールで実行する処理へは、contextvars.copy_context().runで引き継ぐ。
+    """
+    _tags.set(dict(tags))
+
+
+def reset():
+    """記録したメトリクスとタグを破棄する"""
+    _tags.set({})
+    with _lock:
+        _records.clear()
+
+
+def record(metric: str, duration_sec: float, inputs: Any = None, outputs: Any = None, **tags):
+    """処理1回分のメトリクスを出力し、サマリー用に保持する
+
+    Args:
+        metric (str): メトリクス名(処理名)
+        duration_sec (float): 所要時間(秒)
+        inputs (Any): 処理の入力。含まれるDataFrameの行数を入力行数とする
+        outputs (Any): 処理の出力。含まれるDataFrameの行数とメモリ使用量を出力する
+        tags: 付与するタグ
+
+    Returns:
+        Dict[str, Any]: 出力したメトリクス
+    """
+    row = {
+        "metric": metric,
+        "duration_sec": round(duration_sec, 6),
+        "rows_in": _rows(inputs),
+        "rows_out": _rows(outputs),
+        "memory_bytes": _memory_bytes(outputs),
+    }
+    row.update(_tags.get())
+    row.update(tags)
+    collector = _collector.get()
+    if collector is not None:
+        collector.append(row)
+        return row
+
+    with _lock:
+        _records.append(row)
+
+    _emit(row)
+    return row
+
+
+@contextmanager
+def collect():
+    """with内で記録したメトリクスを、出力せずにyieldしたリストに集める
+
+    プロセスプールで実行する処理のメトリクスを親プロセスへ返し、addで親プロセスの記録に加えるために使う。
+    """
+    records = []
+    token = _collector.set(records)
+    try:
+        yield records
+    finally:
+        _collector.reset(token)
+
+
+def add(records: Iterable[Dict[str, Any]]):
+    """collectで集めたメトリクスに現在のタグを付与して記録し、出力する
+
+    Args:
+        records (Iterable[Dict[str, Any]]): collectで集めたメトリクス
+    """
+    for record in records:
+        row = {**_tags.get(), **record}
+        with _lock:
+            _records.append(row)
+        _emit(row)
+
+
+def count(metric: str, tag: str) -> Dict[Any, int]:
+    """記録済みのメトリクスのうちmetricの回数を、tagの値ごとに数える
+
+    Args:
+        metric (str): メトリクス名
+        tag (str): 集計するタグ
+
+    Returns:
+        Dict[Any, int]: タグの値ごとの回数
+    """
+    with _lock:
+        values = [row.get(tag) for row in _records if row["metric"] == metric]
+
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    return counts
+
+
+class Measurement:
+    """measureで計測中の処理の入出力を保持する"""
+
+    def __init__(self, inputs=None):
+        self.inputs = inputs
+        self.outputs = None
+
+
+@contextmanager
+def measure(metric: str, inputs: Any = None, **tags):
+    """with内の処理の所要時間を計測し、終了時にメトリクスを出力する
+
+    出力のDataFrameはyieldしたMeasurementのoutputsに設定する。
+
+    Args:
+        metric (str): メトリクス名(処理名)
+        inputs (Any): 処理の入力
+        tags: 付与するタグ
+    """
+    measurement = Measurement(inputs)
+    start = time.perf_counter()
+    try:
+        yield measurement
+    finally:
+        record(metric, time.perf_counter() - start, measurement.inputs, measurement.outputs, **tags)
+
+
+def instrument(metric: str = None, **tags):
+    """関数の所要時間と、引数・戻り値のDataFrameの行数を計測するデコレータ
+
+    Args:
+        metric (str): メトリクス名。未指定の場合は関数のモジュール名と関数名
+        tags: 付与するタグ
+    """
+    def _decorator(func):
+        name = metric or f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            with measure(name, inputs=[args, kwargs], **tags) as m:
+                m.outputs = func(*args, **kwargs)
+                return m.outputs
+
+        return _wrapper
+
+    return _decorator
+
+
+def summary(records: Iterable[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """メトリクス名ごとに回数、合計所要時間、入出力行数を集計する
+
+    Args:
+        records (Iterable[Dict[str, Any]]): 集計するメトリクス。未指定の場合は記録済みの全メトリクス
+
+    Returns:
+        List[Dict[str, Any]]: 合計所要時間の降順の集計結果
+    """
+    if records is None:
+        with _lock:
+            records = list(_records)
+
+    summaries = {}
+    for row in records:
+        s = summaries.setdefault(row["metric"], {
+            "metric": row["metric"],
+            "count": 0,
+            "duration_sec": 0.0,
+            "rows_in": 0,
+            "rows_out": 0,
+            "max_memory_bytes": 0,
+        })
+        s["count"] += 1
+        s["duration_sec"] += row["duration_sec"]
+        s["rows_in"] += row["rows_in"]
+        s["rows_out"] += row["rows_out"]
+        s["max_memory_bytes"] = max(s["max_memory_bytes"], row["memory_bytes"])
+
+    return sorted(summaries.values(), key=lambda s: -s["duration_sec"])
+
+
+def emit_summary(**tags) -> List[Dict[str, Any]]:
+    """実行全体のサマリーをJSONで出力する
+
+    Args:
+        tags: 付与するタグ
+
+    Returns:
+        List[Dict[str, Any]]: summaryの結果
+    """
+    result = summary()
+    logger.info(json.dumps({"metric": "run_summary", "stages": result, **tags}, default=str))
+    return result
@@ -0,0 +1,105 @@
+import os
+import io
+import time
+import tempfile
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+from common_module.byte_cache import ByteCache
+from common_module.logger_util import get_custom_logger
+from common_module import metrics_util
+
+logger = get_custom_logger()
+
+
+class PredictionCache:
+    """予測値を、モデルと特徴量の内容のハッシュ(spai.ai.prediction_cache.prediction_cache_key)をキーとして保持するキャッシュ
+
+    ローカル(/tmp)に.npyで保持し、s3_bucketを指定した場合はS3(MinIO)を共有キャッシュとして併用する。
+    再実行(RERUNNABLE=yes)や後続の処理の失敗後のリトライで、入力が変わっていない予測を省略する。
+    キーはモデルと特徴量の内容から決まり、どちらかが変われば別のキーになるため有効期限は設けない。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int = 256 * 1024 ** 2,
+        s3_bucket: Optional[str] = None,
+        s3_prefix: str = "prediction_cache/",
+    ):
+        """
+        Args:
+            cache_dir (str): ローカルキャッシュのディレクトリ
+            max_bytes (int): ローカルキャッシュの合計バイト数の上限
+            s3_bucket (Optional[str]): 共有キャッシュのバケット。未指定の場合はローカルのみ
+            s3_prefix (str): 共有キャッシュのキーのprefix
+        """
+        self._store = ByteCache(cache_dir, ".npy", max_bytes, s3_bucket, s3_prefix, name="prediction cache")
+
+    @classmethod
+    def from_env(cls) -> "PredictionCache":
+        """環境変数からキャッシュを作成する
+
+        PREDICTION_CACHE_DIR, PREDICTION_CACHE_MAX_BYTES, PREDICTION_CACHE_S3_BUCKET, PREDICTION_CACHE_S3_PREFIX
+        を参照する
+        """
+        default_cache_dir = os.path.join(tempfile.gettempdir(), "bid_optimisation_ml", "prediction_cache")
+        return cls(
+            cache_dir=os.environ.get("PREDICTION_CACHE_DIR", default_cache_dir),
+            max_bytes=int(os.environ.get("PREDICTION_CACHE_MAX_BYTES", 256 * 1024 ** 2)),
+            s3_bucket=os.environ.get("PREDICTION_CACHE_S3_BUCKET") or None,
+            s3_prefix=os.environ.get("PREDICTION_CACHE_S3_PREFIX", "prediction_cache/"),
+        )
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return self._store.stats
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """キャッシュされた予測値を返す。存在しない場合はNoneを返す
+
+        Args:
+            key (str): キャッシュキー
+
+        Returns:
+            Optional[np.ndarray]: キャッシュされた予測値
+        """
+        start = time.perf_counter()
+        body, status = self._store.get(key)
+        elapsed = time.perf_counter() - start
+
+        logger.debug(f"prediction cache {status}: {key} ({elapsed:.3f}s)")
+        metrics_util.record("prediction_cache", elapsed, cache=status)
+
+        if body is None:
+            return None
+        return np.load(io.BytesIO(body), allow_pickle=False)
+
+    def put(self, key: str, preds: np.ndarray):
+        """予測値をキャッシュに保存する
+
+        Args:
+            key (str): キャッシュキー
+            preds (np.ndarray): 保存する予測値
+        """
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(preds), allow_pickle=False)
+        self._store.put(key, buffer.getvalue())
+
+
+_prediction_cache = None
+_prediction_cache_lock = threading.Lock()
+
+
+def get_prediction_cache() -> Optional[PredictionCache]:
+    """プロセス内で共有するPredictionCacheを返す。USE_PREDICTION_CACHE=yesでない場合はNoneを返す"""
+    global _prediction_cache
+    if os.environ.get("USE_PREDICTION_CACHE", "no") != "yes":
+        return None
+
+    with _prediction_cache_lock:
+        if _prediction_cache is None:
+            _prediction_cache = PredictionCache.from_env()
+        return _prediction_cache
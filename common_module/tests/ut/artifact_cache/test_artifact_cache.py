@@ -0,0 +1,97 @@
+import time
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_s3
+
+from common_module.artifact_cache import ArtifactCache
+
+_BUCKET = "artifact-cache-test"
+_KEY = "cpc/model/latest.bin"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "ap-northeast-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.delenv("MINIO_URL", raising=False)
+    with mock_s3():
+        client = boto3.client("s3")
+        client.create_bucket(
+            Bucket=_BUCKET, CreateBucketConfiguration={"LocationConstraint": "ap-northeast-1"})
+        client.put_object(Bucket=_BUCKET, Key=_KEY, Body=b"v1")
+        yield client
+
+
+def _counting_deserializer(calls):
+    def _deserialize(binary):
+        calls.append(binary)
+        return binary.decode()
+
+    return _deserialize
+
+
+def test_memory_hit_and_revalidate(s3, tmp_path):
+    calls = []
+    cache = ArtifactCache(disk_dir=str(tmp_path), revalidate_sec=0)
+
+    assert cache.get(_BUCKET, _KEY, _counting_deserializer(calls)) == "v1"
+    # ETagが変わっていないため再度デシリアライズしない
+    assert cache.get(_BUCKET, _KEY, _counting_deserializer(calls)) == "v1"
+    assert calls == [b"v1"]
+    assert cache.stats["misses"] == 1
+    assert cache.stats["revalidated"] == 1
+
+    s3.put_object(Bucket=_BUCKET, Key=_KEY, Body=b"v2")
+    assert cache.get(_BUCKET, _KEY, _counting_deserializer(calls)) == "v2"
+    assert calls == [b"v1", b"v2"]
+    assert cache.stats["misses"] == 2
+
+
+def test_hit_without_revalidation(s3, tmp_path):
+    calls = []
+    cache = ArtifactCache(disk_dir=str(tmp_path), revalidate_sec=60)
+
+    cache.get(_BUCKET, _KEY, _counting_deserializer(calls))
+    s3.put_object(Bucket=_BUCKET, Key=_KEY, Body=b"v2")
+    # revalidate_sec以内はS3を確認しない
+    assert cache.get(_BUCKET, _KEY, _counting_deserializer(calls)) == "v1"
+    assert cache.stats["hits"] == 1
+
+
+def test_disk_hit(s3, tmp_path, mocker):
+    ArtifactCache(disk_dir=str(tmp_path)).get(_BUCKET, _KEY, _counting_deserializer([]))
+
+    # 別プロセスを想定し、メモリが空のキャッシュからディスクの値を再利用する
+    calls = []
+    cache = ArtifactCache(disk_dir=str(tmp_path))
+    get_object = mocker.spy(cache, "_get_object")
+    assert cache.get(_BUCKET, _KEY, _counting_deserializer(calls)) == "v1"
+    assert cache.stats["disk_hits"] == 1
+    assert get_object.call_args[0][2] is not None
+
+
+def test_missing_object(s3, tmp_path):
+    cache = ArtifactCache(disk_dir=str(tmp_path))
+    with pytest.raises(Exception):
+        cache.get(_BUCKET, "not/exists.bin", _counting_deserializer([]))
+
+
+def test_missing_object_remembered(s3, tmp_path, mocker):
+    cache = ArtifactCache(disk_dir=str(tmp_path), revalidate_sec=60)
+    get_object = mocker.spy(cache, "_get_object")
+
+    # revalidate_sec以内は存在しないことをS3に再確認しない
+    for _ in range(3):
+        with pytest.raises(ClientError) as e:
+            cache.get(_BUCKET, "not/exists.bin", _counting_deserializer([]))
+        assert e.value.response["Error"]["Code"] == "NoSuchKey"
+    assert get_object.call_count == 1
+    assert cache.stats["not_found"] == 3
+
+    # 期限切れ後は再確認し、作成されていれば読み込む
+    s3.put_object(Bucket=_BUCKET, Key="not/exists.bin", Body=b"v1")
+    mocker.patch("common_module.artifact_cache.time.monotonic", return_value=time.monotonic() + 60)
+    assert cache.get(_BUCKET, "not/exists.bin", _counting_deserializer([])) == "v1"
+    assert get_object.call_count == 2
@@ -0,0 +1,40 @@
+import datetime
+from decimal import Decimal
+
+import pandas as pd
+import pyarrow as pa
+from common_module.bigquery_util import arrow_table_to_df
+
+
+def _table():
+    return pa.table({
+        "date": pa.array([datetime.date(2021, 1, 1), datetime.date(2021, 1, 2), None], pa.date32()),
+        "portfolio_id": pa.array([1, None, 3], pa.int64()),
+        "sales": pa.array([Decimal("1.5"), None, Decimal("3")], pa.decimal128(38, 9)),
+        "name": pa.array(["a", "b", None]),
+    })
+
+
+def test_arrow_table_to_df():
+    df = arrow_table_to_df(_table(), {
+        "date": "datetime64[ns]",
+        "portfolio_id": "Int64",
+        "sales": "float64",
+    })
+
+    assert list(df.columns) == ["date", "portfolio_id", "sales", "name"]
+    assert df["date"].dtype == "datetime64[ns]"
+    assert df["portfolio_id"].dtype == "Int64"
+    assert df["sales"].dtype == "float64"
+    assert df["name"].dtype == object
+    assert df["portfolio_id"].isna().tolist() == [False, True, False]
+    assert df["sales"].tolist()[0] == 1.5
+    assert df["date"].tolist()[0] == pd.Timestamp("2021-01-01")
+
+
+def test_arrow_table_to_df_empty():
+    df = arrow_table_to_df(_table().slice(0, 0), {"date": "datetime64[ns]", "portfolio_id": "Int64"})
+
+    assert len(df) == 0
+    assert df["date"].dtype == "datetime64[ns]"
+    assert df["portfolio_id"].dtype == "Int64"
@@ -4,6 +4,8 @@ import time
 import datetime
 import io
 import json
+import numpy as np
+import pandas as pd
 import pytest
 from unittest.mock import MagicMock
 from google.cloud import (
@@ -17,7 +19,7 @@ from common_module.aws_util import (
     get_ssm_parameter,
     write_json_to_s3,
 )
-from common_module.bigquery_util import BigQueryService
+from common_module.bigquery_util import BigQueryService, query_cache_key
 
 from common_module.tests.testutil import (
     is_execute_external,
@@ -432,3 +434,13 @@ class TestBigQueryService:
             assert True
         except Exception:
             assert False
+
+
+def test_query_cache_key():
+    sql = "SELECT 1 AS a, 'x' AS b"
+    dtypes = {"a": "int64", "b": "string"}
+
+    # dtypeの指定の有無や内容が異なれば別のキー、列の順序やdtypeの表現が異なるだけなら同じキーとなる
+    assert query_cache_key(sql) != query_cache_key(sql, dtypes)
+    assert query_cache_key(sql, dtypes) != query_cache_key(sql, {"a": "Int64", "b": "string"})
+    assert query_cache_key(sql, dtypes) == query_cache_key(sql, {"b": pd.StringDtype(), "a": np.dtype("int64")})
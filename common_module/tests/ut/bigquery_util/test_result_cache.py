@@ -0,0 +1,65 @@
+import os
+import time
+import pandas as pd
+
+from common_module.bigquery_util import QueryResultCache
+
+
+def _df(n=10):
+    return pd.DataFrame({
+        "advertising_account_id": range(n),
+        "name": [f"name_{i}" for i in range(n)],
+        "date": pd.date_range("2021-01-01", periods=n),
+    })
+
+
+def test_get_put(tmp_path):
+    cache = QueryResultCache(str(tmp_path))
+    df = _df()
+
+    assert cache.get("key") is None
+    cache.put("key", df)
+
+    pd.testing.assert_frame_equal(cache.get("key"), df)
+    stats = cache.stats
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["bytes_written"] == stats["bytes_read"] > 0
+
+
+def test_ttl(tmp_path):
+    cache = QueryResultCache(str(tmp_path), ttl_sec=60)
+    cache.put("key", _df())
+
+    created = time.time() - 120
+    path = os.path.join(str(tmp_path), "key.parquet")
+    os.utime(path, (created, created))
+
+    assert cache.get("key", ttl_sec=180) is not None
+    assert cache.get("key") is None
+    assert not os.path.exists(path)
+
+
+def test_lru_eviction(tmp_path):
+    size = QueryResultCache(str(tmp_path / "size"))
+    size.put("key", _df())
+    max_bytes = size.stats["bytes_written"] * 2
+
+    cache = QueryResultCache(str(tmp_path / "lru"), max_bytes=max_bytes)
+    cache.put("a", _df())
+    cache.put("b", _df())
+    cache.get("a")
+    cache.put("c", _df())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats["evictions"] == 1
+
+
+def test_load_existing_cache(tmp_path):
+    QueryResultCache(str(tmp_path)).put("key", _df())
+
+    cache = QueryResultCache(str(tmp_path))
+
+    pd.testing.assert_frame_equal(cache.get("key"), _df())
@@ -0,0 +1,56 @@
+import datetime
+
+from common_module.bigquery_util import TemplateRegistry
+
+
+def _write_templates(root):
+    (root / "a.tpl.sql").write_text("SELECT {{ value }} AS value")
+    (root / "b.tpl.sql").write_text("SELECT '{{ today }}' AS today")
+
+
+def test_render(tmp_path):
+    _write_templates(tmp_path)
+    registry = TemplateRegistry()
+
+    assert registry.render(str(tmp_path), "a.tpl.sql", {"value": 1}) == "SELECT 1 AS value"
+    assert registry.render(str(tmp_path), "a.tpl.sql", {"value": 2}) == "SELECT 2 AS value"
+    assert registry.render(str(tmp_path), "a.tpl.sql", {"value": 1}) == "SELECT 1 AS value"
+
+    stats = registry.stats["a.tpl.sql"]
+    assert stats["renders"] == 2
+    assert stats["hits"] == 1
+    assert stats["render_sec"] > 0
+
+
+def test_compile_once(tmp_path):
+    _write_templates(tmp_path)
+    registry = TemplateRegistry()
+    registry.render(str(tmp_path), "a.tpl.sql", {"value": 1})
+
+    # コンパイル済みのテンプレートを使うため、ファイルの変更は反映されない
+    (tmp_path / "b.tpl.sql").write_text("SELECT 0")
+
+    assert registry.render(
+        str(tmp_path), "b.tpl.sql", {"today": datetime.date(2021, 1, 1)}
+    ) == "SELECT '2021-01-01' AS today"
+
+
+def test_parameters_type(tmp_path):
+    _write_templates(tmp_path)
+    registry = TemplateRegistry()
+
+    registry.render(str(tmp_path), "b.tpl.sql", {"today": datetime.date(2021, 1, 1)})
+    registry.render(str(tmp_path), "b.tpl.sql", {"today": "2021-01-01"})
+
+    assert registry.stats["b.tpl.sql"]["renders"] == 2
+
+
+def test_max_rendered(tmp_path):
+    _write_templates(tmp_path)
+    registry = TemplateRegistry(max_rendered=1)
+
+    registry.render(str(tmp_path), "a.tpl.sql", {"value": 1})
+    registry.render(str(tmp_path), "a.tpl.sql", {"value": 2})
+    registry.render(str(tmp_path), "a.tpl.sql", {"value": 1})
+
+    assert registry.stats["a.tpl.sql"]["renders"] == 3
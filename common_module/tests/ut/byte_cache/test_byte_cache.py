@@ -0,0 +1,62 @@
+import os
+import time
+import pytest
+from botocore.exceptions import ClientError
+
+from common_module.byte_cache import ByteCache
+
+
+def test_get_put(tmp_path):
+    cache = ByteCache(str(tmp_path), ".bin", max_bytes=1024)
+
+    assert cache.get("key") == (None, "misses")
+    cache.put("key", b"body")
+
+    assert cache.get("key") == (b"body", "hits")
+    assert os.path.exists(os.path.join(str(tmp_path), "key.bin"))
+    assert cache.stats == {
+        "hits": 1, "s3_hits": 0, "misses": 1, "bytes_read": 4, "bytes_written": 4, "evictions": 0,
+    }
+
+
+def test_ttl(tmp_path):
+    cache = ByteCache(str(tmp_path), ".bin", max_bytes=1024)
+    cache.put("key", b"body")
+
+    created = time.time() - 120
+    os.utime(cache.path("key"), (created, created))
+
+    # 有効期間を指定しない場合は期限なし
+    assert cache.get("key")[0] == b"body"
+    assert cache.get("key", ttl_sec=60) == (None, "misses")
+    assert not os.path.exists(cache.path("key"))
+
+
+def test_evict(tmp_path):
+    cache = ByteCache(str(tmp_path), ".bin", max_bytes=8)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    cache.get("a")
+    cache.put("c", b"cccc")
+
+    # 最も長く参照されていないbが削除される
+    assert cache.get("b")[0] is None
+    assert sorted(os.listdir(str(tmp_path))) == ["a.bin", "c.bin"]
+    assert cache.stats["evictions"] == 1
+
+    # 再作成時は既存のファイルから上限を引き継ぐ
+    cache = ByteCache(str(tmp_path), ".bin", max_bytes=4)
+    cache.put("d", b"dddd")
+    assert os.listdir(str(tmp_path)) == ["d.bin"]
+
+
+@pytest.mark.parametrize("code, warned", [("NoSuchKey", False), ("404", False), ("AccessDenied", True)])
+def test_s3_error(tmp_path, mocker, code, warned):
+    client = mocker.patch("common_module.byte_cache.s3_client").return_value
+    client.get_object.side_effect = ClientError({"Error": {"Code": code}}, "GetObject")
+    warning = mocker.patch("common_module.byte_cache.logger.warning")
+
+    # 存在しない場合以外のエラー(権限、スロットリングなど)はログに出力する
+    cache = ByteCache(str(tmp_path), ".bin", max_bytes=1024, s3_bucket="bucket")
+    assert cache.get("key") == (None, "misses")
+    assert warning.called == warned
@@ -0,0 +1,122 @@
+import json
+import threading
+import pandas as pd
+import pytest
+
+from common_module import metrics_util
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics_util.reset()
+    yield
+    metrics_util.reset()
+
+
+def test_record(mocker):
+    info = mocker.patch("common_module.metrics_util.logger.info")
+    metrics_util.set_tags(advertising_account_id=1, portfolio_id=None)
+
+    row = metrics_util.record(
+        "stage.a", 1.5, inputs=[pd.DataFrame({"a": range(3)}), 1], outputs=(pd.DataFrame({"a": range(2)}), None))
+
+    assert row["rows_in"] == 3
+    assert row["rows_out"] == 2
+    assert row["memory_bytes"] > 0
+    assert row["advertising_account_id"] == 1
+    assert json.loads(info.call_args[0][0]) == row
+
+
+def test_record_datadog(mocker, monkeypatch):
+    monkeypatch.setenv("METRICS_FORMAT", "datadog")
+    info = mocker.patch("common_module.metrics_util.logger.info")
+
+    metrics_util.record("stage.a", 1.0, unit="1_")
+
+    messages = [call[0][0] for call in info.call_args_list]
+    assert len(messages) == 4
+    assert all(m.startswith("MONITORING|") and m.endswith("|#unit:1_") for m in messages)
+
+
+def test_measure():
+    with metrics_util.measure("extract", inputs=pd.DataFrame({"a": [1]})) as m:
+        m.outputs = pd.DataFrame({"a": [1, 2]})
+
+    with pytest.raises(ValueError):
+        with metrics_util.measure("extract"):
+            raise ValueError()
+
+    result = metrics_util.summary()
+    assert len(result) == 1
+    assert result[0]["metric"] == "extract"
+    assert result[0]["count"] == 2
+    assert result[0]["rows_in"] == 1
+    assert result[0]["rows_out"] == 2
+
+
+def test_instrument():
+    @metrics_util.instrument()
+    def _double(df):
+        return pd.concat([df, df])
+
+    df = _double(pd.DataFrame({"a": [1, 2]}))
+
+    assert len(df) == 4
+    result = metrics_util.summary()
+    assert result[0]["metric"].endswith("._double")
+    assert result[0]["rows_in"] == 2
+    assert result[0]["rows_out"] == 4
+
+
+def test_emit_summary(mocker):
+    info = mocker.patch("common_module.metrics_util.logger.info")
+    metrics_util.record("a", 1.0)
+    metrics_util.record("b", 2.0)
+    metrics_util.record("a", 0.5)
+
+    result = metrics_util.emit_summary(unit="1_")
+
+    assert [s["metric"] for s in result] == ["b", "a"]
+    assert result[1]["count"] == 2
+    assert json.loads(info.call_args[0][0])["unit"] == "1_"
+
+
+def test_tags_per_context(mocker):
+    mocker.patch("common_module.metrics_util.logger.info")
+    barrier = threading.Barrier(2, timeout=5)
+    rows = {}
+
+    def _run_unit(unit):
+        metrics_util.set_tags(unit=unit)
+        # 他のunitがタグを設定した後に記録しても、自身のタグが付与される
+        barrier.wait()
+        rows[unit] = metrics_util.record("stage.a", 1.0)
+
+    threads = [threading.Thread(target=_run_unit, args=(unit,)) for unit in ["1_", "2_"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert rows["1_"]["unit"] == "1_"
+    assert rows["2_"]["unit"] == "2_"
+    assert "unit" not in metrics_util.record("stage.b", 1.0)
+
+
+def test_collect_and_add(mocker):
+    info = mocker.patch("common_module.metrics_util.logger.info")
+
+    # collect内の記録は出力せず、addで現在のタグを付与して記録する
+    with metrics_util.collect() as records:
+        metrics_util.record("prediction_cache", 0.1, cache="hits")
+        metrics_util.record("prediction_cache", 0.1, cache="misses")
+    assert not info.called
+    assert metrics_util.summary() == []
+
+    metrics_util.set_tags(unit="1_")
+    metrics_util.add(records)
+    metrics_util.record("prediction_cache", 0.1, cache="hits")
+
+    assert info.call_count == 3
+    assert json.loads(info.call_args_list[0][0][0])["unit"] == "1_"
+    assert metrics_util.count("prediction_cache", "cache") == {"hits": 2, "misses": 1}
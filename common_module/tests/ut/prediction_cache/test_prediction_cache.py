@@ -0,0 +1,83 @@
+import boto3
+import numpy as np
+import pytest
+from moto import mock_s3
+
+from common_module import prediction_cache
+from common_module.prediction_cache import PredictionCache
+
+_BUCKET = "prediction-cache-test"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "ap-northeast-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.delenv("MINIO_URL", raising=False)
+    with mock_s3():
+        client = boto3.client("s3")
+        client.create_bucket(
+            Bucket=_BUCKET, CreateBucketConfiguration={"LocationConstraint": "ap-northeast-1"})
+        yield client
+
+
+def test_get_put(tmp_path):
+    cache = PredictionCache(str(tmp_path))
+    preds = np.random.rand(10)
+
+    assert cache.get("key") is None
+    cache.put("key", preds)
+
+    np.testing.assert_array_equal(cache.get("key"), preds)
+    stats = cache.stats
+    assert (stats["hits"], stats["s3_hits"], stats["misses"]) == (1, 0, 1)
+
+
+def test_evict(tmp_path):
+    preds = np.random.rand(100)
+    size = (tmp_path / "size.npy")
+    np.save(size, preds)
+    cache = PredictionCache(str(tmp_path / "cache"), max_bytes=size.stat().st_size * 2)
+
+    cache.put("a", preds)
+    cache.put("b", preds)
+    cache.get("a")
+    cache.put("c", preds)
+
+    # 最も長く参照されていないbが削除される
+    assert cache.get("b") is None
+    np.testing.assert_array_equal(cache.get("a"), preds)
+    np.testing.assert_array_equal(cache.get("c"), preds)
+    assert sorted(path.name for path in (tmp_path / "cache").iterdir()) == ["a.npy", "c.npy"]
+    assert cache.stats["evictions"] == 1
+
+    # 再作成時は既存のファイルから上限を引き継ぐ
+    cache = PredictionCache(str(tmp_path / "cache"), max_bytes=size.stat().st_size)
+    cache.put("d", preds)
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+
+
+def test_s3(s3, tmp_path):
+    preds = np.random.rand(10)
+    PredictionCache(str(tmp_path / "a"), s3_bucket=_BUCKET).put("key", preds)
+
+    # 別のコンテナ(ローカルキャッシュなし)からはS3のキャッシュを参照する
+    cache = PredictionCache(str(tmp_path / "b"), s3_bucket=_BUCKET)
+    np.testing.assert_array_equal(cache.get("key"), preds)
+    np.testing.assert_array_equal(cache.get("key"), preds)
+    stats = cache.stats
+    assert (stats["hits"], stats["s3_hits"], stats["misses"]) == (1, 1, 0)
+
+
+def test_get_prediction_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(prediction_cache, "_prediction_cache", None)
+    monkeypatch.setenv("PREDICTION_CACHE_DIR", str(tmp_path))
+
+    monkeypatch.delenv("USE_PREDICTION_CACHE", raising=False)
+    assert prediction_cache.get_prediction_cache() is None
+
+    monkeypatch.setenv("USE_PREDICTION_CACHE", "yes")
+    cache = prediction_cache.get_prediction_cache()
+    assert isinstance(cache, PredictionCache)
+    assert prediction_cache.get_prediction_cache() is cache
@@ -7,8 +7,10 @@ from pytz import timezone
 import pandas as pd
 
 from spai.service.cpc.service import CPCPredictionService
-from spai.service.cpc.preprocess import CPCPreprocessor
-from spai.service.cpc.estimator import CPCEstimator
+from spai.service.cpc.preprocess import CPCPreprocessor, get_dtypes
+from spai.service.cpc.estimator import CPCEstimator, CPCModel
+from spai.service.cpc.config import FEATURE_COLUMNS, CATEGORICAL_COLUMNS
+from spai.ai.bundle import ModelBundle
 
 from common_module.aws_util import write_df_to_s3
 from common_module.bigquery_util import BigQueryService
@@ -17,8 +19,8 @@ from common_module.logger_util import get_custom_logger
 from common_module.system_util import get_s3_key
 from common_module.datamanage_util import (
     output_preprocess_to_s3_manager,
-    write_latest_model_manager,
-    write_latest_labelencoder_manager,
+    write_latest_bundle_manager,
+    CPC_LATEST_BUNDLE_KEY,
 )
 
 
@@ -115,13 +117,24 @@ def train(date: str):
 
     # CPC train 前処理＆実行
     logger.info("start fit")
+    # モデルとLabelEncoderは1つのbundleにまとめ、モデルの学習後に1回で出力する
+    bundle = ModelBundle({
+        "kpi": "cpc",
+        "version": today.strftime("%Y-%m-%d"),
+        "model_class": CPCModel.__name__,
+        "feature_columns": FEATURE_COLUMNS,
+        "categorical_columns": CATEGORICAL_COLUMNS,
+        "input_dtypes": get_dtypes()[0],
+    })
+    label_encoder_writer, model_writer = write_latest_bundle_manager(
+        BUCKET,
+        get_s3_key("cpc/model/", today, "bundle.bin"),
+        CPC_LATEST_BUNDLE_KEY,
+        bundle,
+    )
     CPCPredictionService(
         preprocessor=CPCPreprocessor(
-            label_encoder_writer=write_latest_labelencoder_manager(
-                BUCKET,
-                "cpc/model/latest_le/",
-                f"cpc/preprocess/{today.year}/{today.month:02}/{today.day:02}/le/"
-            ),
+            label_encoder_writer=label_encoder_writer,
             label_encoder_reader=None,
             output=output_preprocess_to_s3_manager(
                 BUCKET, f"cpc/preprocess/{today.year}/{today.month:02}/{today.day:02}/train_data.csv",
@@ -130,11 +143,7 @@ def train(date: str):
             batch_size=DASK_BATCH_SIZE,
         ),
         estimator=CPCEstimator(
-            model_writer=write_latest_model_manager(
-                BUCKET,
-                get_s3_key("cpc/model/", today, "model.bin"),
-                "cpc/model/latest.bin",
-            ),
+            model_writer=model_writer,
             is_tune=True,
         ),
     ).train(df, df_placements)
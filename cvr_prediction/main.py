@@ -7,8 +7,10 @@ from pytz import timezone
 import pandas as pd
 
 from spai.service.cvr.service import CVRPredictionService
-from spai.service.cvr.preprocess import CVRPreprocessor
-from spai.service.cvr.estimator import CVREstimator
+from spai.service.cvr.preprocess import CVRPreprocessor, get_dtypes
+from spai.service.cvr.estimator import CVREstimator, CVRModel
+from spai.service.cvr.config import FEATURE_COLUMNS, CATEGORICAL_COLUMNS
+from spai.ai.bundle import ModelBundle
 
 from common_module.aws_util import write_df_to_s3
 from common_module.bigquery_util import BigQueryService
@@ -17,8 +19,8 @@ from common_module.logger_util import get_custom_logger
 from common_module.system_util import get_s3_key
 from common_module.datamanage_util import (
     output_preprocess_to_s3_manager,
-    write_latest_model_manager,
-    write_latest_labelencoder_manager,
+    write_latest_bundle_manager,
+    CVR_LATEST_BUNDLE_KEY,
 )
 
 
@@ -112,13 +114,24 @@ def train(date: str):
 
     # CVR train 前処理＆実行
     logger.info("start fit")
+    # モデルとLabelEncoderは1つのbundleにまとめ、モデルの学習後に1回で出力する
+    bundle = ModelBundle({
+        "kpi": "cvr",
+        "version": today.strftime("%Y-%m-%d"),
+        "model_class": CVRModel.__name__,
+        "feature_columns": FEATURE_COLUMNS,
+        "categorical_columns": CATEGORICAL_COLUMNS,
+        "input_dtypes": get_dtypes()[0],
+    })
+    label_encoder_writer, model_writer = write_latest_bundle_manager(
+        BUCKET,
+        get_s3_key("cvr/model/", today, "bundle.bin"),
+        CVR_LATEST_BUNDLE_KEY,
+        bundle,
+    )
     CVRPredictionService(
         preprocessor=CVRPreprocessor(
-            label_encoder_writer=write_latest_labelencoder_manager(
-                BUCKET,
-                "cvr/model/latest_le/",
-                f"cvr/preprocess/{today.year}/{today.month:02}/{today.day:02}/le/"
-            ),
+            label_encoder_writer=label_encoder_writer,
             label_encoder_reader=None,
             output=output_preprocess_to_s3_manager(
                 BUCKET, f"cvr/preprocess/{today.year}/{today.month:02}/{today.day:02}/train_data.csv",
@@ -127,11 +140,7 @@ def train(date: str):
             batch_size=DASK_BATCH_SIZE,
         ),
         estimator=CVREstimator(
-            model_writer=write_latest_model_manager(
-                BUCKET,
-                get_s3_key("cvr/model/", today, "model.bin"),
-                "cvr/model/latest.bin",
-            ),
+            model_writer=model_writer,
             is_tune=True,
         ),
     ).train(df, df_keyword_queries)
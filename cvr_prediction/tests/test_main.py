@@ -5,6 +5,8 @@ import pytest
 from click.testing import CliRunner
 
 from main import cli
+from spai.ai.bundle import ModelBundle
+from spai.service.cvr.estimator import CVRModel
 from spai.service.cvr.preprocess import (
     agg_feature_cols,
     agg_query_feature_cols,
@@ -103,8 +105,8 @@ def test_train(mocker, monkeypatch, df, ad_df, keyword_queries_df, is_df_zero, d
 
     mocker.patch("main.write_df_to_s3", return_value=None)
     mocker.patch("main.output_preprocess_to_s3_manager", return_value=mocker.MagicMock())
-    mocker.patch("main.write_latest_model_manager", return_value=mocker.MagicMock())
-    mocker.patch("main.write_latest_labelencoder_manager", return_value=mocker.MagicMock())
+    write_bundle = mocker.MagicMock()
+    mocker.patch("common_module.datamanage_util.write_latest_model_manager", return_value=write_bundle)
     mocker.patch("spai.ai.boosting.get_tuned_params", return_value=params)
 
     mocker.patch("main.business_exception", side_effect=BusinessException)
@@ -123,3 +125,10 @@ def test_train(mocker, monkeypatch, df, ad_df, keyword_queries_df, is_df_zero, d
     else:
         # 正常系
         assert result.exit_code == 0
+
+        # モデルとLabelEncoderが1つのbundleとして1回で出力される
+        write_bundle.assert_called_once()
+        bundle = ModelBundle.from_bytes(write_bundle.call_args[0][0])
+        assert bundle.manifest["kpi"] == "cvr"
+        assert len(bundle.label_encoder_names) > 0
+        assert bundle.load_model(CVRModel) is not None
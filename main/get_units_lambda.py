@@ -40,11 +40,29 @@ def get_units(date: str):
     return units
 
 
+def get_unit_batches(date: str, batch_size: int):
+    """対象unitをbatch_size件ずつまとめたbatch処理用のイベントを返す
+    """
+    units = get_units(date)
+
+    return [
+        {
+            "date": date,
+            "units": units[i:i + batch_size],
+        }
+        for i in range(0, len(units), batch_size)
+    ]
+
+
 def lambda_handler(event, context):
     logger.info("start lambda")
     logger.info(event)
     date = event["date"]
-    units = get_units(date)
+    batch_size = int(os.environ.get("UNIT_BATCH_SIZE", "0"))
+    if batch_size > 0:
+        units = get_unit_batches(date, batch_size)
+    else:
+        units = get_units(date)
     logger.info(f"units: {units}")
     logger.info("success lambda")
     return units
@@ -3,11 +3,13 @@ import traceback
 import pandas as pd
 
 from common_module.logger_util import get_custom_logger
+from common_module import metrics_util
 from common_module.system_util import get_target_date
 
 from module import (
     extract,
     prepare_df,
+    kpi_features,
     cpc_prediction,
     cvr_prediction,
     spa_prediction,
@@ -18,56 +20,63 @@ from module import (
     cap_daily_budget,
     output_json,
     output_csv,
+    pipeline,
 )
-from module.args import Event
+from module.args import RunContext
 from module.libs import is_existing_today_outputs
 
 logger = get_custom_logger()
 
 
-def _generate_it_mock_kpi_predictions(it_mock_kpi_predictions):
+def _extract_max_workers():
+    return int(os.environ.get("EXTRACT_MAX_WORKERS", "8"))
+
+
+def _extract_account_scope():
+    return os.environ.get("EXTRACT_ACCOUNT_SCOPE", "no") == "yes"
+
+
+def _cache_stats():
+    """実行サマリーに含める、予測値のキャッシュのヒット数
+
+    プロセスプールで実行した予測のメトリクスもPipelineが親プロセスに記録するため、記録済みのメトリクスから数える
+    """
+    stats = metrics_util.count("prediction_cache", "cache")
+    return {"prediction_cache": stats} if stats else {}
+
+
+def _pipeline_max_workers():
+    return int(os.environ.get("PIPELINE_MAX_WORKERS", "4"))
+
+
+def _pipeline_process_workers():
+    return int(os.environ.get("PIPELINE_PROCESS_WORKERS", "0"))
+
+
+def _generate_it_mock_kpi_predictions(it_mock_kpi_predictions, context):
     def _generate(name):
         df = pd.DataFrame({
             "ad_type": [ad["ad_type"] for ad in it_mock_kpi_predictions],
             "ad_id": [ad["ad_id"] for ad in it_mock_kpi_predictions],
             name: [ad[name] for ad in it_mock_kpi_predictions],
         })
-        df["date"] = Event.today
+        df["date"] = context.today
 
         return df
 
     return _generate("cpc"), _generate("cvr"), _generate("spa"),
 
 
-def main(date, advertising_account_id, portfolio_id, it_mock_kpi_predictions=None):
-    assert date is not None
-    assert advertising_account_id is not None
-
-    Event.advertising_account_id = int(advertising_account_id)
-    Event.portfolio_id = int(portfolio_id) if portfolio_id is not None else None
-    Event.today = get_target_date(date)
-
-    if is_existing_today_outputs():
-        msg = (
-            "Output files does already exist. "
-            f"advertising_account_id={Event.advertising_account_id},"
-            f"portfolio_id={Event.portfolio_id},"
-            f"date={Event.today}"
-        )
-        if os.environ.get("RERUNNABLE", "no") != "yes":
-            raise Exception(msg)
-        else:
-            logger.info(msg)
-
-    logger.info("extract")
+def _extract_basic(extractor, context):
+    dfs = extractor.basic(context)
     (
         unit_info_df,
         campaign_info_df,
         campaign_all_actual_df,
         ad_info_df,
         ad_target_actual_df,
-        daily_budget_boost_coefficient_df,
-    ) = extract.basic()
+        _,
+    ) = dfs
 
     if any(
         [
@@ -80,129 +89,359 @@ def main(date, advertising_account_id, portfolio_id, it_mock_kpi_predictions=Non
     ):
         raise ValueError(
             "Data does not exists."
-            f"[advertising_account_id]{Event.advertising_account_id},"
-            f"[portfolio_id]{Event.portfolio_id}"
+            f"[advertising_account_id]{context.advertising_account_id},"
+            f"[portfolio_id]{context.portfolio_id}"
         )
 
-    logger.info("prepare df")
-    target_ad_df, target_campaign_df, target_unit_df = prepare_df.commons(
-        unit_info_df=unit_info_df,
-        campaign_info_df=campaign_info_df,
-        campaign_all_actual_df=campaign_all_actual_df,
-        ad_info_df=ad_info_df,
-        ad_target_actual_df=ad_target_actual_df,
-        daily_budget_boost_coefficient_df=daily_budget_boost_coefficient_df,
-    )
+    return dfs
 
-    logger.info("extract campaign placement")
-    campaign_placement_df = extract.campaign_placement()
 
-    logger.info("cpc_prediction")
-    cpc_prediction_df = cpc_prediction.exec(target_ad_df, campaign_placement_df)
+def _extract_lastday_ml_result(extractor, context):
+    return (
+        extractor.lastday_ml_result_unit(context),
+        extractor.lastday_ml_result_campaign(context),
+        extractor.lastday_ml_result_ad(context),
+    )
 
-    del campaign_placement_df
 
-    logger.info("extract keyword queries")
-    keyword_queries_df = prepare_df.add_unit_key(extract.keyword_queries())
+def _extract_ml_applied_history(extractor, is_lastday_ml_applied, context):
+    if is_lastday_ml_applied:
+        return None
 
-    logger.info("cvr_prediction")
-    cvr_prediction_df = cvr_prediction.exec(target_ad_df, keyword_queries_df.copy())
+    return extractor.ml_applied_history(context)
 
-    logger.info("spa_prediction")
-    spa_prediction_df = spa_prediction.exec(target_ad_df, keyword_queries_df.copy())
 
-    del keyword_queries_df
+def _stages(it_mock_kpi_predictions=None):
+    """mainの処理を入出力を宣言したStageのリストで返す
 
-    # IT時のmock処理
+    cpc, cvr, spaの予測に使う特徴量はkpi_featuresで1回だけ計算し、各予測は必要な列のみを取り出して並行に実行する。
+    CPU負荷の高い特徴量の計算とモデルの処理はプロセスプールで実行する。
+    特徴量の計算は入力のDataFrameに列を追加するため、スレッドで実行する場合はコピーを渡す。
+    各処理はunitの情報をinputsのcontext(RunContext)で受け取る。
+    """
+    kpi_prediction_outputs = ["cpc_prediction_df", "cvr_prediction_df", "spa_prediction_df"]
     if it_mock_kpi_predictions is not None:
-        cpc_prediction_df, cvr_prediction_df, spa_prediction_df = \
-            _generate_it_mock_kpi_predictions(it_mock_kpi_predictions)
-
-    logger.info("target_pause")
-    target_pause_df = target_pause.exec(target_unit_df, target_ad_df)
-
-    logger.info("extract lastday ml result")
-    lastday_ml_result_unit_df = extract.lastday_ml_result_unit()
-    lastday_ml_result_campaign_df = extract.lastday_ml_result_campaign()
-    lastday_ml_result_ad_df = extract.lastday_ml_result_ad()
-
-    logger.info("ml_apply")
-    is_lastday_ml_applied = ml_apply.exec(ad_target_actual_df, lastday_ml_result_ad_df)
-
-    logger.info("extract ml applied history")
-    ml_applied_history_df = None
-    if not is_lastday_ml_applied:
-        ml_applied_history_df = extract.ml_applied_history()
-
-    logger.info("pid_controller")
-    pid_controller_df = pid_controller.exec(
-        target_ad_df,
-        target_unit_df,
-        lastday_ml_result_unit_df,
-        is_lastday_ml_applied,
-        ml_applied_history_df,
-        campaign_all_actual_df,
-        cpc_prediction_df,
-        cvr_prediction_df,
-        spa_prediction_df,
-    )
+        # IT時は予測処理を実行したうえで、予測結果をmockに差し替える
+        kpi_prediction_outputs = [f"{name}_raw" for name in kpi_prediction_outputs]
+
+    stages = [
+        pipeline.Stage(
+            "extract_basic", _extract_basic,
+            inputs=["extractor", "context"],
+            outputs=[
+                "unit_info_df",
+                "campaign_info_df",
+                "campaign_all_actual_df",
+                "ad_info_df",
+                "ad_target_actual_df",
+                "daily_budget_boost_coefficient_df",
+            ],
+        ),
+        pipeline.Stage(
+            "prepare_df", prepare_df.commons,
+            inputs=[
+                "unit_info_df",
+                "campaign_info_df",
+                "campaign_all_actual_df",
+                "ad_info_df",
+                "ad_target_actual_df",
+                "daily_budget_boost_coefficient_df",
+                "context",
+            ],
+            outputs=["target_ad_df", "target_campaign_df", "target_unit_df"],
+        ),
+        pipeline.Stage(
+            "extract_campaign_placement", lambda extractor, context: extractor.campaign_placement(context),
+            inputs=["extractor", "context"],
+            outputs=["campaign_placement_df"],
+        ),
+        pipeline.Stage(
+            "extract_keyword_queries",
+            lambda extractor, context: prepare_df.add_unit_key(extractor.keyword_queries(context), context),
+            inputs=["extractor", "context"],
+            outputs=["keyword_queries_df"],
+        ),
+        pipeline.Stage(
+            "kpi_features", kpi_features.exec,
+            inputs=["target_ad_df", "keyword_queries_df", "context"],
+            outputs=["kpi_features_df"],
+            use_process=True,
+            copy_inputs=True,
+        ),
+        pipeline.Stage(
+            "cpc_prediction", cpc_prediction.exec,
+            inputs=["kpi_features_df", "campaign_placement_df", "context"],
+            outputs=[kpi_prediction_outputs[0]],
+            use_process=True,
+        ),
+        pipeline.Stage(
+            "cvr_prediction", cvr_prediction.exec,
+            inputs=["kpi_features_df", "context"],
+            outputs=[kpi_prediction_outputs[1]],
+            use_process=True,
+        ),
+        pipeline.Stage(
+            "spa_prediction", spa_prediction.exec,
+            inputs=["kpi_features_df", "context"],
+            outputs=[kpi_prediction_outputs[2]],
+            use_process=True,
+        ),
+        pipeline.Stage(
+            "target_pause", target_pause.exec,
+            inputs=["target_unit_df", "target_ad_df", "context"],
+            outputs=["target_pause_df"],
+        ),
+        pipeline.Stage(
+            "extract_lastday_ml_result", _extract_lastday_ml_result,
+            inputs=["extractor", "context"],
+            outputs=[
+                "lastday_ml_result_unit_df",
+                "lastday_ml_result_campaign_df",
+                "lastday_ml_result_ad_df",
+            ],
+        ),
+        pipeline.Stage(
+            "ml_apply", ml_apply.exec,
+            inputs=["ad_target_actual_df", "lastday_ml_result_ad_df", "context"],
+            outputs=["is_lastday_ml_applied"],
+        ),
+        pipeline.Stage(
+            "extract_ml_applied_history", _extract_ml_applied_history,
+            inputs=["extractor", "is_lastday_ml_applied", "context"],
+            outputs=["ml_applied_history_df"],
+        ),
+        pipeline.Stage(
+            "pid_controller", pid_controller.exec,
+            inputs=[
+                "target_ad_df",
+                "target_unit_df",
+                "lastday_ml_result_unit_df",
+                "is_lastday_ml_applied",
+                "ml_applied_history_df",
+                "campaign_all_actual_df",
+                "cpc_prediction_df",
+                "cvr_prediction_df",
+                "spa_prediction_df",
+                "context",
+            ],
+            outputs=["pid_controller_df"],
+        ),
+        pipeline.Stage(
+            "extract_ad_input_json", lambda extractor, context: extractor.ad_input_json(context),
+            inputs=["extractor", "context"],
+            outputs=["ad_input_json_df"],
+        ),
+        pipeline.Stage(
+            "bid_optimiser", bid_optimiser.exec,
+            inputs=[
+                "target_unit_df",
+                "target_ad_df",
+                "ad_input_json_df",
+                "cpc_prediction_df",
+                "cvr_prediction_df",
+                "spa_prediction_df",
+                "pid_controller_df",
+                "campaign_all_actual_df",
+                "context",
+            ],
+            outputs=["bid_optimiser_df"],
+        ),
+        pipeline.Stage(
+            "cap_daily_budget", cap_daily_budget.exec,
+            inputs=[
+                "ad_input_json_df",
+                "lastday_ml_result_campaign_df",
+                "lastday_ml_result_unit_df",
+                "target_campaign_df",
+                "target_unit_df",
+                "campaign_info_df",
+                "campaign_all_actual_df",
+                "daily_budget_boost_coefficient_df",
+                "context",
+            ],
+            outputs=["cap_daily_budget_df"],
+            copy_inputs=True,
+        ),
+        pipeline.Stage(
+            "output_json", output_json.exec,
+            inputs=["ad_input_json_df", "bid_optimiser_df", "cap_daily_budget_df", "target_pause_df", "context"],
+        ),
+        pipeline.Stage(
+            "output_csv", output_csv.exec,
+            inputs=[
+                "target_ad_df",
+                "target_campaign_df",
+                "target_unit_df",
+                "is_lastday_ml_applied",
+                "cpc_prediction_df",
+                "cvr_prediction_df",
+                "spa_prediction_df",
+                "bid_optimiser_df",
+                "target_pause_df",
+                "cap_daily_budget_df",
+                "pid_controller_df",
+                "ad_input_json_df",
+                "lastday_ml_result_unit_df",
+                "context",
+            ],
+        ),
+    ]
 
-    logger.info("extract ad input json")
-    ad_input_json_df = extract.ad_input_json()
-
-    logger.info("bid_optimiser")
-    bid_optimiser_df = bid_optimiser.exec(
-        target_unit_df,
-        target_ad_df,
-        ad_input_json_df,
-        cpc_prediction_df,
-        cvr_prediction_df,
-        spa_prediction_df,
-        pid_controller_df,
-        campaign_all_actual_df,
-    )
+    if it_mock_kpi_predictions is not None:
+        stages.append(pipeline.Stage(
+            "it_mock_kpi_predictions",
+            lambda *values: _generate_it_mock_kpi_predictions(it_mock_kpi_predictions, values[-1]),
+            inputs=kpi_prediction_outputs + ["context"],
+            outputs=["cpc_prediction_df", "cvr_prediction_df", "spa_prediction_df"],
+        ))
+
+    return stages
+
+
+def main(
+    date,
+    advertising_account_id,
+    portfolio_id,
+    it_mock_kpi_predictions=None,
+    extractor=None,
+):
+    assert date is not None
+    assert advertising_account_id is not None
 
-    logger.info("cap_daily_budget")
-    cap_daily_budget_df = cap_daily_budget.exec(
-        ad_input_json_df,
-        lastday_ml_result_campaign_df,
-        lastday_ml_result_unit_df,
-        target_campaign_df,
-        target_unit_df,
-        campaign_info_df,
-        campaign_all_actual_df,
-        daily_budget_boost_coefficient_df,
-    )
+    if extractor is None:
+        extractor = extract.Extractor()
 
-    logger.info("output_json")
-    output_json.exec(
-        ad_input_json_df, bid_optimiser_df, cap_daily_budget_df, target_pause_df
+    context = RunContext(
+        advertising_account_id=int(advertising_account_id),
+        portfolio_id=int(portfolio_id) if portfolio_id is not None else None,
+        today=get_target_date(date),
+    )
+    metrics_util.set_tags(
+        advertising_account_id=context.advertising_account_id,
+        portfolio_id=context.portfolio_id,
+        date=context.today.strftime("%Y-%m-%d"),
     )
 
-    logger.info("output_csv")
-    output_csv.exec(
-        target_ad_df,
-        target_campaign_df,
-        target_unit_df,
-        is_lastday_ml_applied,
-        cpc_prediction_df,
-        cvr_prediction_df,
-        spa_prediction_df,
-        bid_optimiser_df,
-        target_pause_df,
-        cap_daily_budget_df,
-        pid_controller_df,
-        ad_input_json_df,
-        lastday_ml_result_unit_df,
+    if is_existing_today_outputs(context):
+        msg = (
+            "Output files does already exist. "
+            f"advertising_account_id={context.advertising_account_id},"
+            f"portfolio_id={context.portfolio_id},"
+            f"date={context.today}"
+        )
+        if os.environ.get("RERUNNABLE", "no") != "yes":
+            raise Exception(msg)
+        else:
+            logger.info(msg)
+
+    extractor.prefetch(context)
+
+    main_pipeline = pipeline.Pipeline(
+        _stages(it_mock_kpi_predictions),
+        max_workers=_pipeline_max_workers(),
+        process_workers=_pipeline_process_workers(),
     )
+    try:
+        main_pipeline.run({"extractor": extractor, "context": context})
+    finally:
+        main_pipeline.report()
+
+
+def main_batch(date, units):
+    """複数unitを1プロセスでまとめて処理する
+
+    抽出は全unit分をSQL 1回ずつでまとめて行い、unit単位で切り出して各処理を実行する。
+    あるunitで例外が発生しても残りのunitの処理は継続する。
+
+    Args:
+        date (str): 対象日
+        units (List[Dict[str, Any]]): advertising_account_id, portfolio_idを持つunitのリスト
+
+    Returns:
+        List[Dict[str, Any]]: 処理に失敗したunitとエラー内容のリスト
+    """
+    assert date is not None
+
+    metrics_util.reset()
+    extractor = extract.BatchExtractor(units, max_workers=_extract_max_workers())
+    failed_units = []
+    for unit in units:
+        logger.info(f"start unit {unit}")
+        try:
+            main(
+                date=date,
+                advertising_account_id=unit["advertising_account_id"],
+                portfolio_id=unit["portfolio_id"],
+                it_mock_kpi_predictions=unit.get("it_mock_kpi_predictions"),
+                extractor=extractor,
+            )
+        except Exception as e:
+            logger.error(f"[unit]{unit}\n[error]{e}\n[traceback]{traceback.format_exc()}")
+            failed_units.append({
+                "advertising_account_id": unit["advertising_account_id"],
+                "portfolio_id": unit["portfolio_id"],
+                "error": str(e),
+            })
+        else:
+            logger.info(f"finished unit {unit}")
+
+    extractor.report()
+    extractor.close()
+    metrics_util.set_tags()
+    metrics_util.emit_summary(units=len(units), failed_units=len(failed_units), **_cache_stats())
+
+    return failed_units
 
 
 def lambda_handler(event, context):
     logger.info(f"start {event}")
+    metrics_util.reset()
+    extractor = extract.Extractor(
+        max_workers=_extract_max_workers(),
+        account_scope=_extract_account_scope(),
+    )
     try:
-        main(**event)
+        main(**event, extractor=extractor)
     except Exception as e:
         raise Exception(
             f"[unit]{event}\n[error]{e}\n[traceback]{traceback.format_exc()}"
         )
+    finally:
+        extractor.report()
+        extractor.close()
+        metrics_util.emit_summary(
+            advertising_account_id=event.get("advertising_account_id"),
+            portfolio_id=event.get("portfolio_id"),
+            **_cache_stats(),
+        )
     logger.info(f"finished {event}")
+
+
+def batch_lambda_handler(event, context):
+    """複数unitをまとめて処理し、失敗したunitを再実行用のイベントとして返す
+
+    失敗したunitがあっても例外にはしない。Lambdaのリトライで成功済みのunitが再実行されると、
+    出力済み(Output files does already exist)で失敗するため、呼び出し元は戻り値のunitsのみを再実行する。
+
+    Returns:
+        Dict[str, Any]: 失敗したunitのみを持つイベント(date, units)と、エラー内容(failed_units)
+    """
+    logger.info(f"start batch {event}")
+    failed_units = main_batch(**event)
+    if len(failed_units) > 0:
+        logger.error(
+            f"[date]{event['date']}\n"
+            f"[failed]{len(failed_units)}/{len(event['units'])} units\n"
+            f"[units]{failed_units}"
+        )
+    logger.info(f"finished batch {event}")
+
+    failed_keys = [(unit["advertising_account_id"], unit["portfolio_id"]) for unit in failed_units]
+    return {
+        "date": event["date"],
+        "units": [
+            unit for unit in event["units"]
+            if (unit["advertising_account_id"], unit["portfolio_id"]) in failed_keys
+        ],
+        "failed_units": failed_units,
+    }
@@ -1,4 +1,43 @@
+import datetime
+from dataclasses import dataclass
+from typing import Optional
+
+
 class Event:
     advertising_account_id = None
     portfolio_id = None
     today = None
+
+
+@dataclass(frozen=True)
+class RunContext:
+    """1unit分の処理の実行条件
+
+    各処理に明示的に渡すことで、複数unitを同一プロセス内で並行に処理できる。
+    """
+    advertising_account_id: int
+    portfolio_id: Optional[int]
+    today: datetime.datetime
+
+    @classmethod
+    def from_event(cls) -> "RunContext":
+        return cls(
+            advertising_account_id=Event.advertising_account_id,
+            portfolio_id=Event.portfolio_id,
+            today=Event.today,
+        )
+
+
+def current(context: Optional[RunContext] = None) -> RunContext:
+    """contextが渡されていればそれを、渡されていなければEventから作成したRunContextを返す
+
+    Args:
+        context (Optional[RunContext]): 処理の実行条件
+
+    Returns:
+        RunContext: 処理の実行条件
+    """
+    if context is not None:
+        return context
+
+    return RunContext.from_event()
@@ -71,8 +71,9 @@ def _prepare_df(
     cvr_prediction_df,
     spa_prediction_df,
     pid_controller_df,
+    context=None,
 ):
-    today = args.Event.today
+    today = args.current(context).today
     df = pd.merge(
         ad_input_json_df, target_ad_df,
         how="left", on=config.AD_KEY + config.DATE_KEY, suffixes=["", "_target"])
@@ -135,32 +136,34 @@ def exec(
     spa_prediction_df,
     pid_controller_df,
     campaign_all_actual_df,
+    context=None,
 ):
+    context = args.current(context)
     if pid_controller_df is None:
         logger.error(
             "Skip bid_optimiser process, pid_controller result is None."
-            f" advertising_account_id: {args.Event.advertising_account_id},"
-            f" portfolio_id: {args.Event.portfolio_id}"
+            f" advertising_account_id: {context.advertising_account_id},"
+            f" portfolio_id: {context.portfolio_id}"
         )
         return None
     elif all(pid_controller_df["is_skip_pid_calc_state"]):
         logger.warning(
             "Skip bid_optimiser process, pid_controller calc is skipped."
-            f" advertising_account_id: {args.Event.advertising_account_id},"
-            f" portfolio_id: {args.Event.portfolio_id}"
+            f" advertising_account_id: {context.advertising_account_id},"
+            f" portfolio_id: {context.portfolio_id}"
         )
         return None
     elif all(pid_controller_df["valid_ads_num"] == 0):
         logger.warning(
             "Skip bid_optimiser process, valid_ads_num is zero and pid_controller calc is skipped."
-            f" advertising_account_id: {args.Event.advertising_account_id},"
-            f" portfolio_id: {args.Event.portfolio_id}"
+            f" advertising_account_id: {context.advertising_account_id},"
+            f" portfolio_id: {context.portfolio_id}"
         )
         return None
     else:
         return BIDCalculationService(
             preprocessor=BIDPreprocessor(),
-            calculator=BIDCalculator(args.Event.today),
+            calculator=BIDCalculator(context.today),
         ).calc(
             df=_prepare_df(
                 target_unit_df,
@@ -170,9 +173,10 @@ def exec(
                 cvr_prediction_df,
                 spa_prediction_df,
                 pid_controller_df,
+                context,
             ),
-            campaign_all_actual_df=prepare_df.add_unit_key(campaign_all_actual_df),
+            campaign_all_actual_df=prepare_df.add_unit_key(campaign_all_actual_df, context),
             bidding_algorithm=_BIDDING_ALGORITHM,
-            advertising_account_id=args.Event.advertising_account_id,
-            portfolio_id=args.Event.portfolio_id,
+            advertising_account_id=context.advertising_account_id,
+            portfolio_id=context.portfolio_id,
         )
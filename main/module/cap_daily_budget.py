@@ -17,8 +17,9 @@ _INPUT_DAILY_DF_COLS = INPUT_DAILY_COLUMNS
 def _prepare_df(
     _ad_input_json_df, lastday_cap_weight_df, lastday_ml_result_unit_df,
     target_campaign_df, target_unit_df, campaign_info_df, daily_budget_boost_coefficient_df,
+    context=None,
 ):
-    today = args.Event.today
+    today = args.current(context).today
     yesterday = today - datetime.timedelta(days=1)
 
     df = _ad_input_json_df.groupby(
@@ -28,7 +29,7 @@ def _prepare_df(
         + ["daily_budget", "minimum_daily_budget", "maximum_daily_budget"]
     ]
 
-    df["date"] = args.Event.today
+    df["date"] = today
 
     df["yesterday_target_cost"] = (
         lastday_ml_result_unit_df["target_cost"].values[0]
@@ -87,14 +88,17 @@ def exec(
     campaign_info_df,
     campaign_all_actual_df,
     daily_budget_boost_coefficient_df,
+    context=None,
 ):
+    context = args.current(context)
     return CAPCalculationService(
-        preprocessor=CAPPreprocessor(args.Event.today),
-        calculator=CAPCalculator(args.Event.today),
+        preprocessor=CAPPreprocessor(context.today),
+        calculator=CAPCalculator(context.today),
     ).calc(
         *_prepare_df(
             ad_input_json_df, lastday_cap_weight_df, lastday_ml_result_unit_df,
             target_campaign_df, target_unit_df, campaign_info_df, daily_budget_boost_coefficient_df,
+            context,
         ),
-        prepare_df.add_unit_key(campaign_all_actual_df),
+        prepare_df.add_unit_key(campaign_all_actual_df, context),
     )
@@ -1,33 +1,36 @@
 import os
 from spai.service.cpc.service import CPCPredictionService
 from spai.service.cpc.preprocess import CPCPreprocessor
-from spai.service.cpc.estimator import CPCEstimator
+from spai.service.cpc.estimator import CPCEstimator, CPCModel
+from common_module.prediction_cache import get_prediction_cache
 from common_module.datamanage_util import (
-    read_s3_manager,
-    read_labelencoder_manager,
+    CPC_LATEST_BUNDLE_KEY,
     CPC_LATEST_LABEL_ENCODER_PREFIX,
     CPC_LATEST_MODEL_BIN_KEY,
 )
-from module import args
+from module import args, libs
 
 
-def exec(ad_df, campaign_placement_df):
-    today = args.Event.today
+def exec(kpi_features_df, campaign_placement_df, context=None):
+    today = args.current(context).today
     BUCKET = os.environ["BUCKET"]
+    model_reader, label_encoder_reader = libs.model_readers(
+        BUCKET,
+        CPC_LATEST_BUNDLE_KEY,
+        CPC_LATEST_MODEL_BIN_KEY,
+        CPC_LATEST_LABEL_ENCODER_PREFIX,
+        CPCModel,
+    )
 
     return CPCPredictionService(
         preprocessor=CPCPreprocessor(
             label_encoder_writer=None,
-            label_encoder_reader=read_labelencoder_manager(
-                BUCKET, CPC_LATEST_LABEL_ENCODER_PREFIX
-            ),
+            label_encoder_reader=label_encoder_reader,
             is_use_dask=False,
         ),
         estimator=CPCEstimator(
-            model_reader=read_s3_manager(
-                BUCKET,
-                CPC_LATEST_MODEL_BIN_KEY,
-            ),
+            model_reader=model_reader,
             is_tune=False,
+            prediction_cache=get_prediction_cache(),
         ),
-    ).predict(ad_df, campaign_placement_df, today)
+    ).predict_features(kpi_features_df, campaign_placement_df, today)
@@ -1,33 +1,36 @@
 import os
 from spai.service.cvr.service import CVRPredictionService
 from spai.service.cvr.preprocess import CVRPreprocessor
-from spai.service.cvr.estimator import CVREstimator
+from spai.service.cvr.estimator import CVREstimator, CVRModel
+from common_module.prediction_cache import get_prediction_cache
 from common_module.datamanage_util import (
-    read_s3_manager,
-    read_labelencoder_manager,
+    CVR_LATEST_BUNDLE_KEY,
     CVR_LATEST_LABEL_ENCODER_PREFIX,
     CVR_LATEST_MODEL_BIN_KEY,
 )
-from module import args
+from module import args, libs
 
 
-def exec(ad_df, keyword_queries_df):
-    today = args.Event.today
+def exec(kpi_features_df, context=None):
+    today = args.current(context).today
     BUCKET = os.environ["BUCKET"]
+    model_reader, label_encoder_reader = libs.model_readers(
+        BUCKET,
+        CVR_LATEST_BUNDLE_KEY,
+        CVR_LATEST_MODEL_BIN_KEY,
+        CVR_LATEST_LABEL_ENCODER_PREFIX,
+        CVRModel,
+    )
 
     return CVRPredictionService(
         preprocessor=CVRPreprocessor(
             label_encoder_writer=None,
-            label_encoder_reader=read_labelencoder_manager(
-                BUCKET, CVR_LATEST_LABEL_ENCODER_PREFIX
-            ),
+            label_encoder_reader=label_encoder_reader,
             is_use_dask=False,
         ),
         estimator=CVREstimator(
-            model_reader=read_s3_manager(
-                BUCKET,
-                CVR_LATEST_MODEL_BIN_KEY,
-            ),
+            model_reader=model_reader,
             is_tune=False,
+            prediction_cache=get_prediction_cache(),
         ),
-    ).predict(ad_df, keyword_queries_df, today)
+    ).predict_features(kpi_features_df, today)
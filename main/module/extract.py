@@ -1,9 +1,13 @@
 import os
+import time
+import threading
+import contextvars
 from collections import ChainMap
+from concurrent.futures import Future, ThreadPoolExecutor
 
-import pandas as pd
 from common_module.logger_util import get_custom_logger
-from common_module.bigquery_util import BigQueryService
+from common_module import metrics_util
+from common_module.bigquery_util import BigQueryService, template_registry
 
 from spai.service.pid.config import ML_LOOKUP_DAYS
 
@@ -17,88 +21,349 @@ _DATASET_NAME = os.environ["DATASET_NAME"]
 _COMMERCE_FLOW_DATASET_NAME = os.environ["COMMERCE_FLOW_DATASET_NAME"]
 _USE_CACHE = os.environ.get("USE_BQ_CACHE", "no") == "yes"
 
+BATCH_KEY_COLUMNS = [
+    "batch_advertising_account_id",
+    "batch_portfolio_id",
+]
+
+# 日中に変更されうる設定値を含むSQLのキャッシュ有効期間(秒)
+_SETTING_CACHE_TTL_SEC = 60 * 60
+
+# 全SQL共通の列のdtype
+_BASE_DTYPES = {
+    "date": "datetime64[ns]",
+    "portfolio_id": "Int64",
+    "batch_portfolio_id": "Int64",
+}
+
+# 抽出対象のSQLと抽出時のオプション
+# prefetch: Falseのものは条件によってのみ使うため、prefetchでは投入せず必要になった時点で抽出する
+_TEMPLATE_OPTIONS = {
+    "unit_info.tpl.sql": {"dtypes": {"start": "datetime64[ns]"}, "cache_ttl": _SETTING_CACHE_TTL_SEC},
+    "campaign_info.tpl.sql": {"cache_ttl": _SETTING_CACHE_TTL_SEC},
+    "campaign_all_actual.tpl.sql": {},
+    "ad_info.tpl.sql": {"cache_ttl": _SETTING_CACHE_TTL_SEC},
+    "ad_target_actual.tpl.sql": {},
+    "daily_budget_boost_coefficient.tpl.sql": {},
+    "campaign_placement.tpl.sql": {},
+    "keyword_queries.tpl.sql": {},
+    "lastday_ml_result_unit.tpl.sql": {},
+    "lastday_ml_result_campaign.tpl.sql": {},
+    "lastday_ml_result_ad.tpl.sql": {},
+    "ml_applied_history.tpl.sql": {"add_params": {"ml_lookup_days": ML_LOOKUP_DAYS}, "prefetch": False},
+    "ad_input_json.tpl.sql": {
+        "dtypes": {
+            "sales": "float64",
+            "costs": "float64",
+            "bidding_price": "float64",
+            "daily_budget": "float64",
+        },
+        "cache_ttl": _SETTING_CACHE_TTL_SEC,
+    },
+}
+
+# advertising_account単位で抽出し、portfolioごとに切り出して使うSQL
+_ACCOUNT_SCOPE_TEMPLATES = [
+    "campaign_all_actual.tpl.sql",
+    "campaign_placement.tpl.sql",
+    "keyword_queries.tpl.sql",
+    "ad_target_actual.tpl.sql",
+]
+
+
+def _extract_options(sqlfile):
+    """_TEMPLATE_OPTIONSのうち、_extractに渡すオプション"""
+    return {k: v for k, v in _TEMPLATE_OPTIONS.get(sqlfile, {}).items() if k != "prefetch"}
+
+
 _bq = BigQueryService(
     project_id=_GCP_PROJECT_ID,
     dataset_name=_DATASET_NAME,
 )
 
+# advertising_account単位の抽出結果を保持する秒数。SQLにcache_ttlがあればその短い方とする
+_ACCOUNT_RESULTS_TTL_SEC = int(os.environ.get("EXTRACT_ACCOUNT_RESULTS_TTL_SEC", 10 * 60))
+
+# advertising_account単位の抽出結果。(sqlfile, advertising_account_id, today) -> (Future, 抽出開始日時)
+_account_results = {}
+_account_results_lock = threading.Lock()
 
-def _extract(sqlfile, extra_date_columns=[], add_params={}):
+
+def _extract(
+    sqlfile, context=None, dtypes={}, add_params={}, units=None, cache_ttl=None, account_scope=False,
+):
     logger.info(sqlfile)
-    df = _bq.extract_to_df(
+    context = args.current(context)
+    params = {
+        "today": context.today.strftime("%Y-%m-%d"),
+        "project": _GCP_PROJECT_ID,
+        "dataset": _DATASET_NAME,
+        "commerce_flow_dataset": _COMMERCE_FLOW_DATASET_NAME,
+        "advertising_account_id": context.advertising_account_id,
+        "portfolio_id": context.portfolio_id,
+    }
+    if units is not None:
+        params["units"] = units
+    if account_scope:
+        params["account_scope"] = True
+
+    return _bq.extract_to_df(
         os.path.join(os.path.dirname(__file__), "../sql"),
         sqlfile,
-        ChainMap(
-            {
-                "today": args.Event.today.strftime("%Y-%m-%d"),
-                "project": _GCP_PROJECT_ID,
-                "dataset": _DATASET_NAME,
-                "commerce_flow_dataset": _COMMERCE_FLOW_DATASET_NAME,
-                "advertising_account_id": args.Event.advertising_account_id,
-                "portfolio_id": args.Event.portfolio_id,
-            },
-            add_params,
-        ),
+        ChainMap(params, add_params),
         use_cache=_USE_CACHE,
+        cache_ttl=cache_ttl,
+        dtypes=ChainMap(dtypes, _BASE_DTYPES),
     )
 
-    if "date" in df.columns:
-        df["date"] = pd.to_datetime(df["date"])
 
-    if "portfolio_id" in df.columns:
-        df["portfolio_id"] = df["portfolio_id"].astype("Int64")
+def slice_unit(df, advertising_account_id, portfolio_id):
+    """batch抽出結果から指定unitの行を切り出し、batch用のキー列を除いて返す
 
-    for col in extra_date_columns:
-        df[col] = pd.to_datetime(df[col])
+    Args:
+        df (pd.DataFrame): batch抽出結果
+        advertising_account_id (int): 切り出すunitのadvertising_account_id
+        portfolio_id (Optional[int]): 切り出すunitのportfolio_id
 
-    return df
+    Returns:
+        pd.DataFrame: 指定unitの抽出結果
+    """
+    is_target = df["batch_advertising_account_id"] == advertising_account_id
+    if portfolio_id is None:
+        is_target &= df["batch_portfolio_id"].isna()
+    else:
+        is_target &= (df["batch_portfolio_id"] == portfolio_id).fillna(False)
 
+    return df.loc[is_target.values].drop(columns=BATCH_KEY_COLUMNS).reset_index(drop=True)
 
-def basic():
-    unit_info_df = _extract("unit_info.tpl.sql", extra_date_columns=["start"])
-    unit_info_df = prepare_df.add_unit_info_setting_columns(unit_info_df)
-    return (
-        unit_info_df,
-        _extract("campaign_info.tpl.sql"),
-        _extract("campaign_all_actual.tpl.sql"),
-        _extract("ad_info.tpl.sql"),
-        _extract("ad_target_actual.tpl.sql"),
-        _extract("daily_budget_boost_coefficient.tpl.sql"),
-    )
 
+def _extract_account(sqlfile, context, **options):
+    """contextのadvertising_accountの全portfolio分を抽出する
 
-def campaign_placement():
-    return _extract("campaign_placement.tpl.sql")
+    同一account・同一日付の結果はプロセス内で共有し、SQLは1回だけ実行する。
+    保持するのは直近のaccount・日付の結果のみとし、_ACCOUNT_RESULTS_TTL_SEC(cache_ttl)を過ぎたものは再抽出する。
+    """
+    account = (context.advertising_account_id, context.today)
+    key = (sqlfile, *account)
+    ttl_sec = min(options.get("cache_ttl") or _ACCOUNT_RESULTS_TTL_SEC, _ACCOUNT_RESULTS_TTL_SEC)
+    with _account_results_lock:
+        for k in [k for k in _account_results if k[1:] != account]:
+            del _account_results[k]
 
+        entry = _account_results.get(key)
+        if entry is not None and time.monotonic() - entry[1] > ttl_sec:
+            entry = None
+        is_owner = entry is None
+        if is_owner:
+            entry = _account_results[key] = (Future(), time.monotonic())
+        future = entry[0]
 
-def keyword_queries():
-    return _extract("keyword_queries.tpl.sql")
+    if is_owner:
+        try:
+            future.set_result(_extract(sqlfile, context, account_scope=True, **options))
+        except Exception as e:
+            with _account_results_lock:
+                if _account_results.get(key, (None,))[0] is future:
+                    del _account_results[key]
+            future.set_exception(e)
 
+    return future.result()
 
-def lastday_ml_result_ad():
-    return _extract("lastday_ml_result_ad.tpl.sql")
 
+class Extractor:
+    """RunContextのunitを対象にBigQueryからデータを抽出する
 
-def lastday_ml_result_campaign():
-    return _extract("lastday_ml_result_campaign.tpl.sql")
+    各メソッドのcontextを省略した場合はargs.Eventのunitを対象とする。
+    max_workersを指定した場合、prefetchで依存関係のない全SQLをスレッドプールに投入し、
+    各処理は必要な抽出結果の完了のみを待つ。
+    """
 
+    def __init__(self, max_workers=None, account_scope=False):
+        """
+        Args:
+            max_workers (Optional[int]): 並列抽出のスレッド数。未指定の場合は逐次抽出する
+            account_scope (bool): _ACCOUNT_SCOPE_TEMPLATESのSQLをadvertising_account単位で抽出し、
+                portfolioごとに切り出すか
+        """
+        self._executor = (
+            ThreadPoolExecutor(max_workers=max_workers) if max_workers else None
+        )
+        self._account_scope = account_scope
+        self._futures = {}
+        self._timings = {}
 
-def lastday_ml_result_unit():
-    return _extract("lastday_ml_result_unit.tpl.sql")
+    def _key(self, sqlfile, context):
+        return (sqlfile, context)
 
+    def _run(self, sqlfile, context):
+        options = _extract_options(sqlfile)
+        if self._account_scope and sqlfile in _ACCOUNT_SCOPE_TEMPLATES:
+            return slice_unit(
+                _extract_account(sqlfile, context, **options),
+                context.advertising_account_id,
+                context.portfolio_id,
+            )
 
-def ml_applied_history():
-    return _extract(
-        "ml_applied_history.tpl.sql", add_params={"ml_lookup_days": ML_LOOKUP_DAYS}
-    )
+        return _extract(sqlfile, context, **options)
+
+    def _timed_run(self, sqlfile, context):
+        start = time.perf_counter()
+        df = self._run(sqlfile, context)
+        latency = time.perf_counter() - start
+        self._timings[self._key(sqlfile, context)] = {"latency": latency}
+        metrics_util.record(
+            f"extract.{sqlfile}", latency, outputs=df,
+            advertising_account_id=context.advertising_account_id,
+            portfolio_id=context.portfolio_id,
+        )
+        return df
+
+    def prefetch(self, context=None):
+        """未投入のSQLをすべてスレッドプールに投入する。prefetch: FalseのSQLは投入しない
+
+        Args:
+            context (Optional[RunContext]): 対象unitの実行条件
+        """
+        if self._executor is None:
+            return
+
+        context = args.current(context)
+        for sqlfile, options in _TEMPLATE_OPTIONS.items():
+            if not options.get("prefetch", True):
+                continue
+            key = self._key(sqlfile, context)
+            if key not in self._futures:
+                # メトリクスのタグ(unit)などのコンテキストを引き継ぐ
+                self._futures[key] = self._executor.submit(
+                    contextvars.copy_context().run, self._timed_run, sqlfile, context)
+
+    def _result(self, sqlfile, context):
+        key = self._key(sqlfile, context)
+        future = self._futures.get(key)
+        if future is None:
+            return self._timed_run(sqlfile, context)
+
+        start = time.perf_counter()
+        df = future.result()
+        self._timings[key]["wait"] = (
+            self._timings[key].get("wait", 0.0) + time.perf_counter() - start
+        )
+        return df
+
+    def _extract(self, sqlfile, context=None):
+        return self._result(sqlfile, args.current(context))
+
+    def report(self):
+        """SQLごとの抽出時間と、並列化により待たずに済んだ時間を返す
+
+        Returns:
+            List[Dict[str, Any]]: sqlfile, latency(抽出時間), wait(結果待ち時間), saved(短縮時間)
+        """
+        report = []
+        for key, timing in self._timings.items():
+            wait = timing.get("wait", timing["latency"])
+            report.append({
+                "sqlfile": key[0],
+                "latency": timing["latency"],
+                "wait": wait,
+                "saved": max(timing["latency"] - wait, 0.0),
+            })
+
+        for row in report:
+            logger.info(
+                f"extract {row['sqlfile']}: latency={row['latency']:.3f}s,"
+                f" wait={row['wait']:.3f}s, saved={row['saved']:.3f}s"
+            )
+        logger.info(f"extract total saved={sum(row['saved'] for row in report):.3f}s")
+        logger.info(f"sql render stats: {template_registry.stats}")
+        if _USE_CACHE:
+            logger.info(f"bq cache stats: {_bq.result_cache.stats}")
+
+        return report
+
+    def close(self):
+        if self._executor is None:
+            return
+
+        for future in self._futures.values():
+            future.cancel()
+        self._executor.shutdown(wait=False)
+
+    def basic(self, context=None):
+        unit_info_df = self._extract("unit_info.tpl.sql", context)
+        unit_info_df = prepare_df.add_unit_info_setting_columns(unit_info_df)
+        return (
+            unit_info_df,
+            self._extract("campaign_info.tpl.sql", context),
+            self._extract("campaign_all_actual.tpl.sql", context),
+            self._extract("ad_info.tpl.sql", context),
+            self._extract("ad_target_actual.tpl.sql", context),
+            self._extract("daily_budget_boost_coefficient.tpl.sql", context),
+        )
+
+    def campaign_placement(self, context=None):
+        return self._extract("campaign_placement.tpl.sql", context)
+
+    def keyword_queries(self, context=None):
+        return self._extract("keyword_queries.tpl.sql", context)
+
+    def lastday_ml_result_ad(self, context=None):
+        return self._extract("lastday_ml_result_ad.tpl.sql", context)
+
+    def lastday_ml_result_campaign(self, context=None):
+        return self._extract("lastday_ml_result_campaign.tpl.sql", context)
+
+    def lastday_ml_result_unit(self, context=None):
+        return self._extract("lastday_ml_result_unit.tpl.sql", context)
+
+    def ml_applied_history(self, context=None):
+        return self._extract("ml_applied_history.tpl.sql", context)
+
+    def ad_input_json(self, context=None):
+        df = self._extract("ad_input_json.tpl.sql", context)
+
+        return prepare_df.add_unit_key(df, context)
+
+
+class BatchExtractor(Extractor):
+    """複数unit分をSQL 1回(IN句)で抽出し、contextのunit分を切り出して返す
+
+    各SQLは全unit分をまとめて1回だけ抽出し、以降は保持した結果を使う。
+    """
+
+    def __init__(self, units, max_workers=None):
+        """
+        Args:
+            units (List[Dict[str, Any]]): advertising_account_id, portfolio_idを持つunitのリスト
+            max_workers (Optional[int]): 並列抽出のスレッド数。未指定の場合は逐次抽出する
+        """
+        super().__init__(max_workers)
+        self._units = [
+            {
+                "advertising_account_id": int(unit["advertising_account_id"]),
+                "portfolio_id": (
+                    int(unit["portfolio_id"]) if unit["portfolio_id"] is not None else None
+                ),
+            }
+            for unit in units
+        ]
+        self._results = {}
 
+    def _key(self, sqlfile, context):
+        # 全unit分をまとめて抽出するため、unitによらず日付ごとに1回とする
+        return (sqlfile, context.today)
 
-def ad_input_json():
-    df = _extract("ad_input_json.tpl.sql")
+    def _run(self, sqlfile, context):
+        return _extract(sqlfile, context, units=self._units, **_extract_options(sqlfile))
 
-    df["sales"] = df["sales"].astype(float)
-    df["costs"] = df["costs"].astype(float)
-    df["bidding_price"] = df["bidding_price"].astype(float)
-    df["daily_budget"] = df["daily_budget"].astype(float)
+    def _extract(self, sqlfile, context=None):
+        context = args.current(context)
+        key = self._key(sqlfile, context)
+        if key not in self._results:
+            self._results[key] = self._result(sqlfile, context)
 
-    return prepare_df.add_unit_key(df)
+        return slice_unit(
+            self._results[key],
+            context.advertising_account_id,
+            context.portfolio_id,
+        )
@@ -19,7 +19,7 @@ _bq = BigQueryService(
 
 def _extract(sqlfile, add_params={}):
     logger.info(sqlfile)
-    df = _bq.extract_to_df(
+    return _bq.extract_to_df(
         os.path.join(os.path.dirname(__file__), "../sql"),
         sqlfile,
         ChainMap(
@@ -30,13 +30,9 @@ def _extract(sqlfile, add_params={}):
             add_params,
         ),
         use_cache=_USE_CACHE,
+        dtypes={"portfolio_id": "Int64"},
     )
 
-    if "portfolio_id" in df.columns:
-        df["portfolio_id"] = df["portfolio_id"].astype("Int64")
-
-    return df
-
 
 def get_all_input_units(today):
     return _extract("get_all_input_units.tpl.sql", add_params={"today": today})
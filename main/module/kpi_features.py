@@ -0,0 +1,9 @@
+import datetime
+from spai.service.features import build_features
+from module import args
+
+
+def exec(ad_df, keyword_queries_df, context=None):
+    """cpc, cvr, spaの予測で共通の特徴量を、予測に使う前日の行について計算する"""
+    today = args.current(context).today
+    return build_features(ad_df, keyword_queries_df, today - datetime.timedelta(days=1))
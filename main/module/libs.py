@@ -1,14 +1,21 @@
 import os
 
+from botocore.exceptions import ClientError
+from spai.ai.bundle import ModelBundle
+from spai.ai.inference import LabelEncoder
+
+from common_module.artifact_cache import get_artifact_cache
 from common_module.aws_util import get_s3_file_list
+from common_module.datamanage_util import read_cached_s3_manager, read_cached_labelencoder_manager
 
 from module import args, output_csv, output_json
 
 
-def s3_output_prefix():
-    today = args.Event.today
-    advertising_account_id = args.Event.advertising_account_id
-    portfolio_id = args.Event.portfolio_id
+def s3_output_prefix(context=None):
+    context = args.current(context)
+    today = context.today
+    advertising_account_id = context.advertising_account_id
+    portfolio_id = context.portfolio_id
 
     y = today.year
     m = today.month
@@ -27,17 +34,61 @@ def s3_output_prefix():
     return date_predix, file_prefix
 
 
-def is_existing_today_outputs():
+def is_existing_today_outputs(context=None):
     OUTPUT_CSV_BUCKET = os.environ["OUTPUT_CSV_BUCKET"]
     OUTPUT_JSON_BUCKET = os.environ["OUTPUT_JSON_BUCKET"]
 
     for bucket, path in [
-        (OUTPUT_JSON_BUCKET, output_json.s3_output_path()),
-        (OUTPUT_CSV_BUCKET, output_csv.s3_output_path(output_csv.CSV_DATA_TYPE_UNIT)),
-        (OUTPUT_CSV_BUCKET, output_csv.s3_output_path(output_csv.CSV_DATA_TYPE_CAMPAIGN)),
-        (OUTPUT_CSV_BUCKET, output_csv.s3_output_path(output_csv.CSV_DATA_TYPE_AD)),
+        (OUTPUT_JSON_BUCKET, output_json.s3_output_path(context)),
+        (OUTPUT_CSV_BUCKET, output_csv.s3_output_path(output_csv.CSV_DATA_TYPE_UNIT, context)),
+        (OUTPUT_CSV_BUCKET, output_csv.s3_output_path(output_csv.CSV_DATA_TYPE_CAMPAIGN, context)),
+        (OUTPUT_CSV_BUCKET, output_csv.s3_output_path(output_csv.CSV_DATA_TYPE_AD, context)),
     ]:
         if len(get_s3_file_list(bucket, path)) != 0:
             return True
 
     return False
+
+
+def model_readers(bucket, bundle_key, model_key, label_encoder_prefix, model_class):
+    """予測モデルとLabelEncoderの読み込み関数を返す
+
+    モデルとLabelEncoderをまとめた成果物(bundle)があれば1回のGETで読み込み、
+    bundleがない場合(bundle導入前の学習結果)はモデルとLabelEncoderを個別に読み込む。
+    bundleがないことはArtifactCacheが記憶するため、unitごとやウォームスタートごとに再確認しない。
+
+    Args:
+        bucket (str): バケット名
+        bundle_key (str): bundleのキー
+        model_key (str): 個別のモデルのキー
+        label_encoder_prefix (str): 個別のLabelEncoderのprefix
+        model_class (Type[BaseModel]): モデルのクラス
+
+    Returns:
+        Tuple[Callable[[], BaseModel], Callable[[str], LabelEncoder]]: モデルとLabelEncoderの読み込み関数
+    """
+    state = {}
+
+    def _bundle():
+        if "bundle" not in state:
+            try:
+                state["bundle"] = get_artifact_cache().get(bucket, bundle_key, ModelBundle.from_bytes)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in ["NoSuchKey", "404"]:
+                    raise
+                state["bundle"] = None
+        return state["bundle"]
+
+    def _read_model():
+        bundle = _bundle()
+        if bundle is None:
+            return read_cached_s3_manager(bucket, model_key, model_class.from_bytes)()
+        return bundle.load_model(model_class)
+
+    def _read_label_encoder(name):
+        bundle = _bundle()
+        if bundle is None:
+            return read_cached_labelencoder_manager(bucket, label_encoder_prefix, LabelEncoder.from_bytes)(name)
+        return bundle.load_label_encoder(name)
+
+    return _read_model, _read_label_encoder
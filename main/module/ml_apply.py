@@ -8,8 +8,8 @@ from module import config, args
 _APPLIED_THRESHOLD = 0.5
 
 
-def exec(ad_target_actual_df, lastday_ml_result_ad_df):
-    today = args.Event.today
+def exec(ad_target_actual_df, lastday_ml_result_ad_df, context=None):
+    today = args.current(context).today
     if len(lastday_ml_result_ad_df) == 0:
         return False
 
@@ -53,6 +53,7 @@ def _prepare_df_unit(
     cap_daily_budget_df,
     pid_controller_df,
     lastday_ml_result_unit_df,
+    context=None,
 ):
     df = _group_and_merge(
         target_unit_df,
@@ -60,7 +61,7 @@ def _prepare_df_unit(
             (_none_to_zero(pid_controller_df, PID_OUTPUT_COLUMNS), ["", "_pid"]),
             (_none_to_zero(cap_daily_budget_df, CAP_OUTPUT_COLUMNS), ["", "_cap"]),
             (_none_to_zero(bid_optimiser_df, BID_OUTPUT_COLUMNS), ["", "_bid"]),
-            (prepare_df.add_unit_key(lastday_ml_result_unit_df), ["", "_yesterday"]),
+            (prepare_df.add_unit_key(lastday_ml_result_unit_df, context), ["", "_yesterday"]),
         ],
         key=config.UNIT_KEY,
     )
@@ -77,7 +78,7 @@ def _prepare_df_unit(
         df["target_kpi_value"]
     )
 
-    df["date"] = args.Event.today
+    df["date"] = args.current(context).today
 
     return df.rename(
         columns={
@@ -98,6 +99,7 @@ def _prepare_df_campaign(
     target_campaign_df,
     cap_daily_budget_df,
     ad_input_json_df,
+    context=None,
 ):
     df = _group_and_merge(
         target_campaign_df, [
@@ -107,7 +109,7 @@ def _prepare_df_campaign(
         key=config.CAMPAIGN_KEY,
     )
 
-    df["date"] = args.Event.today
+    df["date"] = args.current(context).today
 
     return df.rename(
         columns={
@@ -126,6 +128,7 @@ def _prepare_df_ad(
     target_pause_df,
     bid_optimiser_df,
     ad_input_json_df,
+    context=None,
 ):
 
     df = _group_and_merge(
@@ -141,7 +144,7 @@ def _prepare_df_ad(
         key=config.AD_KEY,
     )
 
-    df["date"] = args.Event.today
+    df["date"] = args.current(context).today
 
     return df.rename(
         columns={
@@ -173,6 +176,7 @@ def _prepare_df(
     pid_controller_df,
     ad_input_json_df,
     lastday_ml_result_unit_df,
+    context=None,
 ):
     unit_df = _prepare_df_unit(
         target_unit_df,
@@ -182,12 +186,14 @@ def _prepare_df(
         cap_daily_budget_df,
         pid_controller_df,
         lastday_ml_result_unit_df,
+        context,
     )
 
     campaign_df = _prepare_df_campaign(
         target_campaign_df,
         cap_daily_budget_df,
         ad_input_json_df,
+        context,
     )
 
     ad_df = _prepare_df_ad(
@@ -198,13 +204,14 @@ def _prepare_df(
         target_pause_df,
         bid_optimiser_df,
         ad_input_json_df,
+        context,
     )
 
     return unit_df, campaign_df, ad_df
 
 
-def s3_output_path(data_type):
-    date_prefix, file_prefix = libs.s3_output_prefix()
+def s3_output_path(data_type, context=None):
+    date_prefix, file_prefix = libs.s3_output_prefix(context)
 
     return os.path.join(
         os.environ["OUTPUT_CSV_PREFIX"],
@@ -226,6 +233,7 @@ def exec(
     pid_controller_df,
     ad_input_json_df,
     lastday_ml_result_unit_df,
+    context=None,
 ):
     OUTPUT_CSV_BUCKET = os.environ["OUTPUT_CSV_BUCKET"]
 
@@ -243,11 +251,12 @@ def exec(
         pid_controller_df,
         ad_input_json_df,
         lastday_ml_result_unit_df,
+        context,
     )
 
     write_df_to_s3(
-        ml_result_unit_df, OUTPUT_CSV_BUCKET, s3_output_path(CSV_DATA_TYPE_UNIT))
+        ml_result_unit_df, OUTPUT_CSV_BUCKET, s3_output_path(CSV_DATA_TYPE_UNIT, context))
     write_df_to_s3(
-        ml_result_campaign_df, OUTPUT_CSV_BUCKET, s3_output_path(CSV_DATA_TYPE_CAMPAIGN))
+        ml_result_campaign_df, OUTPUT_CSV_BUCKET, s3_output_path(CSV_DATA_TYPE_CAMPAIGN, context))
     write_df_to_s3(
-        ml_result_ad_df, OUTPUT_CSV_BUCKET, s3_output_path(CSV_DATA_TYPE_AD))
+        ml_result_ad_df, OUTPUT_CSV_BUCKET, s3_output_path(CSV_DATA_TYPE_AD, context))
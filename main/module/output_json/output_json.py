@@ -29,8 +29,8 @@ _INPUT_DF_COLS = [
 ]
 
 
-def s3_output_path():
-    date_prefix, file_prefix = libs.s3_output_prefix()
+def s3_output_path(context=None):
+    date_prefix, file_prefix = libs.s3_output_prefix(context)
 
     return os.path.join(
         os.environ["OUTPUT_JSON_PREFIX"], f"{date_prefix}/{file_prefix}.json"
@@ -38,7 +38,7 @@ def s3_output_path():
 
 
 def _prepare_df(
-    ad_input_json_df, bid_optimiser_df, cap_daily_budget_df, target_pause_df
+    ad_input_json_df, bid_optimiser_df, cap_daily_budget_df, target_pause_df, context=None
 ):
     df = ad_input_json_df.sort_values(
         config.CAMPAIGN_KEY + config.AD_KEY + config.DATE_KEY
@@ -55,7 +55,7 @@ def _prepare_df(
         )
     )
 
-    prepare_df.add_unit_key(df)
+    prepare_df.add_unit_key(df, context)
 
     if bid_optimiser_df is None:
         df["bidding_price"] = df["last_bidding_price"]
@@ -100,9 +100,10 @@ def _prepare_df(
     return df[_INPUT_DF_COLS]
 
 
-def exec(ad_input_json_df, bid_optimiser_df, cap_daily_budget_df, target_pause_df):
-    advertising_account_id = args.Event.advertising_account_id
-    portfolio_id = args.Event.portfolio_id
+def exec(ad_input_json_df, bid_optimiser_df, cap_daily_budget_df, target_pause_df, context=None):
+    context = args.current(context)
+    advertising_account_id = context.advertising_account_id
+    portfolio_id = context.portfolio_id
 
     write_json_to_s3(
         OutputRootSchema().dumps(
@@ -114,9 +115,10 @@ def exec(ad_input_json_df, bid_optimiser_df, cap_daily_budget_df, target_pause_d
                     bid_optimiser_df,
                     cap_daily_budget_df,
                     target_pause_df,
+                    context,
                 ),
             ).get_formatted()
         ),
         os.environ["OUTPUT_JSON_BUCKET"],
-        s3_output_path(),
+        s3_output_path(context),
     )
@@ -107,8 +107,9 @@ def _prepare_df(
     cpc_prediction_df,
     cvr_prediction_df,
     spa_prediction_df,
+    context=None,
 ):
-    today = args.Event.today
+    today = args.current(context).today
     yesterday = today - datetime.timedelta(days=1)
 
     pid_reuslt_columns = [
@@ -214,12 +215,13 @@ def exec(
     cpc_prediction_df,
     cvr_prediction_df,
     spa_prediction_df,
+    context=None,
 ):
-
+    context = args.current(context)
     try:
         return PIDCalculationService(
             preprocessor=PIDPreprocessor(),
-            calculator=PIDCalculator(args.Event.today),
+            calculator=PIDCalculator(context.today),
         ).calc(
             _prepare_df(
                 df,
@@ -230,14 +232,15 @@ def exec(
                 cpc_prediction_df,
                 cvr_prediction_df,
                 spa_prediction_df,
+                context,
             ),
             campaign_all_actual_df,
         )
     except Exception as e:
         logger.error(
             "pid_controller raises exception."
-            f" advertising_account_id: {args.Event.advertising_account_id},"
-            f" portfolio_id: {args.Event.portfolio_id}\n"
+            f" advertising_account_id: {context.advertising_account_id},"
+            f" portfolio_id: {context.portfolio_id}\n"
             f"\n[error]{e}\n[traceback]{traceback.format_exc()}"
         )
         return None
@@ -0,0 +1,258 @@
+import time
+import threading
+import contextvars
+import multiprocessing
+import pandas as pd
+from dataclasses import dataclass, field
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+from common_module.logger_util import get_custom_logger
+from common_module import metrics_util
+
+logger = get_custom_logger()
+
+
+@dataclass
+class Stage:
+    """パイプラインの処理単位
+
+    funcはinputsの値を引数として呼ばれ、outputsの値を返す。
+    outputsが1つの場合は戻り値をそのまま、複数の場合はタプルで返す。
+    use_processがTrueの処理はプロセスプールで実行するため、funcはpickle可能なモジュール関数とし、
+    unitの情報(RunContext)などの実行条件は全てinputsで受け取る。
+    copy_inputsがTrueの処理には入力のDataFrameのコピーを渡す。
+    入力を変更する処理を、同じ入力を参照する他の処理と並行に実行する場合に指定する。
+    """
+    name: str
+    func: Callable
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    use_process: bool = False
+    copy_inputs: bool = False
+
+
+def _timed_call(func, inputs):
+    start = time.perf_counter()
+    result = func(*inputs)
+    return result, time.perf_counter() - start, []
+
+
+def _process_call(func, inputs):
+    # 子プロセスで記録したメトリクス(予測値のキャッシュのヒットなど)は、親プロセスへ返して記録する
+    with metrics_util.collect() as records:
+        result, elapsed, _ = _timed_call(func, inputs)
+    return result, elapsed, records
+
+
+def _validate(stages, values):
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers or output in values:
+                raise ValueError(f"{output} is produced more than once")
+            producers[output] = stage.name
+
+    for stage in stages:
+        for name in stage.inputs:
+            if name not in producers and name not in values:
+                raise ValueError(f"{stage.name}: input {name} is not produced by any stage")
+
+    return producers
+
+
+def critical_path(stages, timings):
+    """所要時間が最長となる処理の経路を返す
+
+    Args:
+        stages (List[Stage]): 処理のリスト
+        timings (Dict[str, float]): 処理名ごとの所要時間(秒)
+
+    Returns:
+        Tuple[List[str], float]: 経路上の処理名と、経路の所要時間(秒)
+    """
+    producers = {output: stage.name for stage in stages for output in stage.outputs}
+    stage_map = {stage.name: stage for stage in stages}
+    finished = {}
+    previous = {}
+
+    def _finish(name):
+        if name not in finished:
+            upstream = {producers[i] for i in stage_map[name].inputs if i in producers}
+            before = max(upstream, key=_finish, default=None)
+            previous[name] = before
+            finished[name] = timings.get(name, 0.0) + (_finish(before) if before else 0.0)
+        return finished[name]
+
+    last = max(stage_map, key=_finish, default=None)
+    if last is None:
+        return [], 0.0
+
+    path = []
+    name = last
+    while name is not None:
+        path.append(name)
+        name = previous[name]
+
+    return path[::-1], finished[last]
+
+
+# コンテナ内で共有するプロセスプール。プロセス数 -> ProcessPoolExecutor(使えない場合はNone)
+_process_pools = {}
+_process_pools_lock = threading.Lock()
+
+
+def process_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """workers個のプロセスのプールを返す。コンテナ内で1回だけ作成し、以降の実行(unit)で再利用する
+
+    プロセスの起動やimportを実行ごとに行わず、子プロセス内のArtifactCacheやモデルのキャッシュも保持される。
+    プロセスプールを使えない環境ではNoneを返す。
+
+    Args:
+        workers (int): プロセス数
+
+    Returns:
+        Optional[ProcessPoolExecutor]: プロセスプール
+    """
+    with _process_pools_lock:
+        if workers not in _process_pools:
+            try:
+                # 抽出のスレッドが動作中にforkしないよう、spawnでプロセスを起動する
+                _process_pools[workers] = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            except (OSError, NotImplementedError) as e:
+                # /dev/shmのないLambda環境などではプロセスプールを使えないため、スレッドで実行する
+                logger.warning(f"process pool is not available, fallback to threads: {e}")
+                _process_pools[workers] = None
+        return _process_pools[workers]
+
+
+def _discard_process_pool(workers: int):
+    """子プロセスの異常終了で使えなくなったプールを破棄し、次の実行で作り直す"""
+    with _process_pools_lock:
+        executor = _process_pools.pop(workers, None)
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+class Pipeline:
+    """依存関係を宣言した処理(Stage)を、入力が揃ったものから並行に実行する"""
+
+    def __init__(self, stages: List[Stage], max_workers: int = 4, process_workers: int = 0):
+        """
+        Args:
+            stages (List[Stage]): 処理のリスト
+            max_workers (int): スレッドで実行する処理の並列数
+            process_workers (int): use_processの処理を実行するプロセス数。0の場合はスレッドで実行する
+        """
+        self._stages = stages
+        self._max_workers = max_workers
+        self._process_workers = process_workers
+        self.timings = {}
+
+    def _process_executor(self):
+        if self._process_workers <= 0:
+            return None
+
+        return process_pool(self._process_workers)
+
+    def _submit(self, stage, values, thread_executor, process_executor):
+        inputs = [values[name] for name in stage.inputs]
+        if stage.use_process and process_executor is not None:
+            # プロセスへはpickleで渡るため、コピーは不要
+            return process_executor.submit(_process_call, stage.func, inputs)
+
+        if stage.copy_inputs:
+            inputs = [v.copy() if isinstance(v, pd.DataFrame) else v for v in inputs]
+
+        # メトリクスのタグ(unit)などのコンテキストを引き継ぐ
+        return thread_executor.submit(contextvars.copy_context().run, _timed_call, stage.func, inputs)
+
+    def _store(self, stage, result, values):
+        if len(stage.outputs) == 1:
+            values[stage.outputs[0]] = result
+        elif len(stage.outputs) > 1:
+            values.update(zip(stage.outputs, result))
+
+    def run(self, values: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """全ての処理を実行する
+
+        Args:
+            values (Optional[Dict[str, Any]]): 処理の外部から与える入力
+
+        Returns:
+            Dict[str, Any]: 各処理の出力。後続の処理で使い終えた出力は含まない
+        """
+        values = dict(values or {})
+        _validate(self._stages, values)
+        self.timings = {}
+
+        # 出力を参照する処理が全て終わったら値を破棄し、メモリを解放する
+        consumers = {}
+        for stage in self._stages:
+            for name in stage.inputs:
+                consumers[name] = consumers.get(name, 0) + 1
+
+        pending = list(self._stages)
+        running = {}
+        process_executor = self._process_executor()
+        thread_executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        try:
+            while pending or running:
+                for stage in [s for s in pending if all(i in values for i in s.inputs)]:
+                    pending.remove(stage)
+                    running[self._submit(stage, values, thread_executor, process_executor)] = stage
+
+                if not running:
+                    raise ValueError(f"stages can not be executed: {[s.name for s in pending]}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        result, elapsed, records = future.result()
+                    except BrokenProcessPool:
+                        _discard_process_pool(self._process_workers)
+                        raise
+                    metrics_util.add(records)
+                    self.timings[stage.name] = elapsed
+                    metrics_util.record(
+                        f"stage.{stage.name}", elapsed, [values[name] for name in stage.inputs], result)
+                    self._store(stage, result, values)
+
+                    for name in stage.inputs:
+                        consumers[name] -= 1
+                        if consumers[name] == 0:
+                            values.pop(name, None)
+        finally:
+            for future in running:
+                future.cancel()
+            # プロセスプールは以降の実行で再利用するため、終了しない
+            thread_executor.shutdown(wait=True)
+
+        return values
+
+    def report(self):
+        """処理ごとの所要時間とクリティカルパスをログに出力して返す
+
+        Returns:
+            Dict[str, Any]: timings(処理ごとの所要時間), critical_path, critical_path_sec
+        """
+        path, path_sec = critical_path(self._stages, self.timings)
+        for name, elapsed in self.timings.items():
+            logger.info(f"stage {name}: {elapsed:.3f}s")
+        logger.info(f"critical path ({path_sec:.3f}s): {' -> '.join(path)}")
+
+        return {
+            "timings": dict(self.timings),
+            "critical_path": path,
+            "critical_path_sec": path_sec,
+        }
@@ -153,9 +153,10 @@ def _weekly_ema_costs(_df, today, keys, prefix):
     return df[keys + [f"{prefix}_weekly_ema_costs"]]
 
 
-def add_unit_key(df):
-    df["advertising_account_id"] = args.Event.advertising_account_id
-    df["portfolio_id"] = args.Event.portfolio_id
+def add_unit_key(df, context=None):
+    context = args.current(context)
+    df["advertising_account_id"] = context.advertising_account_id
+    df["portfolio_id"] = context.portfolio_id
 
     return df.astype(config.UNIT_KEY_DTYPES)
 
@@ -212,8 +213,9 @@ def commons(
     ad_info_df,
     ad_target_actual_df,
     daily_budget_boost_coefficient_df,
+    context=None,
 ):
-    today = args.Event.today
+    today = args.current(context).today
     yesterday = today - datetime.timedelta(days=1)
 
     target_kpi = unit_info_df["target_kpi"].values[0]
@@ -227,7 +229,7 @@ def commons(
     )
 
     all_campaign_df = pd.merge(
-        add_unit_key(campaign_all_actual_df),
+        add_unit_key(campaign_all_actual_df, context),
         campaign_info_df,
         how="left",
         on=config.UNIT_KEY + config.CAMPAIGN_KEY,
@@ -1,34 +1,37 @@
 import os
 from spai.service.spa.service import SPAPredictionService
 from spai.service.spa.preprocess import SPAPreprocessor
-from spai.service.spa.estimator import SPAEstimator
+from spai.service.spa.estimator import SPAEstimator, SPAModel
+from common_module.prediction_cache import get_prediction_cache
 from common_module.datamanage_util import (
-    read_s3_manager,
-    read_labelencoder_manager,
+    SPA_LATEST_BUNDLE_KEY,
     SPA_LATEST_LABEL_ENCODER_PREFIX,
     SPA_LATEST_MODEL_BIN_KEY,
 )
 
-from module import args
+from module import args, libs
 
 
-def exec(ad_df, keyword_queries_df):
-    today = args.Event.today
+def exec(kpi_features_df, context=None):
+    today = args.current(context).today
     BUCKET = os.environ["BUCKET"]
+    model_reader, label_encoder_reader = libs.model_readers(
+        BUCKET,
+        SPA_LATEST_BUNDLE_KEY,
+        SPA_LATEST_MODEL_BIN_KEY,
+        SPA_LATEST_LABEL_ENCODER_PREFIX,
+        SPAModel,
+    )
 
     return SPAPredictionService(
         preprocessor=SPAPreprocessor(
             label_encoder_writer=None,
-            label_encoder_reader=read_labelencoder_manager(
-                BUCKET, SPA_LATEST_LABEL_ENCODER_PREFIX
-            ),
+            label_encoder_reader=label_encoder_reader,
             is_use_dask=False,
         ),
         estimator=SPAEstimator(
-            model_reader=read_s3_manager(
-                BUCKET,
-                SPA_LATEST_MODEL_BIN_KEY,
-            ),
+            model_reader=model_reader,
             is_tune=False,
+            prediction_cache=get_prediction_cache(),
         ),
-    ).predict(ad_df, keyword_queries_df, today)
+    ).predict_features(kpi_features_df, today)
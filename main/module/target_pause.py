@@ -22,8 +22,8 @@ OUTPUT_COLUMNS = [
 ]
 
 
-def exec(unit_info_df, target_ad_df):
-    today = args.Event.today
+def exec(unit_info_df, target_ad_df, context=None):
+    today = args.current(context).today
     if today.day != 1 and unit_info_df["start"].values[0] != pd.to_datetime(today):
         return None
 
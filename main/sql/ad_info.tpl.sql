@@ -1,3 +1,4 @@
+{% import "macros.tpl.sql" as macros with context %}
 DECLARE today DATE DEFAULT DATE('{{ today }}');
 
 WITH targ_ad AS (
@@ -13,14 +14,7 @@ WITH targ_ad AS (
     WHERE
         data_date = today
     AND
-        advertising_account_id = {{ advertising_account_id }}
-    {% if portfolio_id %}
-    AND
-        portfolio_id = {{ portfolio_id }}
-    {% else %}
-    AND
-        portfolio_id IS NULL
-    {% endif %}
+        {{ macros.unit_condition("advertising_account_id", "portfolio_id") }}
 ),
 product_targetings AS (
     SELECT
@@ -97,6 +91,7 @@ SELECT
     ad_info.comp_bidding_price as bidding_price,
     ad_info.match_type,
     targ_ad.is_enabled_bidding_auto_adjustment,
+    {{ macros.batch_key_columns("targ_ad.advertising_account_id", "targ_ad.portfolio_id") }}
 FROM
     targ_ad
 INNER JOIN
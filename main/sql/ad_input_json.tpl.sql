@@ -1,3 +1,4 @@
+{% import "macros.tpl.sql" as macros with context %}
 DECLARE today DATE DEFAULT DATE('{{ today }}');
 
 SELECT
@@ -18,19 +19,13 @@ SELECT
     conversions,
     sales,
     costs,
+    {{ macros.batch_key_columns("advertising_account_id", "portfolio_id") }}
 FROM
     `{{ project }}.{{ dataset }}.bidding_ad_performance`
 WHERE
     data_date = today
 AND
-    advertising_account_id = {{ advertising_account_id }}
-{% if portfolio_id %}
-AND
-    portfolio_id = {{ portfolio_id }}
-{% else %}
-AND
-    portfolio_id IS NULL
-{% endif %}
+    {{ macros.unit_condition("advertising_account_id", "portfolio_id") }}
 ORDER BY
     campaign_id,
     ad_type,
@@ -1,3 +1,4 @@
+{% import "macros.tpl.sql" as macros with context %}
 DECLARE today DATE DEFAULT DATE('{{ today }}');
 DECLARE yesterday DATE DEFAULT DATE_SUB(today, INTERVAL 1 DAY);
 DECLARE start_from DATE DEFAULT DATE_SUB(yesterday, INTERVAL 60 DAY);
@@ -5,20 +6,14 @@ DECLARE start_from DATE DEFAULT DATE_SUB(yesterday, INTERVAL 60 DAY);
 WITH targ_ad AS (
     SELECT DISTINCT
         ad_type,
-        ad_id
+        ad_id,
+        {{ macros.batch_key_columns("advertising_account_id", "portfolio_id") }}
     FROM
         `{{ project }}.{{ dataset }}.bidding_ad_performance`
     WHERE
         data_date = today
     AND
-        advertising_account_id = {{ advertising_account_id }}
-    {% if portfolio_id %}
-    AND
-        portfolio_id = {{ portfolio_id }}
-    {% else %}
-    AND
-        portfolio_id IS NULL
-    {% endif %}
+        {{ macros.unit_condition("advertising_account_id", "portfolio_id") }}
 ),
 daily_keywords_tmp AS (
     SELECT
@@ -155,8 +150,15 @@ SELECT
     clicks,
     costs,
     conversions,
-    sales
+    sales,
+    {{ macros.batch_key_columns("targ_ad.batch_advertising_account_id", "targ_ad.batch_portfolio_id") }}
 FROM
     ad_records
+{% if units or account_scope %}
+INNER JOIN
+    targ_ad
+USING
+    (ad_type, ad_id)
+{% endif %}
 ORDER BY
     1, 2, 3, 4, 5
\ No newline at end of file
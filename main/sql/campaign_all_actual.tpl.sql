@@ -1,3 +1,4 @@
+{% import "macros.tpl.sql" as macros with context %}
 DECLARE today DATE DEFAULT DATE('{{ today }}');
 DECLARE yesterday DATE DEFAULT DATE_SUB(today, INTERVAL 1 DAY);
 DECLARE start_from DATE DEFAULT DATE_SUB(yesterday, INTERVAL 30 DAY);
@@ -10,6 +11,7 @@ SELECT
     dca.costs,
     dca.conversions,
     dca.sales,
+    {{ macros.batch_key_columns("ca.advertising_account_id", "ca.portfolio_id") }}
 FROM
     `{{ project }}.{{ commerce_flow_dataset }}.campaigns` AS ca
 LEFT OUTER JOIN
@@ -17,13 +19,6 @@ LEFT OUTER JOIN
 ON
     ca.id = dca.campaign_id
 WHERE
-    ca.advertising_account_id = {{ advertising_account_id }}
-    {% if portfolio_id %}
-    AND
-        ca.portfolio_id = {{ portfolio_id }}
-    {% else %}
-    AND
-        ca.portfolio_id IS NULL
-    {% endif %}
+    {{ macros.unit_condition("ca.advertising_account_id", "ca.portfolio_id") }}
     AND dca.date BETWEEN start_from AND yesterday
 ORDER BY 1, 2, 3, 4
@@ -1,3 +1,4 @@
+{% import "macros.tpl.sql" as macros with context %}
 DECLARE today DATE DEFAULT DATE('{{ today }}');
 
 WITH targ_campaigns AS (
@@ -10,14 +11,7 @@ WITH targ_campaigns AS (
     WHERE
         data_date = today
     AND
-        advertising_account_id = {{ advertising_account_id }}
-    {% if portfolio_id %}
-    AND
-        portfolio_id = {{ portfolio_id }}
-    {% else %}
-    AND
-        portfolio_id IS NULL
-    {% endif %}
+        {{ macros.unit_condition("advertising_account_id", "portfolio_id") }}
 )
 SELECT
     ca.advertising_account_id,
@@ -26,6 +20,7 @@ SELECT
     ca.type AS campaign_type,
     ca.targeting_type,
     ca.budget_type,
+    {{ macros.batch_key_columns("ca.advertising_account_id", "ca.portfolio_id") }}
 FROM
     targ_campaigns
 INNER JOIN
@@ -1,3 +1,4 @@
+{% import "macros.tpl.sql" as macros with context %}
 DECLARE today DATE DEFAULT DATE('{{ today }}');
 DECLARE yesterday DATE DEFAULT DATE_SUB(today, INTERVAL 1 DAY);
 DECLARE start_from DATE DEFAULT DATE_SUB(today, INTERVAL 60 DAY);
@@ -5,17 +6,11 @@ DECLARE start_from DATE DEFAULT DATE_SUB(today, INTERVAL 60 DAY);
 WITH campaigns AS (
     SELECT DISTINCT
         c.id AS campaign_id,
+        {{ macros.batch_key_columns("c.advertising_account_id", "c.portfolio_id") }}
     FROM
         `{{ project }}.{{ commerce_flow_dataset }}.campaigns` AS c
     WHERE
-        c.advertising_account_id = {{ advertising_account_id }}
-    {% if portfolio_id %}
-    AND
-        c.portfolio_id = {{ portfolio_id }}
-    {% else %}
-    AND
-        c.portfolio_id IS NULL
-    {% endif %}
+        {{ macros.unit_condition("c.advertising_account_id", "c.portfolio_id") }}
 )
 SELECT
     cp.campaign_id,
@@ -26,6 +21,7 @@ SELECT
     dcp.impressions as impressions,
     dcp.sales as sales,
     dcp.conversions as conversions,
+    {{ macros.batch_key_columns("c.batch_advertising_account_id", "c.batch_portfolio_id") }}
 FROM
     `{{ project }}.{{ commerce_flow_dataset }}.daily_campaign_placements` AS dcp
 INNER JOIN
@@ -1,3 +1,4 @@
+{% import "macros.tpl.sql" as macros with context %}
 DECLARE today DATE DEFAULT DATE('{{ today }}');
 DECLARE last_month_last_day DEFAULT(DATE_SUB(DATE_TRUNC(today, MONTH), INTERVAL 1 DAY));
 DECLARE month_last_day DATE DEFAULT DATE_SUB(DATE_TRUNC(DATE_ADD(today, INTERVAL 1 MONTH), MONTH), INTERVAL 1 DAY);
@@ -7,13 +8,24 @@ SELECT
     DATE(end_date, 'Asia/Tokyo') as end_date,
     coefficient,
     updated_at,
+    {{ macros.batch_key_columns("u.advertising_account_id", "u.portfolio_id") }}
 FROM
     `{{ project }}.{{ commerce_flow_dataset }}.daily_budget_boost_coefficients`
+{% if units %}
+INNER JOIN
+    {{ macros.batch_units() }} AS u
+ON
+    (u.portfolio_id IS NOT NULL AND unit_type = 'Portfolio' AND unit_id = u.portfolio_id)
+    OR (u.portfolio_id IS NULL AND unit_type = 'AdvertisingAccount' AND unit_id = u.advertising_account_id)
+WHERE
+  TRUE
+{% else %}
 WHERE
 {% if portfolio_id %}
   unit_type = 'Portfolio' AND unit_id = {{ portfolio_id }}
 {% else %}
   unit_type = 'AdvertisingAccount' AND unit_id = {{ advertising_account_id }}
+{% endif %}
 {% endif %}
   AND DATE(end_date, 'Asia/Tokyo') >= last_month_last_day
   AND DATE(start_date, 'Asia/Tokyo') <= month_last_day
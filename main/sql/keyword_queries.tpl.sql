@@ -1,3 +1,4 @@
+{% import "macros.tpl.sql" as macros with context %}
 DECLARE today DATE DEFAULT DATE('{{ today }}');
 DECLARE yesterday DATE DEFAULT DATE_SUB(today, INTERVAL 1 DAY);
 DECLARE start_from DATE DEFAULT DATE_SUB(today, INTERVAL 60 DAY);
@@ -10,6 +11,7 @@ SELECT
     dkq.date,
     dkq.clicks as query_clicks,
     dkq.conversions as query_conversions,
+    {{ macros.batch_key_columns("c.advertising_account_id", "c.portfolio_id") }}
 FROM
     `{{ project }}.{{ commerce_flow_dataset }}.campaigns` AS c
 INNER JOIN
@@ -25,12 +27,5 @@ INNER JOIN
 ON
     dkq.keyword_query_id = kq.id
 WHERE
-    c.advertising_account_id = {{ advertising_account_id }}
-{% if portfolio_id %}
-AND
-    c.portfolio_id = {{ portfolio_id }}
-{% else %}
-AND
-    c.portfolio_id IS NULL
-{% endif %}
+    {{ macros.unit_condition("c.advertising_account_id", "c.portfolio_id") }}
     AND dkq.date BETWEEN start_from AND yesterday
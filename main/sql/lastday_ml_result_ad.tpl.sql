@@ -1,3 +1,4 @@
+{% import "macros.tpl.sql" as macros with context %}
 DECLARE today DATE DEFAULT DATE('{{ today }}');
 DECLARE yesterday DATE DEFAULT DATE_SUB(today, INTERVAL 1 DAY);
 
@@ -5,6 +6,7 @@ SELECT
     ad.ad_type,
     ad.ad_id,
     ad.bidding_price,
+    {{ macros.batch_key_columns("unit.advertising_account_id", "unit.portfolio_id") }}
 FROM
     `{{ project }}.{{ dataset }}.ml_result_unit` unit
 INNER JOIN
@@ -21,12 +23,5 @@ AND
 WHERE
     unit.date = yesterday
 AND
-    unit.advertising_account_id = {{ advertising_account_id }}
-{% if portfolio_id %}
-AND
-    unit.portfolio_id = {{ portfolio_id }}
-{% else %}
-AND
-    unit.portfolio_id IS NULL
-{% endif %}
+    {{ macros.unit_condition("unit.advertising_account_id", "unit.portfolio_id") }}
 AND unit.is_ml_enabled
@@ -1,3 +1,4 @@
+{% import "macros.tpl.sql" as macros with context %}
 DECLARE today DATE DEFAULT DATE('{{ today }}');
 DECLARE yesterday DATE DEFAULT DATE_SUB(today, INTERVAL 1 DAY);
 
@@ -5,17 +6,11 @@ SELECT DISTINCT
     campaign_id,
     date,
     cap_daily_budget_weight,
+    {{ macros.batch_key_columns("advertising_account_id", "portfolio_id") }}
 FROM
     `{{ project }}.{{ dataset }}.ml_result_campaign`
 WHERE
     date = yesterday
 AND
-    advertising_account_id = {{ advertising_account_id }}
-{% if portfolio_id %}
-AND
-    portfolio_id = {{ portfolio_id }}
-{% else %}
-AND
-    portfolio_id IS NULL
-{% endif %}
+    {{ macros.unit_condition("advertising_account_id", "portfolio_id") }}
 ORDER BY 1, 2
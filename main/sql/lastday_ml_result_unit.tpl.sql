@@ -1,3 +1,4 @@
+{% import "macros.tpl.sql" as macros with context %}
 DECLARE today DATE DEFAULT DATE('{{ today }}');
 DECLARE yesterday DATE DEFAULT DATE_SUB(today, INTERVAL 1 DAY);
 
@@ -17,17 +18,11 @@ SELECT DISTINCT
     q_sum_error,
     target_cost,
     target_kpi,
+    {{ macros.batch_key_columns("advertising_account_id", "portfolio_id") }}
 FROM
     `{{ project }}.{{ dataset }}.ml_result_unit`
 WHERE
     date = yesterday
 AND
-    advertising_account_id = {{ advertising_account_id }}
-{% if portfolio_id %}
-AND
-    portfolio_id = {{ portfolio_id }}
-{% else %}
-AND
-    portfolio_id IS NULL
-{% endif %}
+    {{ macros.unit_condition("advertising_account_id", "portfolio_id") }}
 ORDER BY 1
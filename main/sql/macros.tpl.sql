@@ -0,0 +1,52 @@
+{#
+    複数unitをまとめて抽出する場合(batch)はunitsに
+    [{"advertising_account_id": ..., "portfolio_id": ...}, ...] が渡される。
+    渡されない場合はadvertising_account_id, portfolio_idの単一unitを対象とする。
+    account_scopeが渡された場合はadvertising_account_idの全portfolioを対象とし、
+    batchと同じキー列でunitを識別する。
+#}
+
+{% macro unit_key(unit) -%}
+{{ unit.advertising_account_id }}_{{ unit.portfolio_id if unit.portfolio_id is not none else "" }}
+{%- endmacro %}
+
+{% macro unit_condition(advertising_account_id_column, portfolio_id_column) -%}
+{% if units %}
+    {{ advertising_account_id_column }} IN ({{ units | map(attribute="advertising_account_id") | unique | join(", ") }})
+AND
+    CONCAT(
+        CAST({{ advertising_account_id_column }} AS STRING), "_",
+        IFNULL(CAST({{ portfolio_id_column }} AS STRING), "")
+    ) IN ({% for unit in units %}"{{ unit_key(unit) }}"{% if not loop.last %}, {% endif %}{% endfor %})
+{% elif account_scope %}
+    {{ advertising_account_id_column }} = {{ advertising_account_id }}
+{% else %}
+    {{ advertising_account_id_column }} = {{ advertising_account_id }}
+{% if portfolio_id %}
+AND
+    {{ portfolio_id_column }} = {{ portfolio_id }}
+{% else %}
+AND
+    {{ portfolio_id_column }} IS NULL
+{% endif %}
+{% endif %}
+{%- endmacro %}
+
+{% macro batch_key_columns(advertising_account_id_column, portfolio_id_column) -%}
+{% if units or account_scope %}
+    {{ advertising_account_id_column }} AS batch_advertising_account_id,
+    {{ portfolio_id_column }} AS batch_portfolio_id,
+{% endif %}
+{%- endmacro %}
+
+{% macro batch_units() -%}
+UNNEST([
+{% for unit in units %}
+    STRUCT(
+        {{ unit.advertising_account_id }} AS advertising_account_id,
+        CAST({{ unit.portfolio_id if unit.portfolio_id is not none else "NULL" }} AS INT64) AS portfolio_id
+    ){% if not loop.last %},{% endif %}
+
+{% endfor %}
+])
+{%- endmacro %}
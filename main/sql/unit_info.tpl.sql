@@ -1,3 +1,4 @@
+{% import "macros.tpl.sql" as macros with context %}
 DECLARE today DATE DEFAULT DATE('{{ today }}');
 
 WITH unit_info AS (
@@ -20,9 +21,7 @@ WITH unit_info AS (
     ON
         pa.id = osa.portfolio_id
     WHERE
-        pa.advertising_account_id = {{ advertising_account_id }}
-    AND
-        pa.id = {{ portfolio_id }}
+        {{ macros.unit_condition("pa.advertising_account_id", "pa.id") }}
 )
 SELECT
     ui.advertising_account_id,
@@ -34,6 +33,7 @@ SELECT
     ui.optimization_purpose_value,
     bui.start,
     bui.round_up_point,
+    {{ macros.batch_key_columns("ui.advertising_account_id", "ui.portfolio_id") }}
 FROM
     unit_info ui
 INNER JOIN
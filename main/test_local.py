@@ -7,8 +7,23 @@ def main():
     parser.add_argument("date", help="yyyy-mm-dd")
     parser.add_argument("-a", "--advertising_account_id", help="advertising_account_id")
     parser.add_argument("-p", "--portfolio_id", help="portfolio_id", default=None)
+    parser.add_argument(
+        "-u", "--units", nargs="+", default=None,
+        help="batch target units (advertising_account_id[:portfolio_id])")
     args = parser.parse_args()
 
+    if args.units is not None:
+        units = []
+        for unit in args.units:
+            advertising_account_id, _, portfolio_id = unit.partition(":")
+            units.append({
+                "advertising_account_id": advertising_account_id,
+                "portfolio_id": portfolio_id or None,
+            })
+        result = lambda_handler.batch_lambda_handler({"date": args.date, "units": units}, None)
+        print(result)
+        return
+
     event = {
         "date": args.date,
         "advertising_account_id": args.advertising_account_id,
@@ -6,7 +6,7 @@ from module import cpc_prediction
 
 def test_exec(mocker):
     mocker.patch("module.args.Event.today", datetime.datetime.today)
-    mock = mocker.patch("module.cpc_prediction.CPCPredictionService.predict")
+    mock = mocker.patch("module.cpc_prediction.CPCPredictionService.predict_features")
     df = pd.DataFrame()
     cpc_prediction.exec(df, df)
 
@@ -6,8 +6,8 @@ from module import cvr_prediction
 
 def test_exec(mocker):
     mocker.patch("module.args.Event.today", datetime.datetime.today)
-    mock = mocker.patch("module.cvr_prediction.CVRPredictionService.predict")
+    mock = mocker.patch("module.cvr_prediction.CVRPredictionService.predict_features")
     df = pd.DataFrame()
-    cvr_prediction.exec(df, df)
+    cvr_prediction.exec(df)
 
     mock.assert_called_once
@@ -0,0 +1,14 @@
+import datetime
+import pandas as pd
+
+from module import kpi_features
+from module.args import RunContext
+
+
+def test_exec(mocker):
+    mock = mocker.patch("module.kpi_features.build_features")
+    context = RunContext(advertising_account_id=1, portfolio_id=None, today=datetime.datetime(2021, 1, 28))
+    df = pd.DataFrame()
+    kpi_features.exec(df, df, context)
+
+    mock.assert_called_once_with(df, df, datetime.datetime(2021, 1, 27))
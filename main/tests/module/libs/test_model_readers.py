@@ -0,0 +1,79 @@
+import boto3
+import pytest
+from moto import mock_s3
+
+from module import libs
+from common_module.artifact_cache import ArtifactCache
+from spai.ai.bundle import ModelBundle
+from spai.ai.preprocess import LabelEncoder
+
+_BUCKET = "model-readers-test"
+
+
+class _Model:
+    @classmethod
+    def from_bytes(cls, binary):
+        return bytes(binary).decode()
+
+
+@pytest.fixture
+def cache(mocker, tmp_path):
+    cache = ArtifactCache(disk_dir=str(tmp_path))
+    mocker.patch("module.libs.get_artifact_cache", return_value=cache)
+    mocker.patch("common_module.datamanage_util.get_artifact_cache", return_value=cache)
+    return cache
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "ap-northeast-1")
+    monkeypatch.delenv("MINIO_URL", raising=False)
+    with mock_s3():
+        client = boto3.client("s3")
+        client.create_bucket(
+            Bucket=_BUCKET, CreateBucketConfiguration={"LocationConstraint": "ap-northeast-1"})
+        yield client
+
+
+def _readers():
+    return libs.model_readers(_BUCKET, "cpc/latest_bundle.bin", "cpc/latest.bin", "cpc/latest_le/", _Model)
+
+
+def test_model_readers_bundle(s3, cache):
+    bundle = ModelBundle({"kpi": "cpc"})
+    bundle.add_label_encoder("match_type", LabelEncoder().fit(["a", "b"]).to_bytes())
+    bundle.set_model(b"bundled model")
+    s3.put_object(Bucket=_BUCKET, Key="cpc/latest_bundle.bin", Body=bundle.to_bytes())
+
+    read_model, read_label_encoder = _readers()
+
+    assert read_model() == "bundled model"
+    assert list(read_label_encoder("match_type").transform(["b", "c"])) == [2, 0]
+    # S3からはbundleを1回取得するのみ
+    assert cache.stats["misses"] == 1
+    assert sum(cache.stats.values()) == 1
+
+
+def test_model_readers_fallback(s3, cache):
+    s3.put_object(Bucket=_BUCKET, Key="cpc/latest.bin", Body=b"legacy model")
+    s3.put_object(
+        Bucket=_BUCKET, Key="cpc/latest_le/match_type.bin", Body=LabelEncoder().fit(["a"]).to_bytes())
+
+    read_model, read_label_encoder = _readers()
+
+    assert read_model() == "legacy model"
+    assert list(read_label_encoder("match_type").transform(["a"])) == [1]
+    assert cache.stats["misses"] == 2
+
+
+def test_model_readers_missing_bundle_remembered(s3, cache, mocker):
+    s3.put_object(Bucket=_BUCKET, Key="cpc/latest.bin", Body=b"legacy model")
+    get_object = mocker.spy(cache, "_get_object")
+
+    # unitごとに読み込み関数を作り直しても、bundleがないことはS3に1回だけ確認する
+    for _ in range(3):
+        read_model, _ = _readers()
+        assert read_model() == "legacy model"
+
+    bundle_calls = [c for c in get_object.call_args_list if c[0][1] == "cpc/latest_bundle.bin"]
+    assert len(bundle_calls) == 1
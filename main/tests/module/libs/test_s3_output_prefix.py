@@ -2,6 +2,7 @@ import datetime
 import pytest
 
 from module import libs
+from module.args import RunContext
 
 
 @pytest.mark.parametrize("is_portfolio_id_none", [True, False])
@@ -22,3 +23,18 @@ def test_s3_output_prefix(mocker, monkeypatch, is_portfolio_id_none):
         assert file_prefix == "20210101_adAccount_1_output_stage"
     else:
         assert file_prefix == "20210101_portfolio_1_3_output_stage"
+
+
+def test_s3_output_prefix_with_context(mocker, monkeypatch):
+    # contextを渡した場合はEventの値を参照しない
+    mocker.patch("module.args.Event.today", datetime.datetime(2021, 1, 1))
+    mocker.patch("module.args.Event.advertising_account_id", 1)
+    mocker.patch("module.args.Event.portfolio_id", 3)
+    monkeypatch.setenv("OUTPUT_STAGE", "output_stage")
+
+    context = RunContext(
+        advertising_account_id=2, portfolio_id=4, today=datetime.datetime(2021, 2, 3))
+    date_prefix, file_prefix = libs.s3_output_prefix(context)
+
+    assert date_prefix == "2021/02/03"
+    assert file_prefix == "20210203_portfolio_2_4_output_stage"
@@ -0,0 +1,152 @@
+import os
+import operator
+import threading
+import time
+import pandas as pd
+import pytest
+
+from common_module import metrics_util
+from module import pipeline
+
+
+def _sleep_and_return(sec, value):
+    def _func(*args):
+        time.sleep(sec)
+        return value
+
+    return _func
+
+
+def test_run():
+    stages = [
+        pipeline.Stage("a", lambda x: x + 1, inputs=["x"], outputs=["a"]),
+        pipeline.Stage("b", lambda a: (a * 2, a * 3), inputs=["a"], outputs=["b1", "b2"]),
+        pipeline.Stage("c", lambda b1, b2: b1 + b2, inputs=["b1", "b2"], outputs=["c"]),
+    ]
+
+    values = pipeline.Pipeline(stages).run({"x": 1})
+
+    assert values == {"c": 10}
+
+
+def test_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def _wait(x):
+        barrier.wait()
+        return x
+
+    stages = [
+        pipeline.Stage("a", _wait, inputs=["x"], outputs=["a"]),
+        pipeline.Stage("b", _wait, inputs=["x"], outputs=["b"]),
+        pipeline.Stage("c", lambda a, b: a + b, inputs=["a", "b"], outputs=["c"]),
+    ]
+
+    assert pipeline.Pipeline(stages, max_workers=2).run({"x": 1}) == {"c": 2}
+
+
+def test_process():
+    stages = [
+        pipeline.Stage("add", operator.add, inputs=["x", "y"], outputs=["z"], use_process=True),
+    ]
+
+    p = pipeline.Pipeline(stages, process_workers=1)
+
+    assert p.run({"x": 1, "y": 2}) == {"z": 3}
+    assert "add" in p.timings
+
+
+def test_process_pool_reused():
+    stages = [
+        pipeline.Stage("pid", os.getpid, outputs=["pid"], use_process=True),
+    ]
+
+    # 実行(unit)ごとにプロセスを起動せず、同じプロセスで実行する
+    pids = [pipeline.Pipeline(stages, process_workers=1).run()["pid"] for _ in range(2)]
+
+    assert pids[0] == pids[1] != os.getpid()
+    assert pipeline.process_pool(1) is pipeline.process_pool(1)
+
+
+def test_metrics_tags(mocker):
+    mocker.patch("common_module.metrics_util.logger.info")
+    stages = [
+        pipeline.Stage("record", lambda: metrics_util.record("inner", 0.0), outputs=["row"]),
+    ]
+
+    # スレッドで実行する処理にも、呼び出し元のunitのタグが付与される
+    metrics_util.set_tags(unit="1_")
+    try:
+        assert pipeline.Pipeline(stages).run()["row"]["unit"] == "1_"
+    finally:
+        metrics_util.reset()
+
+
+def test_process_metrics(mocker):
+    mocker.patch("common_module.metrics_util.logger.info")
+    stages = [
+        pipeline.Stage("record", metrics_util.record, inputs=["metric", "sec"], outputs=["row"], use_process=True),
+    ]
+
+    # 子プロセスで記録したメトリクスも、呼び出し元のunitのタグを付与して記録する
+    metrics_util.set_tags(unit="1_")
+    try:
+        pipeline.Pipeline(stages, process_workers=1).run({"metric": "inner", "sec": 0.0})
+        assert metrics_util.count("inner", "unit") == {"1_": 1}
+    finally:
+        metrics_util.reset()
+
+
+def test_copy_inputs():
+    df = pd.DataFrame({"a": [1, 2]})
+
+    def _mutate(df):
+        df["b"] = df["a"]
+
+    stages = [
+        pipeline.Stage("mutate", _mutate, inputs=["df"], copy_inputs=True),
+        pipeline.Stage("keep", lambda df: list(df.columns), inputs=["df"], outputs=["columns"]),
+    ]
+    pipeline.Pipeline(stages, max_workers=1).run({"df": df})
+
+    assert list(df.columns) == ["a"]
+
+
+def test_error():
+    def _raise(x):
+        raise RuntimeError("error")
+
+    stages = [
+        pipeline.Stage("a", _raise, inputs=["x"], outputs=["a"]),
+        pipeline.Stage("b", lambda a: a, inputs=["a"], outputs=["b"]),
+    ]
+
+    with pytest.raises(RuntimeError):
+        pipeline.Pipeline(stages).run({"x": 1})
+
+
+@pytest.mark.parametrize("stages", [
+    [pipeline.Stage("a", lambda y: y, inputs=["y"], outputs=["a"])],
+    [
+        pipeline.Stage("a", lambda x: x, inputs=["x"], outputs=["a"]),
+        pipeline.Stage("b", lambda x: x, inputs=["x"], outputs=["a"]),
+    ],
+])
+def test_invalid_stages(stages):
+    with pytest.raises(ValueError):
+        pipeline.Pipeline(stages).run({"x": 1})
+
+
+def test_critical_path():
+    stages = [
+        pipeline.Stage("extract", _sleep_and_return(0, 1), inputs=["x"], outputs=["a"]),
+        pipeline.Stage("fast", _sleep_and_return(0, 1), inputs=["a"], outputs=["b"]),
+        pipeline.Stage("slow", _sleep_and_return(0, 1), inputs=["a"], outputs=["c"]),
+        pipeline.Stage("output", _sleep_and_return(0, 1), inputs=["b", "c"]),
+    ]
+    timings = {"extract": 1.0, "fast": 1.0, "slow": 3.0, "output": 0.5}
+
+    path, sec = pipeline.critical_path(stages, timings)
+
+    assert path == ["extract", "slow", "output"]
+    assert sec == 4.5
@@ -6,8 +6,8 @@ from module import spa_prediction
 
 def test_exec(mocker):
     mocker.patch("module.args.Event.today", datetime.datetime.today)
-    mock = mocker.patch("module.spa_prediction.SPAPredictionService.predict")
+    mock = mocker.patch("module.spa_prediction.SPAPredictionService.predict_features")
     df = pd.DataFrame()
-    spa_prediction.exec(df, df)
+    spa_prediction.exec(df)
 
     mock.assert_called_once
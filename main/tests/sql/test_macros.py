@@ -0,0 +1,93 @@
+import os
+import re
+import pytest
+from jinja2 import Environment, FileSystemLoader
+
+
+_SQL_DIR = os.path.join(os.path.dirname(__file__), "../../sql")
+
+_UNIT_TEMPLATES = [
+    "unit_info.tpl.sql",
+    "campaign_info.tpl.sql",
+    "campaign_all_actual.tpl.sql",
+    "ad_info.tpl.sql",
+    "ad_target_actual.tpl.sql",
+    "daily_budget_boost_coefficient.tpl.sql",
+    "campaign_placement.tpl.sql",
+    "keyword_queries.tpl.sql",
+    "lastday_ml_result_ad.tpl.sql",
+    "lastday_ml_result_campaign.tpl.sql",
+    "lastday_ml_result_unit.tpl.sql",
+    "ml_applied_history.tpl.sql",
+    "ad_input_json.tpl.sql",
+]
+
+
+@pytest.fixture
+def env():
+    return Environment(loader=FileSystemLoader(_SQL_DIR, encoding="utf8"))
+
+
+@pytest.fixture
+def params():
+    return {
+        "today": "2021-01-01",
+        "project": "project",
+        "dataset": "dataset",
+        "commerce_flow_dataset": "commerce_flow",
+        "advertising_account_id": 1,
+        "portfolio_id": 3,
+        "ml_lookup_days": 7,
+    }
+
+
+@pytest.mark.parametrize("filename", _UNIT_TEMPLATES)
+def test_single_unit(env, params, filename):
+    sql = env.get_template(filename).render(params)
+
+    assert "batch_" not in sql
+    assert "{{" not in sql and "{%" not in sql
+
+
+@pytest.mark.parametrize("filename", _UNIT_TEMPLATES)
+def test_batch_units(env, params, filename):
+    params["units"] = [
+        {"advertising_account_id": 1, "portfolio_id": 3},
+        {"advertising_account_id": 2, "portfolio_id": None},
+    ]
+    sql = env.get_template(filename).render(params)
+
+    assert "AS batch_advertising_account_id" in sql
+    assert "AS batch_portfolio_id" in sql
+    if filename != "daily_budget_boost_coefficient.tpl.sql":
+        assert re.search(r"IN \(1, 2\)", sql)
+        assert '"1_3", "2_"' in sql
+
+
+@pytest.mark.parametrize("portfolio_id, expected", [
+    (3, "portfolio_id = 3"),
+    (None, "portfolio_id IS NULL"),
+])
+def test_single_unit_condition(env, params, portfolio_id, expected):
+    params["portfolio_id"] = portfolio_id
+    sql = env.get_template("lastday_ml_result_unit.tpl.sql").render(params)
+
+    assert "advertising_account_id = 1" in sql
+    assert expected in sql
+
+
+@pytest.mark.parametrize("filename", [
+    "campaign_all_actual.tpl.sql",
+    "campaign_placement.tpl.sql",
+    "keyword_queries.tpl.sql",
+    "ad_target_actual.tpl.sql",
+])
+def test_account_scope(env, params, filename):
+    params["account_scope"] = True
+    sql = env.get_template(filename).render(params)
+
+    assert "AS batch_advertising_account_id" in sql
+    assert "AS batch_portfolio_id" in sql
+    assert "advertising_account_id = 1" in sql
+    assert "portfolio_id = 3" not in sql
+    assert "portfolio_id IS NULL" not in sql
@@ -0,0 +1,70 @@
+"""カテゴリ値の変換の、バッチサイズ別の1回あたりのレイテンシ(p50/p99)を計測する
+
+CatBoostEncoder.transformと、CatBoostEncoderを配列にしたLookupEncoder.transformを比較する。
+
+    python benchmarks/cat_encoder.py [--categories 1000] [--repeat 200]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+import category_encoders as ce
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spai.ai.preprocess import LookupEncoder  # noqa: E402
+
+
+def _data(categories):
+    np.random.seed(42)
+    X = pd.DataFrame(np.random.randn(20000, 30), columns=[f"col_{i}" for i in range(30)])
+    cat_cols = [f"col_{i}" for i in range(3)]
+    for col in cat_cols:
+        X[col] = np.random.randint(0, categories, size=len(X))
+    y = pd.Series(np.random.randn(len(X)))
+
+    cbe = ce.CatBoostEncoder(cols=cat_cols)
+    cbe.fit(X, y)
+    return cbe, X
+
+
+def _percentiles(func, X, repeat):
+    secs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(X)
+        secs.append(time.perf_counter() - start)
+    return {
+        "p50_ms": round(float(np.percentile(secs, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(secs, 99)) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--categories", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 10000])
+    args = parser.parse_args()
+
+    cbe, X = _data(args.categories)
+    encoders = [
+        ("category_encoders", cbe.transform),
+        ("lookup", LookupEncoder.from_catboost_encoder(cbe).transform),
+    ]
+    for batch_size in args.batch_sizes:
+        batch = X.iloc[:batch_size]
+        for name, transform in encoders:
+            print(json.dumps({
+                "encoder": name,
+                "batch_size": batch_size,
+                **_percentiles(transform, batch, args.repeat),
+            }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""推論で使うモジュールのimport時間を計測する
+
+Lambdaのコールドスタートを想定し、モジュールごとに新しいPythonプロセスでimportした時間を計測する。
+
+    python benchmarks/import_time.py [--repeat 5]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# 計測対象のモジュール。推論のみ(main Lambda)の経路と、比較用の学習を含む経路
+TARGETS = {
+    "inference": [
+        "spai.ai.inference",
+        "spai.service.cpc.estimator",
+        "spai.service.cvr.estimator",
+        "spai.service.spa.estimator",
+    ],
+    "training": [
+        "spai.ai.boosting.tune_params",
+        "spai.ai.boosting.catboost_wrap",
+    ],
+}
+
+# 推論の経路でimportされるべきでないモジュール
+HEAVY_MODULES = ["optuna", "catboost", "category_encoders"]
+
+_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    __import__(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"sec": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(modules, repeat):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env.get("PYTHONPATH", "")])
+    script = _SCRIPT.format(heavy=HEAVY_MODULES)
+
+    results = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", script, *modules],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    secs = [r["sec"] for r in results]
+    return {
+        "median_sec": round(statistics.median(secs), 3),
+        "min_sec": round(min(secs), 3),
+        "heavy_modules": results[0]["heavy"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, modules in TARGETS.items():
+        print(json.dumps({"target": name, **measure(modules, args.repeat)}))
+
+
+if __name__ == "__main__":
+    main()
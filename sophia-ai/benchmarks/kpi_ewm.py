@@ -0,0 +1,85 @@
+"""spai.utils.kpi.ewmの処理時間を、グループごとにapplyする以前の実装と比較する
+
+広告数×日数の履歴に対し、半減期(7D, 28D)ごとにewmを計算する。
+segmented_ewmは複数の半減期を1回で計算した場合も計測する。
+
+    python benchmarks/kpi_ewm.py [--keys 1000 5000] [--days 90] [--repeat 3]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spai.utils.kpi import ewm, segmented_ewm  # noqa: E402
+
+COLUMNS = ["impressions", "clicks", "costs", "conversions", "sales"]
+HALFLIVES = ["7D", "28D"]
+
+
+def _apply_ewm(grp_df, halflife, min_periods, columns, date_col="date"):
+    # 以前の実装
+    return grp_df.apply(
+        lambda x: x.ewm(
+            halflife=halflife,
+            times=x[date_col].values,
+            min_periods=min_periods
+        )[columns].mean())
+
+
+def _data(keys, days):
+    np.random.seed(42)
+    df = pd.DataFrame({
+        "ad_id": np.repeat(np.arange(keys), days),
+        "date": np.tile(pd.date_range("2022-01-01", periods=days), keys),
+    })
+    # 配信のない日は行がないため、一部の行を除く
+    df = df[np.random.rand(len(df)) > 0.2].reset_index(drop=True)
+    for col in COLUMNS:
+        df[col] = np.random.poisson(10, len(df)).astype(float)
+    return df
+
+
+def _seconds(func, repeat):
+    secs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        secs.append(time.perf_counter() - start)
+    return round(min(secs), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for keys in args.keys:
+        df = _data(keys, args.days)
+        grp_df = df.groupby("ad_id", group_keys=False)
+
+        for halflife in HALFLIVES:
+            expected = _apply_ewm(grp_df, halflife, 1, COLUMNS)
+            np.testing.assert_allclose(ewm(grp_df, halflife, 1, COLUMNS).to_numpy(), expected.to_numpy(), rtol=1e-12)
+
+        def _segmented():
+            segmented_ewm(df[COLUMNS].to_numpy(), df["date"].to_numpy(), df["ad_id"].to_numpy(), HALFLIVES, 1)
+
+        print(json.dumps({
+            "keys": keys,
+            "rows": len(df),
+            "apply_sec": _seconds(lambda: [_apply_ewm(grp_df, h, 1, COLUMNS) for h in HALFLIVES], args.repeat),
+            "ewm_sec": _seconds(lambda: [ewm(grp_df, h, 1, COLUMNS) for h in HALFLIVES], args.repeat),
+            "segmented_ewm_sec": _seconds(_segmented, args.repeat),
+        }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""rolling・ewmの特徴量をキーごとに前日以前の最新の値で結合する処理時間を計測する
+
+dfとfeatsを(日付, キー)で並べ替えてmerge_asofで結合し、元の行の順に戻す以前の処理(merge_asof)と、
+キー・日付順のfeatsの位置で結合するshift_joinを比較する。
+
+    python benchmarks/kpi_join.py [--ads 1000 5000] [--days 90] [--columns 100] [--repeat 3]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spai.utils.kpi import shift_join  # noqa: E402
+
+
+def _data(ads, days, columns):
+    np.random.seed(42)
+    df = pd.DataFrame({
+        "ad_id": np.repeat(np.arange(ads), days),
+        "date": np.tile(pd.date_range("2022-01-01", periods=days), ads),
+    })
+    # 配信のない日は行がないため、一部の行を除く
+    df = df[np.random.rand(len(df)) > 0.2].reset_index(drop=True)
+    # 前処理の途中のデータと同程度の列数とする
+    df = pd.concat([df, pd.DataFrame(
+        np.random.rand(len(df), columns), columns=[f"column_{i}" for i in range(columns)])], axis=1)
+
+    feats = df[["ad_id", "date"]].copy()
+    for i in range(15):
+        feats[f"ad_id_weekly_feat_{i}"] = np.random.rand(len(df))
+    return df, feats
+
+
+def _merge_asof(df, feats, key_column, date_column='date'):
+    # 以前の結合(merge_feats)
+    df = df.copy()
+    df['index'] = df.index
+    df = df.sort_values([date_column, key_column])
+    feats = feats.sort_values([date_column, key_column])
+    df = pd.merge_asof(df, feats, on=date_column, by=key_column, allow_exact_matches=False, direction='backward')
+    df = df.sort_values('index').reset_index(drop=True)
+    return df.drop('index', axis=1)
+
+
+def _seconds(func, repeat):
+    secs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        secs.append(time.perf_counter() - start)
+    return round(min(secs), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--columns", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for ads in args.ads:
+        df, feats = _data(ads, args.days, args.columns)
+        print(json.dumps({
+            "ads": ads,
+            "rows": len(df),
+            "merge_asof_sec": _seconds(lambda: _merge_asof(df, feats, "ad_id"), args.repeat),
+            "shift_join_sec": _seconds(lambda: shift_join(df, feats, "ad_id"), args.repeat),
+        }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""キー×日付ごとに1行の日次データについて、ラグ・rolling・ewmの処理時間をbackend(long, dense)ごとに計測する
+
+    python benchmarks/kpi_panel.py [--ads 1000 5000] [--days 90] [--missing 0.0 0.2] [--repeat 3]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spai.utils.kpi import DailyPanel, calc_lag, grouped_rolling, segmented_ewm  # noqa: E402
+from spai.utils.kpi.kpi import agg_feature_cols  # noqa: E402
+
+
+def _data(ads, days, missing):
+    np.random.seed(42)
+    df = pd.DataFrame({
+        "ad_type": "sp",
+        "ad_id": np.repeat(np.arange(ads), days),
+        "date": np.tile(pd.date_range("2022-01-01", periods=days), ads),
+    })
+    # 配信のない日は行がないため、一部の行を除く
+    df = df[np.random.rand(len(df)) >= missing].reset_index(drop=True)
+    for col in agg_feature_cols:
+        df[col] = np.random.poisson(10, len(df)).astype(float)
+    return df
+
+
+def _seconds(func, repeat):
+    secs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        secs.append(time.perf_counter() - start)
+    return round(min(secs), 3)
+
+
+def _long_ewm(df):
+    return segmented_ewm(
+        df[agg_feature_cols].to_numpy(), df["date"].to_numpy(), df["ad_id"].to_numpy(), ["7D", "28D"], 1)
+
+
+def _dense_ewm(df):
+    return DailyPanel.from_frame(df, ["ad_id"], agg_feature_cols).ewm(["7D", "28D"], 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--missing", type=float, nargs="+", default=[0.0, 0.2])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for ads in args.ads:
+        for missing in args.missing:
+            df = _data(ads, args.days, missing)
+            result = {"ads": ads, "rows": len(df), "missing": missing}
+            for backend in ["long", "dense"]:
+                result[f"rolling_{backend}_sec"] = _seconds(lambda: grouped_rolling(
+                    df, "ad_id", agg_feature_cols, ["7D", "28D"], backend=backend), args.repeat)
+            result["ewm_long_sec"] = _seconds(lambda: _long_ewm(df), args.repeat)
+            result["ewm_dense_sec"] = _seconds(lambda: _dense_ewm(df), args.repeat)
+            if missing == 0:
+                for backend in ["long", "dense"]:
+                    result[f"lag_{backend}_sec"] = _seconds(lambda: calc_lag(
+                        df, "clicks", days=14, col_name_format="lag{day}", backend=backend), args.repeat)
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
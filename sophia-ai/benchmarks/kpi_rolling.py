@@ -0,0 +1,116 @@
+"""CVR/SPAの学習時の前処理のうち、rolling・ewmの特徴量と足切り用の特徴量の処理時間を計測する
+
+窓ごとにgroupby().rolling()を呼ぶ以前の処理(pandas)と、キーごとに全ての窓をまとめて計算する現在の処理を比較する。
+現在の処理は、ad_id以外のキーの日付ごとの平均をrollup_meansでまとめて計算しない場合も計測する。
+
+    python benchmarks/kpi_rolling.py [--ads 1000 5000] [--days 90] [--repeat 3]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spai.utils.kpi import ewm, merge_cutoff_feats, merge_feats, merge_window_feats, rollup_means  # noqa: E402
+from spai.utils.kpi.kpi import agg_feature_cols, _kpi_feats  # noqa: E402
+from spai.service.cvr.preprocess import WINDOW_FEATS, FEATURE_COLUMNS  # noqa: E402
+
+
+def _pandas_agg_feats(df, freq, method, prefix, key_column, feature_columns, date_column='date'):
+    # 以前のagg_feats(窓ごとのgroupby().rolling())
+    df = df.sort_values([key_column, date_column])
+    res = df[agg_feature_cols + [key_column, date_column]]
+    if key_column != "ad_id":
+        res = res.fillna(0.0).groupby([key_column, date_column]).mean().reset_index()
+    res = res.sort_values([key_column, date_column])
+    dates = res[date_column].values
+    ids = res[key_column].values
+    res = res.fillna(0.0).groupby(key_column, group_keys=False)
+    if method == 'rolling':
+        res = res.rolling(freq, on=date_column, min_periods=1).mean()[agg_feature_cols]
+    else:
+        res = ewm(res, freq, 1, agg_feature_cols)
+    res = res.fillna(0.0).reset_index(drop=True)
+    res[date_column] = dates
+    res[key_column] = ids
+    for column, value in _kpi_feats(res[agg_feature_cols].to_numpy(), prefix, key_column, feature_columns).items():
+        res[column] = value
+    return res
+
+
+def _pandas_window_feats(df):
+    df = df.reset_index(drop=True)
+    res = df[["ad_id", "date", "clicks", "conversions", "sales"]].fillna(0.0).groupby('ad_id')
+    res.rolling('7D', on='date', min_periods=1)[['clicks']].sum()
+    res.rolling('28D', on='date', min_periods=1)[['conversions', 'sales']].sum()
+    for freq, method, prefix, key_column in WINDOW_FEATS:
+        df['index'] = df.index
+        feats = _pandas_agg_feats(df, freq, method, prefix, key_column, FEATURE_COLUMNS)
+        df = merge_feats(df, feats, prefix, key_column)
+        df = df.sort_values('index').reset_index(drop=True).drop('index', axis=1)
+    return df
+
+
+def _window_feats(df, rollup=True):
+    df = merge_cutoff_feats(df.reset_index(drop=True))
+    key_columns = list(dict.fromkeys(key for _, _, _, key in WINDOW_FEATS))
+    means = {}
+    if rollup:
+        means = rollup_means(
+            df, {key: [key] for key in key_columns if key != 'ad_id'}, agg_feature_cols, fill_value=0.0)
+    for key_column in key_columns:
+        windows = [(freq, method, prefix) for freq, method, prefix, key in WINDOW_FEATS if key == key_column]
+        df = merge_window_feats(
+            df, windows, key_column=key_column, feature_columns=FEATURE_COLUMNS, means=means.get(key_column))
+    return df
+
+
+def _data(ads, days):
+    np.random.seed(42)
+    df = pd.DataFrame({
+        "ad_id": np.repeat(np.arange(ads), days),
+        "date": np.tile(pd.date_range("2022-01-01", periods=days), ads),
+    })
+    # 配信のない日は行がないため、一部の行を除く
+    df = df[np.random.rand(len(df)) > 0.2].reset_index(drop=True)
+    df["campaign_id"] = df["ad_id"] // 5
+    df["unit_id"] = (df["ad_id"] // 100).astype(str)
+    for col in agg_feature_cols:
+        df[col] = np.random.poisson(10, len(df)).astype(float)
+    return df
+
+
+def _seconds(func, repeat):
+    secs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        secs.append(time.perf_counter() - start)
+    return round(min(secs), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for ads in args.ads:
+        df = _data(ads, args.days)
+        print(json.dumps({
+            "ads": ads,
+            "rows": len(df),
+            "pandas_sec": _seconds(lambda: _pandas_window_feats(df.copy()), args.repeat),
+            "engine_without_rollup_sec": _seconds(lambda: _window_feats(df.copy(), rollup=False), args.repeat),
+            "engine_sec": _seconds(lambda: _window_feats(df.copy()), args.repeat),
+        }))
+
+
+if __name__ == "__main__":
+    main()
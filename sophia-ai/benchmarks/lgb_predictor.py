@@ -0,0 +1,71 @@
+"""LGBModel.predictの、バッチサイズ別の1回あたりのレイテンシ(p50/p99)を計測する
+
+DataFrameをそのままBooster.predictに渡す以前の処理と、行列に変換してから渡す現在の処理を比較する。
+CatBoostEncoderの変換は両者で共通のため、cat_featuresなしのモデルで計測する。
+
+    python benchmarks/lgb_predictor.py [--rounds 300] [--leaves 31] [--repeat 200]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spai.ai.boosting import ProbModel  # noqa: E402
+
+
+def _model(rounds, leaves):
+    np.random.seed(42)
+    X = pd.DataFrame(np.random.randn(20000, 30), columns=[f"col_{i}" for i in range(30)])
+    y = pd.Series((X["col_0"] + np.random.randn(len(X)) > 0).astype(float))
+
+    model = ProbModel({
+        "params": {"objective": ProbModel.objective, "num_leaves": leaves, "verbose": -1},
+        "num_boost_round": rounds,
+    })
+    model.fit(X, y)
+    return model, X
+
+
+def _percentiles(func, X, repeat):
+    secs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(X)
+        secs.append(time.perf_counter() - start)
+    return {
+        "p50_ms": round(float(np.percentile(secs, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(secs, 99)) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=300)
+    parser.add_argument("--leaves", type=int, default=31)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    model, X = _model(args.rounds, args.leaves)
+    predictors = [
+        ("dataframe", model._model.predict),
+        ("matrix", model.predict),
+    ]
+    for batch_size in args.batch_sizes:
+        batch = X.iloc[:batch_size]
+        for name, predict in predictors:
+            print(json.dumps({
+                "predictor": name,
+                "batch_size": batch_size,
+                **_percentiles(predict, batch, args.repeat),
+            }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""LGBModelのシリアライズ形式ごとのサイズと読み込み時間を比較する
+
+以前の形式(一時ファイル経由 + joblibのzlib圧縮)と、現在のto_bytesの形式を比較する。
+
+    python benchmarks/lgb_serialization.py [--rows 100000] [--rounds 500] [--repeat 10]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spai.ai.boosting import Log1pModel  # noqa: E402
+from spai.ai.utils import serialize, deserialize  # noqa: E402
+
+
+def _legacy_to_bytes(model):
+    with tempfile.NamedTemporaryFile() as tf:
+        model._model.save_model(tf.name)
+        with open(tf.name, "rb") as f:
+            model_bin = f.read()
+
+    return serialize({"model": model_bin, "cbe": model._cbe, "params": model.params})
+
+
+def _legacy_from_bytes(binary):
+    # 以前のfrom_bytes(一時ファイル経由)
+    data = deserialize(binary)
+    model = Log1pModel()
+    model.params = data["params"]
+    model._cbe = data["cbe"]
+    with tempfile.NamedTemporaryFile() as tf:
+        with open(tf.name, "wb") as f:
+            f.write(data["model"])
+        model._model = lgb.Booster(model_file=tf.name)
+    return model
+
+
+def _model(rows, rounds):
+    np.random.seed(42)
+    X = pd.DataFrame(np.random.randn(rows, 20), columns=[f"col_{i}" for i in range(20)])
+    X["col_0"] = np.random.randint(0, 100, rows)
+    y = pd.Series(np.abs(np.random.randn(rows)))
+
+    model = Log1pModel({
+        "params": {"objective": "regression", "num_leaves": 63, "verbose": -1},
+        "num_boost_round": rounds,
+        "cat_features": [0],
+    })
+    model.fit(X, y)
+    return model
+
+
+def _load_sec(loader, binary, repeat):
+    secs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        loader(binary)
+        secs.append(time.perf_counter() - start)
+    return round(statistics.median(secs), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    model = _model(args.rows, args.rounds)
+    legacy_binary = _legacy_to_bytes(model)
+    cases = [
+        ("legacy", _legacy_from_bytes, legacy_binary),
+        ("legacy_read_by_current_loader", Log1pModel.from_bytes, legacy_binary),
+        ("current", Log1pModel.from_bytes, model.to_bytes()),
+    ]
+    for name, loader, binary in cases:
+        print(json.dumps({
+            "format": name,
+            "bytes": len(binary),
+            "load_median_sec": _load_sec(loader, binary, args.repeat),
+        }))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import hashlib
 from abc import ABC, abstractmethod
 import numpy as np
 
@@ -18,6 +19,36 @@ class BaseModel(ABC):
     def from_bytes(binary: bytes):
         raise NotImplementedError
 
+    @property
+    def fingerprint(self) -> str:
+        '''
+        hash of the serialized model, used as the version of the model
+        (e.g. in prediction cache keys). computed once by to_bytes unless
+        set by from_bytes
+        Returns
+        -------
+        fingerprint : str
+        '''
+        if getattr(self, "_fingerprint", None) is None:
+            self._fingerprint = hashlib.sha1(self.to_bytes()).hexdigest()
+        return self._fingerprint
+
+    @classmethod
+    def load(cls, value):
+        '''
+        deserialize value by from_bytes if it is binary,
+        otherwise return it as it is (already deserialized, e.g. cached one)
+        Parameters
+        ----------
+        value : Union[bytes, BaseModel]
+        Returns
+        -------
+        model : BaseModel
+        '''
+        if isinstance(value, (bytes, bytearray)):
+            return cls.from_bytes(value)
+        return value
+
 
 class BaseMLModel(BaseModel):
     '''
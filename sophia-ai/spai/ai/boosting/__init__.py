@@ -1,12 +1,29 @@
-from .tune_params import get_tuned_params  # noqa
-from .catboost_wrap import CatBoostModel
+import importlib
+
 from .lgb_wrap import LGBModel, ProbModel, Log1pModel
 
+# 学習・チューニングでのみ使うモジュールはoptunaやcatboostなど依存が重いため、
+# 推論時のimportを軽くするよう参照されたときにimportする
+_LAZY_ATTRIBUTES = {
+    "CatBoostModel": ".catboost_wrap",
+    "get_tuned_params": ".tune_params",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
-    CatBoostModel,
-    LGBModel,
-    ProbModel,
-    Log1pModel,
-    get_tuned_params,
+    "CatBoostModel",
+    "LGBModel",
+    "ProbModel",
+    "Log1pModel",
+    "get_tuned_params",
 ]
@@ -1,13 +1,37 @@
-import tempfile
+import pickle
+import hashlib
 from typing import List, Union, Optional
 
-import category_encoders as ce
 import lightgbm as lgb
 import numpy as np
 import pandas as pd
 
 from ..base import BaseMLModel
-from ..utils import deserialize, serialize
+from ..preprocess.lookup_encoder import LookupEncoder
+from ..utils import deserialize, has_magic, pack_sections, unpack_sections
+
+# to_bytesの形式。互換性のない変更をする場合は_FORMAT_VERSIONを上げる
+_MAGIC = b"SPAILGB\x00"
+_FORMAT_VERSION = 2
+
+
+def _to_matrix(X, booster: lgb.Booster):
+    """Booster.predictに渡す入力を、pandasの変換処理を介さない行列にする
+
+    Booster.predictはDataFrameを受け取ると1回ごとに列名の変換やdtypeの検査を行い、
+    少数の行の予測では処理時間の大半を占める。
+    数値型のみのDataFrameはLightGBMと同じ規則(共通のdtype、float以外はfloat32)で行列にするため、予測値は変わらない。
+    カテゴリ型などを含む場合や、カテゴリ型で学習したモデルの場合はそのまま返す。
+    """
+    if not isinstance(X, pd.DataFrame) or booster.pandas_categorical:
+        return X
+    if not all(isinstance(dtype, np.dtype) and dtype.kind in "biuf" for dtype in X.dtypes):
+        return X
+
+    X = X.to_numpy()
+    if X.dtype not in (np.float32, np.float64):
+        X = X.astype(np.float32)
+    return X
 
 
 class LGBModel(BaseMLModel):
@@ -16,12 +40,19 @@ class LGBModel(BaseMLModel):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._model = None
-        self._cbe = ce.CatBoostEncoder()
+        self._cbe = None
+        self._encoder = None
+        self._fingerprint = None
 
     @property
     def _cat_features(self):
         return self.params.get("cat_features", None)
 
+    def _set_cbe(self, cbe):
+        # 推論時はCatBoostEncoderを配列にしたLookupEncoderで変換する
+        self._cbe = cbe
+        self._encoder = LookupEncoder.from_catboost_encoder(cbe) if cbe is not None else None
+
     def fit(
         self,
         X: Union[np.ndarray, pd.DataFrame, List],
@@ -39,10 +70,15 @@ class LGBModel(BaseMLModel):
         '''
         weight = self._clip_weight(weight)
         self._check_X_type_and_cat_features(X)
+        self._fingerprint = None
         if self._cat_features:
+            # category_encodersは学習時のみ必要なため、推論時にimportしない
+            import category_encoders as ce
+
             cat_features = [X.columns[i] for i in self._cat_features]
-            self._cbe = ce.CatBoostEncoder(cols=cat_features)
-            X = self._cbe.fit_transform(X, y)
+            cbe = ce.CatBoostEncoder(cols=cat_features)
+            X = cbe.fit_transform(X, y)
+            self._set_cbe(cbe)
 
         y = self._scale(y)
         d_train = lgb.Dataset(X, y, weight=weight)
@@ -67,45 +103,73 @@ class LGBModel(BaseMLModel):
             predicted values
         '''
         self._check_X_type_and_cat_features(X)
-        if self._cat_features:
+        if self._encoder is not None:
+            X = self._encoder.transform(X)
+        elif self._cat_features:
             X = self._cbe.transform(X)
-        pred = self._model.predict(X, **kwargs)
+        pred = self._model.predict(_to_matrix(X, self._model), **kwargs)
         pred = self._inv_scale(pred)
         return pred
 
     def to_bytes(self) -> bytes:
         """binaryにシリアライズ
+
+        boosterのテキストとカテゴリ値の変換を、一時ファイルや圧縮を介さずにバージョン付きの形式でまとめる。
+        カテゴリ値の変換はLookupEncoderの配列で保存し、推論時にcategory_encodersを必要としない。
+        LookupEncoderにできない場合のみCatBoostEncoderをpickleで保存する。
         Returns:
             bytes: モデルのバイナリ
         """
-        with tempfile.NamedTemporaryFile() as tf:
-            self._model.save_model(tf.name)
-            with open(tf.name, "rb") as f:
-                model_bin = f.read()
+        sections = {
+            "model": self._model.model_to_string().encode(),
+            "params": pickle.dumps(self.params, protocol=pickle.HIGHEST_PROTOCOL),
+        }
+        if self._encoder is not None:
+            sections["encoder"] = self._encoder.to_bytes()
+        else:
+            sections["cbe"] = pickle.dumps(self._cbe, protocol=pickle.HIGHEST_PROTOCOL)
 
-        data = {"model": model_bin, "cbe": self._cbe, "params": self.params}
-        return serialize(data)
+        return pack_sections(_MAGIC, _FORMAT_VERSION, sections)
 
     @classmethod
     def from_bytes(cls, binary: bytes) -> "LGBModel":
         """binaryからデシリアライズ
+
+        to_bytesの形式に加え、CatBoostEncoderをpickleで保存した以前の形式や、joblibで圧縮した形式も読み込める。
+        以前の形式のCatBoostEncoderは読み込み時にLookupEncoderに変換する。
         Args:
             binary (bytes): モデルのバイナリ
         Returns:
             LGBModel: デシリアライズしたモデル
         """
+        if not has_magic(binary, _MAGIC):
+            return cls._from_legacy_bytes(binary)
+
+        version, sections = unpack_sections(binary, _MAGIC)
+        if version > _FORMAT_VERSION:
+            raise ValueError(f"unsupported LGBModel format version: {version}")
+
+        self = cls()
+        # 読み込んだバイナリのハッシュをモデルのバージョンとし、to_bytesし直さない
+        self._fingerprint = hashlib.sha1(binary).hexdigest()
+        self.params = pickle.loads(sections["params"])
+        if "encoder" in sections:
+            self._encoder = LookupEncoder.from_bytes(sections["encoder"])
+        else:
+            self._set_cbe(pickle.loads(sections["cbe"]))
+        self._model = lgb.Booster(model_str=str(sections["model"], "utf-8"))
+        return self
+
+    @classmethod
+    def _from_legacy_bytes(cls, binary: bytes) -> "LGBModel":
         data = deserialize(binary)
-        model_bin = data["model"]
-        cbe = data["cbe"]
-        params = data["params"]
 
         self = cls()
-        self.params = params
-        self._cbe = cbe
-        with tempfile.NamedTemporaryFile() as tf:
-            with open(tf.name, "wb") as f:
-                f.write(model_bin)
-            self._model = lgb.Booster(model_file=tf.name)
+        self._fingerprint = hashlib.sha1(binary).hexdigest()
+        self.params = data["params"]
+        self._set_cbe(data["cbe"])
+        # 以前の形式のmodelはsave_modelで出力したテキストのため、ファイルを介さずに読み込める
+        self._model = lgb.Booster(model_str=data["model"].decode())
         return self
 
 
@@ -0,0 +1,133 @@
+import json
+import datetime
+import threading
+from typing import Any, Dict, Optional, Type
+
+from .base import BaseModel
+from .preprocess.label_encoder_wrap import LabelEncoder
+from .utils import has_magic, pack_sections, unpack_sections
+
+# to_bytesの形式。互換性のない変更をする場合は_FORMAT_VERSIONを上げる
+_MAGIC = b"SPAIBDL\x00"
+_FORMAT_VERSION = 1
+_LABEL_ENCODER_PREFIX = "le/"
+
+
+class ModelBundle:
+    """1つのKPIモデルの推論に必要な成果物(モデル、LabelEncoder、特徴量の列、dtype)をまとめたもの
+
+    学習時はLabelEncoderとモデルのバイナリを追加してto_bytesで1つのバイナリにし、
+    推論時はfrom_bytesで読み込んだ後、load_model, load_label_encoderで必要なものだけデシリアライズする。
+    デシリアライズした結果は保持するため、ModelBundleをキャッシュすればモデル等も再利用される。
+    """
+
+    def __init__(self, manifest: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            manifest (Optional[Dict[str, Any]]): 成果物の情報(特徴量の列、dtypeなど)。JSONにできる値のみ
+        """
+        self.manifest = dict(manifest or {})
+        self._model_binary = None
+        self._label_encoder_binaries = {}
+
+        self._lock = threading.Lock()
+        self._loaded = {}
+
+    @property
+    def label_encoder_names(self):
+        return list(self._label_encoder_binaries)
+
+    def add_label_encoder(self, name: str, binary: bytes):
+        """LabelEncoderのバイナリを追加する
+
+        Args:
+            name (str): LabelEncoderの名前(列名)
+            binary (bytes): LabelEncoder.to_bytesのバイナリ
+        """
+        self._label_encoder_binaries[name] = binary
+
+    def set_model(self, binary: bytes):
+        """モデルのバイナリを設定する
+
+        Args:
+            binary (bytes): モデルのto_bytesのバイナリ
+        """
+        self._model_binary = binary
+
+    def to_bytes(self) -> bytes:
+        """binaryにシリアライズ
+
+        Returns:
+            bytes: manifest, モデル, LabelEncoderをまとめたバイナリ
+        """
+        if self._model_binary is None:
+            raise ValueError("model is not set")
+
+        manifest = {
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            **self.manifest,
+            "label_encoders": self.label_encoder_names,
+        }
+        sections = {
+            "manifest": json.dumps(manifest).encode(),
+            "model": self._model_binary,
+        }
+        for name, binary in self._label_encoder_binaries.items():
+            sections[f"{_LABEL_ENCODER_PREFIX}{name}"] = binary
+
+        return pack_sections(_MAGIC, _FORMAT_VERSION, sections)
+
+    @classmethod
+    def from_bytes(cls, binary: bytes) -> "ModelBundle":
+        """binaryからデシリアライズ
+
+        モデルとLabelEncoderはload_model, load_label_encoderを呼んだときにデシリアライズする。
+        Args:
+            binary (bytes): to_bytesのバイナリ
+        Returns:
+            ModelBundle: デシリアライズしたModelBundle
+        """
+        if not has_magic(binary, _MAGIC):
+            raise ValueError("binary is not a ModelBundle")
+
+        version, sections = unpack_sections(binary, _MAGIC)
+        if version > _FORMAT_VERSION:
+            raise ValueError(f"unsupported ModelBundle format version: {version}")
+
+        self = cls(json.loads(bytes(sections.pop("manifest"))))
+        self._model_binary = sections.pop("model")
+        for name, data in sections.items():
+            if name.startswith(_LABEL_ENCODER_PREFIX):
+                self._label_encoder_binaries[name[len(_LABEL_ENCODER_PREFIX):]] = data
+
+        return self
+
+    def _load(self, key, loader):
+        with self._lock:
+            if key not in self._loaded:
+                self._loaded[key] = loader()
+            return self._loaded[key]
+
+    def load_model(self, model_class: Type[BaseModel]) -> BaseModel:
+        """モデルをデシリアライズして返す
+
+        Args:
+            model_class (Type[BaseModel]): モデルのクラス
+        Returns:
+            BaseModel: デシリアライズしたモデル
+        """
+        return self._load(("model", model_class), lambda: model_class.from_bytes(self._model_binary))
+
+    def load_label_encoder(self, name: str) -> LabelEncoder:
+        """LabelEncoderをデシリアライズして返す
+
+        Args:
+            name (str): LabelEncoderの名前(列名)
+        Returns:
+            LabelEncoder: デシリアライズしたLabelEncoder
+        """
+        if name not in self._label_encoder_binaries:
+            raise KeyError(f"label encoder {name} is not in the bundle")
+
+        return self._load(
+            ("le", name), lambda: LabelEncoder.from_bytes(bytes(self._label_encoder_binaries[name])))
@@ -0,0 +1,15 @@
+"""推論のみで使うモデルクラス
+
+学習・チューニングで使うoptuna, catboost, sklearn, category_encodersをimportしないため、
+Lambdaなど推論のみを行う環境ではspai.ai.boostingやspai.ai.preprocessの代わりにこちらを参照する。
+"""
+from .boosting.lgb_wrap import LGBModel, ProbModel, Log1pModel
+from .preprocess.label_encoder_wrap import LabelEncoder
+
+
+__all__ = [
+    "LGBModel",
+    "ProbModel",
+    "Log1pModel",
+    "LabelEncoder",
+]
@@ -0,0 +1,50 @@
+"""予測値のキャッシュ
+
+再実行などで同じモデルに同じ特徴量を入力する場合に、model.predictを省略するために使う。
+キャッシュのキーはモデルのfingerprintと特徴量の内容(列名、dtype、値)のハッシュとする。
+キャッシュはget(key)で予測値(np.ndarray、存在しない場合はNone)を返し、put(key, preds)で保存するオブジェクトとする。
+"""
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from .base import BaseModel
+
+
+def prediction_cache_key(model: BaseModel, X: pd.DataFrame) -> str:
+    """モデルと特徴量の内容から、予測値のキャッシュのキーを作成する
+
+    Args:
+        model (BaseModel): 予測に使うモデル
+        X (pd.DataFrame): 特徴量
+    Returns:
+        str: キャッシュのキー
+    """
+    h = hashlib.sha1()
+    h.update(f"{type(model).__name__}/{model.fingerprint}".encode())
+    h.update(json.dumps([[str(col), str(dtype)] for col, dtype in X.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def cached_predict(model: BaseModel, X: pd.DataFrame, cache=None) -> np.ndarray:
+    """キャッシュに予測値があればそれを返し、なければ予測してキャッシュに保存する
+
+    Args:
+        model (BaseModel): 予測に使うモデル
+        X (pd.DataFrame): 特徴量
+        cache (Any): 予測値のキャッシュ。Noneの場合はキャッシュを使わずに予測する
+    Returns:
+        np.ndarray: 予測値
+    """
+    if cache is None:
+        return model.predict(X)
+
+    key = prediction_cache_key(model, X)
+    preds = cache.get(key)
+    if preds is None:
+        preds = model.predict(X)
+        cache.put(key, preds)
+    return preds
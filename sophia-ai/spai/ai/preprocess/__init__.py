@@ -1,6 +1,8 @@
 from .label_encoder_wrap import LabelEncoder  # noga
+from .lookup_encoder import LookupEncoder  # noga
 
 
 __all__ = [
     LabelEncoder,
+    LookupEncoder,
 ]
@@ -1,50 +1,110 @@
+import json
+
 import numpy as np
-from sklearn import preprocessing
+import pandas as pd
 
-from ..utils import serialize, deserialize
+from ..utils import deserialize, has_magic, pack_sections, unpack_sections
 from ..base import BaseModel
 
+# to_bytesの形式。互換性のない変更をする場合は_FORMAT_VERSIONを上げる
+_MAGIC = b"SPAILE\x00"
+_FORMAT_VERSION = 1
+
+UNKNOWN = "Unknown"
+
+
+def _to_str_codes(data_list):
+    """値をstrに変換した上で、ユニークな値とその位置に分解する
+
+    object型では1, 1.0, Trueのように等しいがstrが異なる値があり、float型でも0.0と-0.0が等しいため、
+    これらはstrに変換してからユニークな値に分解する。
+    それ以外の型では等しい値のstrは同じになるため、strへの変換はユニークな値に対してのみ行う。
+    欠損値はNone, NaN, pd.NAでstrが異なるため、欠損値の要素のみ個別に変換する。
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: 各要素のユニークな値の位置と、ユニークな値(str)
+    """
+    if isinstance(data_list, pd.Series):
+        values = data_list.array
+    elif hasattr(data_list, "dtype"):
+        values = data_list
+    else:
+        values = np.asarray(list(data_list), dtype=object)
+
+    if values.dtype.kind in "Of":
+        # 欠損値も含めて要素ごとにstr()で変換される
+        codes, uniques = pd.factorize(np.asarray(values).astype(str))
+        return codes, np.asarray(uniques, dtype=str)
+
+    codes, uniques = pd.factorize(values)
+    uniques = [str(x) for x in uniques]
+
+    na_index = np.flatnonzero(codes == -1)
+    if len(na_index) > 0:
+        na_str = [str(values[i]) for i in na_index]
+        na_uniques = list(dict.fromkeys(na_str))
+        codes[na_index] = len(uniques) + pd.Index(na_uniques).get_indexer(na_str)
+        uniques += na_uniques
+
+    return codes, np.array(uniques, dtype=str)
+
 
 class LabelEncoder(BaseModel):
+    """カテゴリ値を連番に変換する
+
+    値はstrに変換してから扱い、学習時に存在しない値(欠損値を含む)はUnknownに変換する。
+    sklearn.preprocessing.LabelEncoderと同じく、ソートしたクラスの位置を連番とする。
+    """
+
     def __init__(self):
-        self._le = preprocessing.LabelEncoder()
+        self.classes_ = None
 
     def fit(self, data_list):
         """欠損値用にUnknownクラスを追加してからfitする
         """
-        data_list = [str(x) for x in data_list]
-        self._le = self._le.fit(list(data_list) + ["Unknown"])
-        self.classes_ = self._le.classes_
+        _, uniques = _to_str_codes(data_list)
+        self.classes_ = np.unique(np.append(uniques, UNKNOWN))
         return self
 
     def transform(self, data_list):
-        """欠損値はUnknownに変換してからtransformする
+        """学習時に存在しない値はUnknownに変換してからtransformする
         """
-        data_list = [str(x) for x in data_list]
-        new_data_list = list(data_list)
-        for unique_item in np.unique(data_list):
-            if unique_item not in self._le.classes_:
-                new_data_list = [
-                    "Unknown" if x == unique_item else x for x in new_data_list
-                ]
+        codes, uniques = _to_str_codes(data_list)
 
-        return self._le.transform(new_data_list)
+        positions = np.searchsorted(self.classes_, uniques)
+        positions = np.minimum(positions, len(self.classes_) - 1)
+        is_known = self.classes_[positions] == uniques
+        unknown = np.searchsorted(self.classes_, UNKNOWN)
+        unique_labels = np.where(is_known, positions, unknown).astype(np.int64)
+
+        return unique_labels[codes]
 
     def to_bytes(self) -> bytes:
         """binaryにシリアライズ
         Returns:
             bytes: モデルのバイナリ
         """
-        return serialize(self._le)
+        return pack_sections(_MAGIC, _FORMAT_VERSION, {
+            "classes": json.dumps(self.classes_.tolist()).encode(),
+        })
 
     @classmethod
     def from_bytes(cls, binary: bytes) -> "LabelEncoder":
-        """binaryからデシリアライズo
+        """binaryからデシリアライズ
+
+        to_bytesの形式に加え、sklearnのLabelEncoderをjoblibで保存した以前の形式も読み込める。
         Args:
             binary (bytes): モデルのバイナリ
         Returns:
             LabelEncoder: デシリアライズしたモデル
         """
-        self = LabelEncoder()
-        self._le = deserialize(binary)
+        self = cls()
+        if has_magic(binary, _MAGIC):
+            version, sections = unpack_sections(binary, _MAGIC)
+            if version > _FORMAT_VERSION:
+                raise ValueError(f"unsupported LabelEncoder format version: {version}")
+            classes = json.loads(bytes(sections["classes"]))
+        else:
+            classes = deserialize(binary).classes_
+
+        self.classes_ = np.array(classes, dtype=str)
         return self
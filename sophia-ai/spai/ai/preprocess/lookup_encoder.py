@@ -0,0 +1,110 @@
+import json
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class LookupEncoder:
+    """学習済みのCatBoostEncoderを、列ごとのカテゴリ値とエンコード値の配列にしたもの
+
+    推論時のCatBoostEncoder.transform(yなし)と同じ値を、category_encodersやpandasの処理を介さずに求める。
+    学習時に存在したカテゴリ値はその値(出現が1回のみの場合は事前分布の値)に、存在しない値は事前分布の値に変換する。
+    欠損値は学習時に存在した場合はその値に、存在しない場合は事前分布の値に変換する。
+    """
+
+    def __init__(self, tables: Dict[Any, Tuple[np.ndarray, np.ndarray, float]], prior: float):
+        """
+        Args:
+            tables (Dict[Any, Tuple[np.ndarray, np.ndarray, float]]):
+                列名ごとの、ソートしたカテゴリ値、カテゴリ値ごとのエンコード値、欠損値のエンコード値
+            prior (float): 事前分布の値(学習データの目的変数の平均)
+        """
+        self.tables = tables
+        self.prior = prior
+
+    @classmethod
+    def from_catboost_encoder(cls, cbe) -> Optional["LookupEncoder"]:
+        """学習済みのCatBoostEncoderから作成する
+
+        カテゴリ値が数値でない場合や、未知の値・欠損値の扱いが既定値でない場合は配列にできないため、Noneを返す。
+        Args:
+            cbe (category_encoders.CatBoostEncoder): 学習済みのCatBoostEncoder
+        Returns:
+            Optional[LookupEncoder]: 作成したLookupEncoder
+        """
+        if cbe.handle_unknown != "value" or cbe.handle_missing != "value":
+            return None
+
+        tables = {}
+        for col, colmap in cbe.mapping.items():
+            if not pd.api.types.is_numeric_dtype(colmap.index.dtype):
+                return None
+
+            # CatBoostEncoder._transformと同じ式で、カテゴリ値ごとのエンコード値を求める
+            level_means = ((colmap["sum"] + cbe._mean * cbe.a) / (colmap["count"] + cbe.a)).where(
+                colmap["count"] > 1, cbe._mean)
+            is_nan = colmap.index.isna()
+            keys = colmap.index[~is_nan].to_numpy(dtype=np.float64)
+            values = level_means[~is_nan].to_numpy(dtype=np.float64)
+            nan_value = float(level_means[is_nan].iloc[0]) if is_nan.any() else float(cbe._mean)
+
+            order = np.argsort(keys, kind="stable")
+            tables[col] = (keys[order], values[order], nan_value)
+
+        return cls(tables, float(cbe._mean))
+
+    def _transform_column(self, col, values: np.ndarray) -> np.ndarray:
+        keys, table, nan_value = self.tables[col]
+        # 末尾に未知の値用の要素を追加し、見つからない値はその位置を引く
+        positions = np.searchsorted(keys, values)
+        is_known = np.append(keys, np.nan)[positions] == values
+        result = np.take(np.append(table, self.prior), np.where(is_known, positions, len(keys)))
+        result[np.isnan(values)] = nan_value
+        return result
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        """カテゴリ値の列をエンコード値に変換する
+
+        Args:
+            X (pd.DataFrame): 変換するデータ
+        Returns:
+            pd.DataFrame: カテゴリ値の列をfloat64のエンコード値に置き換えたデータ
+        """
+        # 列ごと置き換えるため、元のデータを変更しない浅いコピーで良い
+        X = pd.DataFrame(X).copy(deep=False)
+        for col in self.tables:
+            X[col] = self._transform_column(col, X[col].to_numpy(dtype=np.float64, na_value=np.nan))
+        return X
+
+    def to_bytes(self) -> bytes:
+        """binaryにシリアライズ
+        Returns:
+            bytes: JSONのバイナリ
+        """
+        return json.dumps({
+            "prior": self.prior,
+            "columns": [
+                {"name": col, "keys": keys.tolist(), "values": values.tolist(), "nan_value": nan_value}
+                for col, (keys, values, nan_value) in self.tables.items()
+            ],
+        }).encode()
+
+    @classmethod
+    def from_bytes(cls, binary: bytes) -> "LookupEncoder":
+        """binaryからデシリアライズ
+        Args:
+            binary (bytes): to_bytesのバイナリ
+        Returns:
+            LookupEncoder: デシリアライズしたLookupEncoder
+        """
+        data = json.loads(bytes(binary))
+        tables = {
+            column["name"]: (
+                np.array(column["keys"], dtype=np.float64),
+                np.array(column["values"], dtype=np.float64),
+                column["nan_value"],
+            )
+            for column in data["columns"]
+        }
+        return cls(tables, data["prior"])
@@ -1,4 +1,8 @@
 import io
+import json
+import struct
+from typing import Dict, Tuple
+
 import joblib
 
 
@@ -24,3 +28,63 @@ def deserialize(binary: bytes):
     f = io.BytesIO(binary)
     obj = joblib.load(f)
     return obj
+
+
+def pack_sections(magic: bytes, version: int, sections: Dict[str, bytes]) -> bytes:
+    """名前付きのバイナリを圧縮せずに1つのバイナリにまとめる
+
+    先頭はmagic, バージョン(uint16), ヘッダー長(uint32)で、
+    ヘッダー(JSON)に各セクションの名前とバイト数を持つ。
+    Args:
+            magic (bytes): 形式を識別する先頭のバイト列
+            version (int): 形式のバージョン
+            sections (Dict[str, bytes]): セクション名とバイナリ
+    Returns:
+            bytes: まとめたバイナリ
+    """
+    header = json.dumps(
+        [[name, len(data)] for name, data in sections.items()]
+    ).encode()
+    return b"".join([
+        magic,
+        struct.pack("<HI", version, len(header)),
+        header,
+        *sections.values(),
+    ])
+
+
+def has_magic(binary: bytes, magic: bytes) -> bool:
+    """pack_sectionsでまとめたバイナリか判定する
+    Args:
+            binary (bytes): 判定するバイナリ
+            magic (bytes): 形式を識別する先頭のバイト列
+    Returns:
+            bool: magicで始まる場合True
+    """
+    return bytes(binary[:len(magic)]) == magic
+
+
+def unpack_sections(binary: bytes, magic: bytes) -> Tuple[int, Dict[str, memoryview]]:
+    """pack_sectionsでまとめたバイナリを、コピーせずにセクションごとに分割する
+    Args:
+            binary (bytes): pack_sectionsでまとめたバイナリ
+            magic (bytes): 形式を識別する先頭のバイト列
+    Returns:
+            Tuple[int, Dict[str, memoryview]]: バージョンと、セクション名ごとのバイナリ
+    """
+    if not has_magic(binary, magic):
+        raise ValueError("unknown binary format")
+
+    view = memoryview(binary)
+    offset = len(magic)
+    version, header_size = struct.unpack_from("<HI", view, offset)
+    offset += struct.calcsize("<HI")
+    header = json.loads(bytes(view[offset:offset + header_size]))
+    offset += header_size
+
+    sections = {}
+    for name, size in header:
+        sections[name] = view[offset:offset + size]
+        offset += size
+
+    return version, sections
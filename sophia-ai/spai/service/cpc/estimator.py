@@ -3,7 +3,8 @@ import pandas as pd
 import numpy as np
 from typing import Callable
 
-from spai.ai.boosting import Log1pModel, get_tuned_params
+from spai.ai.boosting import Log1pModel
+from spai.ai.prediction_cache import cached_predict
 from .config import (
     FEATURE_COLUMNS,
     TARGET_COLUMN,
@@ -23,12 +24,15 @@ class CPCEstimator:
                  model_reader: Callable[[None], object] = None,
                  output: Callable[[pd.DataFrame], None] = None,
                  is_tune: bool = True,
-                 num_trials: int = 50):
+                 num_trials: int = 50,
+                 prediction_cache=None):
         self._output = output
         self._model_writer = model_writer
         self._model_reader = model_reader
         self._is_tune = is_tune
         self._num_trials = num_trials
+        # 予測値のキャッシュ(spai.ai.prediction_cache)。同じモデルと特徴量の予測を省略する
+        self._prediction_cache = prediction_cache
 
     def _cutoff(self, df: pd.DataFrame) -> pd.DataFrame:
         df = df[df[TARGET_COLUMN] > 0]
@@ -48,6 +52,9 @@ class CPCEstimator:
 
         cat_features = [FEATURE_COLUMNS.index(col) for col in CATEGORICAL_COLUMNS]
         if self._is_tune:
+            # チューニング用の依存(optuna等)は推論時に不要なため、学習時のみimportする
+            from spai.ai.boosting import get_tuned_params
+
             params = get_tuned_params(
                 CPCModel,
                 X_train,
@@ -84,8 +91,8 @@ class CPCEstimator:
     def predict(self, df: pd.DataFrame, today):
         yesterday = today - datetime.timedelta(days=1)
         if callable(self._model_reader):
-            binary = self._model_reader()
-            model = CPCModel.from_bytes(binary)
+            # model_readerはバイナリ、またはデシリアライズ済みのモデルを返す
+            model = CPCModel.load(self._model_reader())
         else:
             model = self._model
 
@@ -94,7 +101,7 @@ class CPCEstimator:
         df_inference = df[df["date"] == yesterday].copy()
 
         X_inference = df_inference[FEATURE_COLUMNS]
-        preds = model.predict(X_inference)
+        preds = cached_predict(model, X_inference, self._prediction_cache)
         preds = np.clip(preds, 1, np.inf)
         df_inference.loc[:, TARGET_COLUMN] = preds
         df_inference['date'] = today
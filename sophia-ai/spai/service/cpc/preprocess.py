@@ -6,9 +6,12 @@ import importlib
 
 from spai.utils.kpi import (
     merge_cutoff_feats,
+    merge_cutoff_feats_at,
     calc_kpis,
     calc_lag,
+    lag_rows,
     calc_mean,
+    rollup_means,
     calc_placement_kpi,
 )
 
@@ -133,17 +136,13 @@ def set_unit_id(df):
     return df
 
 
-def agg(df: pd.DataFrame, output_dtypes: dict) -> pd.DataFrame:
-    df = df.reset_index(drop=True)
-    # 足切り用変数
-    df = merge_cutoff_feats(df)
-
-    # 目的変数
-    df = calc_kpis(df)
-
-    # 説明変数
+def calc_lag_feats(df: pd.DataFrame) -> pd.DataFrame:
+    # ad_id以外のキーの日付ごとの平均は、まとめて計算する
+    means = rollup_means(
+        df, {prefix: key_columns for prefix, key_columns in LAG_AGG_KEY_COLS_MAP.items() if prefix != 'ad_id'},
+        LAG_FEATURE_COLS)
     for prefix, key_columns in LAG_AGG_KEY_COLS_MAP.items():
-        df = calc_mean(df, LAG_FEATURE_COLS, key_columns=key_columns, prefix=prefix)
+        df = calc_mean(df, LAG_FEATURE_COLS, key_columns=key_columns, prefix=prefix, means=means.get(prefix))
 
     for prefix, key_columns in LAG_AGG_KEY_COLS_MAP.items():
         for lag_feature in LAG_FEATURE_COLS:
@@ -154,6 +153,10 @@ def agg(df: pd.DataFrame, output_dtypes: dict) -> pd.DataFrame:
                 key_columns=key_columns,
                 col_name_format=f"{prefix}_lag{{day}}_{lag_feature}")
 
+    return df
+
+
+def _select_output_columns(df: pd.DataFrame, output_dtypes: dict) -> pd.DataFrame:
     df['weekday'] = df['date'].dt.dayofweek
 
     df = df.drop(
@@ -166,6 +169,43 @@ def agg(df: pd.DataFrame, output_dtypes: dict) -> pd.DataFrame:
     return df
 
 
+def agg(df: pd.DataFrame, output_dtypes: dict, target_date=None) -> pd.DataFrame:
+    df = df.reset_index(drop=True)
+    if target_date is not None:
+        return agg_at(df, output_dtypes, target_date)
+
+    # 足切り用変数
+    df = merge_cutoff_feats(df)
+
+    # 目的変数
+    df = calc_kpis(df)
+
+    # 説明変数
+    df = calc_lag_feats(df)
+
+    return _select_output_columns(df, output_dtypes)
+
+
+def agg_at(df: pd.DataFrame, output_dtypes: dict, target_date) -> pd.DataFrame:
+    """aggの結果のうち、target_dateの行のみを計算する(予測用)
+
+    ラグ変数は対象日の行と、キーごとに対象日より前で最新のLAG_TERM日分の行のみで計算する。
+    足切り用変数はキーごとにtarget_dateより前の履歴を集計して結合するため、
+    全期間の行に対するrollingを行わない。
+    """
+    # 目的変数とラグ変数は行ごとの計算のため、対象日の行とラグの計算に必要な行のみで計算する
+    history = df
+    df = lag_rows(df, target_date, LAG_AGG_KEY_COLS_MAP.values(), LAG_TERM)
+    df = calc_kpis(df)
+    df = calc_lag_feats(df)
+    df = df[df['date'] == target_date].reset_index(drop=True)
+
+    # 足切り用変数
+    df = merge_cutoff_feats_at(df, history, target_date)
+
+    return _select_output_columns(df, output_dtypes)
+
+
 class CPCPreprocessor:
     def __init__(self,
                  label_encoder_writer: Callable[[LabelEncoder, str], None],
@@ -179,7 +219,7 @@ class CPCPreprocessor:
         self._batch_size = batch_size
         self._is_use_dask = is_use_dask
 
-    def _preprocess(self, df, df_placement, dask_util=None):
+    def _preprocess(self, df, df_placement, dask_util=None, target_date=None):
         df = set_unit_id(df)
         for col in agg_feature_cols:
             df[col] = df[col].fillna(0)
@@ -194,11 +234,11 @@ class CPCPreprocessor:
             df = self._client.persist(df)
 
             meta = dask_util.make_meta(output_dtypes)
-            df = df.map_partitions(agg, output_dtypes, meta=meta)
+            df = df.map_partitions(agg, output_dtypes, target_date, meta=meta)
             df = df.clear_divisions()
             df = df.compute()  # dask -> pandas
         else:
-            df = agg(df, output_dtypes)
+            df = agg(df, output_dtypes, target_date)
 
         df = calc_placement_kpi(df, df_placement)
 
@@ -215,20 +255,13 @@ class CPCPreprocessor:
                 le.fit(df[col].values)
                 self._label_encoder_writer(le.to_bytes(), col)
             else:
-                le = LabelEncoder.from_bytes(self._label_encoder_reader(col))
+                le = LabelEncoder.load(self._label_encoder_reader(col))
             df[col] = le.transform(df[col].values)
 
         df = df.sort_values('date')
         return df
 
-    def _preprocess_dask(self, df: pd.DataFrame, df_placement: pd.DataFrame, is_train: bool):
-        dask_util = importlib.import_module("spai.utils.dask")
-        self._client, self._cluster = dask_util.get_dask_client()
-
-        logger.info("start _preprocess")
-        df = self._preprocess(df, df_placement, dask_util)
-        logger.info("finished _preprocess")
-
+    def _encode(self, df: pd.DataFrame, is_train: bool) -> pd.DataFrame:
         logger.info("start add_catcodes")
         df = self.add_catcodes(df, is_train)
         logger.info("finished add_catcodes")
@@ -238,33 +271,45 @@ class CPCPreprocessor:
         df = df.drop(agg_feature_cols, axis=1)
         df.reset_index(drop=True, inplace=True)
 
+        return df
+
+    def _preprocess_dask(self, df: pd.DataFrame, df_placement: pd.DataFrame, is_train: bool, target_date=None):
+        dask_util = importlib.import_module("spai.utils.dask")
+        self._client, self._cluster = dask_util.get_dask_client()
+
+        logger.info("start _preprocess")
+        df = self._preprocess(df, df_placement, dask_util, target_date)
+        logger.info("finished _preprocess")
+
+        df = self._encode(df, is_train)
+
         self._cluster.close()
         self._client.close()
         return df
 
-    def _preprocess_pandas(self, df: pd.DataFrame, df_placement: pd.DataFrame, is_train: bool):
+    def _preprocess_pandas(self, df: pd.DataFrame, df_placement: pd.DataFrame, is_train: bool, target_date=None):
 
         logger.info("start preprocess_ad")
-        df = self._preprocess(df, df_placement)
+        df = self._preprocess(df, df_placement, target_date=target_date)
         logger.info("finished preprocess_ad")
 
-        logger.info("start add_catcodes")
-        df = self.add_catcodes(df, is_train)
-        logger.info("finished add_catcodes")
-
-        df["weight"] = df[WEIGHT_COLUMN].fillna(0)
-
-        df = df.drop(agg_feature_cols, axis=1)
-        df.reset_index(drop=True, inplace=True)
+        df = self._encode(df, is_train)
 
         return df
 
-    def preprocess(self, df: pd.DataFrame, df_placement: pd.DataFrame = None, is_train: bool = False) -> pd.DataFrame:
+    def preprocess(
+            self, df: pd.DataFrame, df_placement: pd.DataFrame = None, is_train: bool = False,
+            target_date=None) -> pd.DataFrame:
+        """前処理
+
+        Args:
+            target_date (datetime): 指定した場合、その日の行のみ特徴量を計算して返す(予測用)
+        """
         df["ad_type_feature"] = df["ad_type"]
         if self._is_use_dask:
-            df = self._preprocess_dask(df, df_placement, is_train)
+            df = self._preprocess_dask(df, df_placement, is_train, target_date)
         else:
-            df = self._preprocess_pandas(df, df_placement, is_train)
+            df = self._preprocess_pandas(df, df_placement, is_train, target_date)
 
         if is_train:
             df[TARGET_COLUMN] = df.groupby([
@@ -278,3 +323,24 @@ class CPCPreprocessor:
             self._output(df)
 
         return df
+
+    def preprocess_features(self, df: pd.DataFrame, df_placement: pd.DataFrame = None) -> pd.DataFrame:
+        """spai.service.features.build_featuresで計算した特徴量から、このモデルで使う列を取り出して前処理する(予測用)
+
+        Args:
+            df (pd.DataFrame): build_featuresの結果
+            df_placement (pd.DataFrame): プレースメントの実績
+        Returns:
+            pd.DataFrame: preprocessにtarget_dateを指定した場合と同じ結果
+        """
+        input_dtypes, output_dtypes = get_dtypes()
+        columns = [d[0] for d in output_dtypes]
+        df = df[columns].astype({column: input_dtypes[column] for column in columns if column in input_dtypes})
+        df = calc_placement_kpi(df, df_placement)
+
+        df = self._encode(df, is_train=False)
+
+        if callable(self._output):
+            self._output(df)
+
+        return df
@@ -0,0 +1,15 @@
+from .preprocess import (
+    UNIT_KEY_COLUMNS,
+    build_features,
+    get_input_dtypes,
+    split_by_unit,
+    unit_keys,
+)
+
+__all__ = [
+    "UNIT_KEY_COLUMNS",
+    "build_features",
+    "get_input_dtypes",
+    "split_by_unit",
+    "unit_keys",
+]
@@ -0,0 +1,146 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from spai.utils.kpi import (
+    calc_kpis,
+    lag_rows,
+    merge_agg_feats_at,
+    merge_cutoff_feats_at,
+)
+from spai.service.cpc import preprocess as cpc_preprocess
+from spai.service.cvr import preprocess as cvr_preprocess
+from spai.service.spa import preprocess as spa_preprocess
+
+# 予測で特徴量を共有するモデルの前処理
+_PREPROCESSES = [cpc_preprocess, cvr_preprocess, spa_preprocess]
+# クエリ用の特徴量を使うモデルの前処理
+_QUERY_PREPROCESSES = [cvr_preprocess, spa_preprocess]
+
+
+# unitを識別する列
+UNIT_KEY_COLUMNS = ["advertising_account_id", "portfolio_id"]
+
+
+def _union(column_lists):
+    return list(dict.fromkeys(column for columns in column_lists for column in columns))
+
+
+FEATURE_COLUMNS = _union([p.FEATURE_COLUMNS for p in _PREPROCESSES])
+KPI_COLUMNS = _union([p.KPI_COLUMNS for p in _QUERY_PREPROCESSES])
+
+
+def get_input_dtypes():
+    """各モデルの入力のdtypeを合わせたもの。同じ列で異なる場合は先のモデルのdtypeとする
+
+    各モデルのdtypeへはpreprocess_featuresで変換する。
+    """
+    input_dtypes = {}
+    for p in _PREPROCESSES:
+        for column, dtype in p.get_dtypes()[0].items():
+            input_dtypes.setdefault(column, dtype)
+
+    return input_dtypes
+
+
+def agg_at(df: pd.DataFrame, target_date) -> pd.DataFrame:
+    """各モデルのagg_atで計算する特徴量の和集合を、target_dateの行について計算する
+
+    ラグ変数は対象日の行と、キーごとに対象日より前で最新のLAG_TERM日分(各モデルの最大)の行のみで計算する。
+    """
+    # 目的変数とラグ変数は行ごとの計算のため、対象日の行とラグの計算に必要な行のみで計算する
+    history = df
+    df = lag_rows(
+        df, target_date,
+        [key_columns for p in _PREPROCESSES for key_columns in p.LAG_AGG_KEY_COLS_MAP.values()],
+        max(p.LAG_TERM for p in _PREPROCESSES))
+    df = calc_kpis(df)
+    for p in _PREPROCESSES:
+        df = p.calc_lag_feats(df)
+    df = df[df['date'] == target_date].reset_index(drop=True)
+
+    # 足切り用変数
+    df = merge_cutoff_feats_at(df, history, target_date)
+
+    # クエリ用変数
+    for freq, prefix in [('7D', 'ewm7'), ('28D', 'ewm28')]:
+        df = cvr_preprocess.merge_query_feats_at(
+            df, history, target_date, freq=freq, prefix=prefix, feature_columns=FEATURE_COLUMNS)
+
+    # 説明変数
+    for freq, method, prefix, key_column in cvr_preprocess.WINDOW_FEATS:
+        df = merge_agg_feats_at(
+            df, history, target_date, freq, method,
+            prefix=prefix, key_column=key_column, feature_columns=FEATURE_COLUMNS)
+    df = cvr_preprocess.kpi_diff(df, KPI_COLUMNS, FEATURE_COLUMNS)
+
+    df['weekday'] = df['date'].dt.dayofweek
+    df['day_of_month'] = df['date'].dt.day
+
+    return df
+
+
+def build_features(df: pd.DataFrame, df_query: pd.DataFrame, target_date) -> pd.DataFrame:
+    """CPC, CVR, SPAの予測に使う特徴量を、target_dateの行について1回でまとめて計算する
+
+    各モデルの前処理で重複していた集計(足切り用変数、目的変数、ラグ変数、rolling・ewm)を共有する。
+    各モデルへはPreprocessor.preprocess_featuresで必要な列のみを取り出して渡す。
+    dfとdf_queryは変更されるため、他の処理と共有している場合はコピーを渡す。
+    Args:
+        df (pd.DataFrame): 広告の実績
+        df_query (pd.DataFrame): クエリの実績
+        target_date (datetime): 予測に使う日付(前日)
+    Returns:
+        pd.DataFrame: target_dateの行の特徴量
+    """
+    df["ad_type_feature"] = df["ad_type"]
+    df = cvr_preprocess.set_unit_id(df)
+    for col in cvr_preprocess.agg_feature_cols:
+        df[col] = df[col].fillna(0)
+    df["optimization_purpose"] = df["optimization_purpose"].fillna(0)
+
+    df_query["portfolio_id"] = df_query["portfolio_id"].astype(pd.Int64Dtype())
+
+    df = cvr_preprocess.merge_query_df(df, df_query)
+
+    df = df.astype(get_input_dtypes())
+    df = df.reset_index(drop=True)
+
+    return agg_at(df, target_date)
+
+
+def _unit_key(advertising_account_id, portfolio_id) -> Tuple[int, Optional[int]]:
+    return int(advertising_account_id), None if pd.isna(portfolio_id) else int(portfolio_id)
+
+
+def _unit_indices(df: pd.DataFrame) -> Dict[Tuple[int, Optional[int]], np.ndarray]:
+    if len(df) == 0:
+        return {}
+    indices = df.groupby(UNIT_KEY_COLUMNS, dropna=False, sort=False).indices
+    return {_unit_key(*key): index for key, index in indices.items()}
+
+
+def split_by_unit(df: pd.DataFrame, unit_keys: Iterable[Tuple[int, Optional[int]]] = ()) \
+        -> Dict[Tuple[int, Optional[int]], pd.DataFrame]:
+    """dfをunitごとに分割する
+
+    Args:
+        df (pd.DataFrame): advertising_account_id, portfolio_idの列を持つDataFrame
+        unit_keys (Iterable[Tuple[int, Optional[int]]]): dfに行がなくても結果に含めるunit
+    Returns:
+        Dict[Tuple[int, Optional[int]], pd.DataFrame]: (advertising_account_id, portfolio_id)ごとのDataFrame。
+            portfolio_idが欠損の場合はNone
+    """
+    indices = _unit_indices(df)
+    result = {key: df.iloc[index].reset_index(drop=True) for key, index in indices.items()}
+    for key in unit_keys:
+        if key not in result:
+            result[key] = df.iloc[0:0].reset_index(drop=True)
+
+    return result
+
+
+def unit_keys(df: pd.DataFrame) -> List[Tuple[int, Optional[int]]]:
+    """dfに含まれるunitの(advertising_account_id, portfolio_id)のリストを返す"""
+    return list(_unit_indices(df))
@@ -2,7 +2,8 @@ import datetime
 import pandas as pd
 from typing import Callable
 
-from spai.ai.boosting import Log1pModel, get_tuned_params
+from spai.ai.boosting import Log1pModel
+from spai.ai.prediction_cache import cached_predict
 from .config import (
     FEATURE_COLUMNS,
     TARGET_COLUMN,
@@ -24,12 +25,15 @@ class SPAEstimator:
                  model_reader: Callable[[None], object] = None,
                  output: Callable[[pd.DataFrame], None] = None,
                  is_tune: bool = True,
-                 num_trials: int = 50):
+                 num_trials: int = 50,
+                 prediction_cache=None):
         self._output = output
         self._model_writer = model_writer
         self._model_reader = model_reader
         self._is_tune = is_tune
         self._num_trials = num_trials
+        # 予測値のキャッシュ(spai.ai.prediction_cache)。同じモデルと特徴量の予測を省略する
+        self._prediction_cache = prediction_cache
 
     def _cutoff(self, df: pd.DataFrame) -> pd.DataFrame:
         df = df[(df['ad_id_weekly_sum_clicks'] > THRESHOLD_OF_CLICKS_WEEKLY) &
@@ -46,6 +50,9 @@ class SPAEstimator:
 
         cat_features = [FEATURE_COLUMNS.index(col) for col in CATEGORICAL_COLUMNS]
         if self._is_tune:
+            # チューニング用の依存(optuna等)は推論時に不要なため、学習時のみimportする
+            from spai.ai.boosting import get_tuned_params
+
             params = get_tuned_params(
                 SPAModel,
                 X_train,
@@ -82,8 +89,8 @@ class SPAEstimator:
     def predict(self, df: pd.DataFrame, today):
         yesterday = today - datetime.timedelta(days=1)
         if callable(self._model_reader):
-            binary = self._model_reader()
-            model = SPAModel.from_bytes(binary)
+            # model_readerはバイナリ、またはデシリアライズ済みのモデルを返す
+            model = SPAModel.load(self._model_reader())
         else:
             model = self._model
 
@@ -92,7 +99,7 @@ class SPAEstimator:
         df_inference = df[df["date"] == yesterday].copy()
 
         X_inference = df_inference[FEATURE_COLUMNS]
-        df_inference.loc[:, TARGET_COLUMN] = model.predict(X_inference)
+        df_inference.loc[:, TARGET_COLUMN] = cached_predict(model, X_inference, self._prediction_cache)
         df_inference['date'] = today
         df_inference['portfolio_id'] = df_inference['portfolio_id'].astype("Int64")
 
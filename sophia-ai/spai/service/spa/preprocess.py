@@ -6,12 +6,18 @@ import importlib
 
 from spai.utils.kpi import (
     merge_feats,
-    merge_agg_feats,
+    merge_window_feats,
+    rollup_means,
     merge_cutoff_feats,
+    merge_feats_at,
+    merge_agg_feats_at,
+    merge_cutoff_feats_at,
+    trailing_reduce,
     calc_kpis,
     safe_div,
     ewm,
     calc_lag,
+    lag_rows,
     calc_mean,
 )
 from spai.ai.preprocess import LabelEncoder
@@ -176,12 +182,12 @@ def set_unit_id(df):
     return df
 
 
-def kpi_diff(df):
+def kpi_diff(df, kpi_columns=KPI_COLUMNS, feature_columns=FEATURE_COLUMNS):
     print(df.columns)
     for prefix in ["campaign_id", "unit_id"]:
-        for col_name in KPI_COLUMNS:
+        for col_name in kpi_columns:
             column = f"diff_{prefix}_{col_name}"
-            if any([feature_column.endswith(column) for feature_column in FEATURE_COLUMNS]):
+            if any([feature_column.endswith(column) for feature_column in feature_columns]):
                 df[column] = safe_div(
                     (df[f"ad_id_{col_name}"] - df[f"{prefix}_{col_name}"]), df[f"{prefix}_{col_name}"])
 
@@ -227,39 +233,26 @@ def merge_query_feats(df, freq='7D', prefix='weekly', key_column='ad_id'):
     return df
 
 
-def agg(df: pd.DataFrame, output_dtypes: dict) -> pd.DataFrame:
-    df = df.reset_index(drop=True)
-    # 足切り用変数
-    df = merge_cutoff_feats(df)
-
-    # クエリ用変数
-    df = merge_query_feats(df, freq='7D', prefix='ewm7')
-    df = merge_query_feats(df, freq='28D', prefix='ewm28')
-
-    # 目的変数
-    df = calc_kpis(df)
+def merge_query_feats_at(
+        df, history, target_date, freq='7D', prefix='weekly', key_column='ad_id', feature_columns=FEATURE_COLUMNS):
+    """merge_query_featsのtarget_dateの行のみを対象とする版
+    """
+    feats = trailing_reduce(history, target_date, key_column, agg_query_feature_cols, freq, 'ewm')
+    columns = {column: f"{key_column}_{prefix}_{column}" for column in agg_query_feature_cols}
+    feats = feats.rename(columns=columns)
+    feats = feats.drop([column for column in columns.values() if column not in feature_columns], axis=1)
+    return merge_feats_at(df, feats, key_column)
+
+
+# rolling・ewmの説明変数 (freq, method, prefix, key_column)
+WINDOW_FEATS = [
+    (freq, method, prefix, key_column)
+    for key_column in ['ad_id', 'campaign_id', 'unit_id']
+    for freq, method, prefix in [('7D', 'ewm', 'ewm7'), ('7D', 'rolling', 'weekly'), ('28D', 'rolling', 'monthly')]
+]
 
-    # 説明変数
-    df = merge_agg_feats(
-        df, '7D', 'ewm', prefix='ewm7', key_column='ad_id', feature_columns=FEATURE_COLUMNS)
-    df = merge_agg_feats(
-        df, '7D', 'rolling', prefix='weekly', key_column='ad_id', feature_columns=FEATURE_COLUMNS)
-    df = merge_agg_feats(
-        df, '28D', 'rolling', prefix='monthly', key_column='ad_id', feature_columns=FEATURE_COLUMNS)
-    df = merge_agg_feats(
-        df, '7D', 'ewm', prefix='ewm7', key_column='campaign_id', feature_columns=FEATURE_COLUMNS)
-    df = merge_agg_feats(
-        df, '7D', 'rolling', prefix='weekly', key_column='campaign_id', feature_columns=FEATURE_COLUMNS)
-    df = merge_agg_feats(
-        df, '28D', 'rolling', prefix='monthly', key_column='campaign_id', feature_columns=FEATURE_COLUMNS)
-    df = merge_agg_feats(
-        df, '7D', 'ewm', prefix='ewm7', key_column='unit_id', feature_columns=FEATURE_COLUMNS)
-    df = merge_agg_feats(
-        df, '7D', 'rolling', prefix='weekly', key_column='unit_id', feature_columns=FEATURE_COLUMNS)
-    df = merge_agg_feats(
-        df, '28D', 'rolling', prefix='monthly', key_column='unit_id', feature_columns=FEATURE_COLUMNS)
-    df = kpi_diff(df)
 
+def calc_lag_feats(df: pd.DataFrame) -> pd.DataFrame:
     for prefix, key_columns in LAG_AGG_KEY_COLS_MAP.items():
         df = calc_mean(df, LAG_FEATURE_COLS, key_columns=key_columns, prefix=prefix)
 
@@ -272,6 +265,10 @@ def agg(df: pd.DataFrame, output_dtypes: dict) -> pd.DataFrame:
                 key_columns=key_columns,
                 col_name_format=f"{prefix}_lag{{day}}_{lag_feature}")
 
+    return df
+
+
+def _select_output_columns(df: pd.DataFrame, output_dtypes: dict) -> pd.DataFrame:
     df['weekday'] = df['date'].dt.dayofweek
     df['day_of_month'] = df['date'].dt.day
 
@@ -285,6 +282,67 @@ def agg(df: pd.DataFrame, output_dtypes: dict) -> pd.DataFrame:
     return df
 
 
+def agg(df: pd.DataFrame, output_dtypes: dict, target_date=None) -> pd.DataFrame:
+    df = df.reset_index(drop=True)
+    if target_date is not None:
+        return agg_at(df, output_dtypes, target_date)
+
+    # 足切り用変数
+    df = merge_cutoff_feats(df)
+
+    # クエリ用変数
+    df = merge_query_feats(df, freq='7D', prefix='ewm7')
+    df = merge_query_feats(df, freq='28D', prefix='ewm28')
+
+    # 目的変数
+    df = calc_kpis(df)
+
+    # 説明変数(キーごとに全ての窓をまとめて計算する。ad_id以外のキーの日付ごとの平均はまとめて計算する)
+    key_columns = list(dict.fromkeys(key for _, _, _, key in WINDOW_FEATS))
+    means = rollup_means(
+        df, {key: [key] for key in key_columns if key != 'ad_id'}, agg_feature_cols, fill_value=0.0)
+    for key_column in key_columns:
+        windows = [(freq, method, prefix) for freq, method, prefix, key in WINDOW_FEATS if key == key_column]
+        df = merge_window_feats(
+            df, windows, key_column=key_column, feature_columns=FEATURE_COLUMNS, means=means.get(key_column))
+    df = kpi_diff(df)
+
+    df = calc_lag_feats(df)
+
+    return _select_output_columns(df, output_dtypes)
+
+
+def agg_at(df: pd.DataFrame, output_dtypes: dict, target_date) -> pd.DataFrame:
+    """aggの結果のうち、target_dateの行のみを計算する(予測用)
+
+    ラグ変数は対象日の行と、キーごとに対象日より前で最新のLAG_TERM日分の行のみで計算する。
+    rolling・ewmの特徴量はキーごとに対象日より前の履歴を1回のgroupbyで集計して結合するため、
+    全期間の行に対する行単位の計算(ソート・結合・shift)を行わない。
+    """
+    # 目的変数とラグ変数は行ごとの計算のため、対象日の行とラグの計算に必要な行のみで計算する
+    history = df
+    df = lag_rows(df, target_date, LAG_AGG_KEY_COLS_MAP.values(), LAG_TERM)
+    df = calc_kpis(df)
+    df = calc_lag_feats(df)
+    df = df[df['date'] == target_date].reset_index(drop=True)
+
+    # 足切り用変数
+    df = merge_cutoff_feats_at(df, history, target_date)
+
+    # クエリ用変数
+    df = merge_query_feats_at(df, history, target_date, freq='7D', prefix='ewm7')
+    df = merge_query_feats_at(df, history, target_date, freq='28D', prefix='ewm28')
+
+    # 説明変数
+    for freq, method, prefix, key_column in WINDOW_FEATS:
+        df = merge_agg_feats_at(
+            df, history, target_date, freq, method,
+            prefix=prefix, key_column=key_column, feature_columns=FEATURE_COLUMNS)
+    df = kpi_diff(df)
+
+    return _select_output_columns(df, output_dtypes)
+
+
 def merge_query_df(df: pd.DataFrame, df_query: pd.DataFrame):
     # キャンペーン & クエリ単位で集計
     df_sum_query = df_query.groupby(
@@ -329,7 +387,7 @@ class SPAPreprocessor:
         self._batch_size = batch_size
         self._is_use_dask = is_use_dask
 
-    def _preprocess(self, df, df_query, dask_util=None):
+    def _preprocess(self, df, df_query, dask_util=None, target_date=None):
         df = set_unit_id(df)
         for col in agg_feature_cols:
             df[col] = df[col].fillna(0)
@@ -348,11 +406,11 @@ class SPAPreprocessor:
             df = self._client.persist(df)
 
             meta = dask_util.make_meta(output_dtypes)
-            df = df.map_partitions(agg, output_dtypes, meta=meta)
+            df = df.map_partitions(agg, output_dtypes, target_date, meta=meta)
             df = df.clear_divisions()
             df = df.compute()  # dask -> pandas
         else:
-            df = agg(df, output_dtypes)
+            df = agg(df, output_dtypes, target_date)
 
         return df
 
@@ -368,20 +426,13 @@ class SPAPreprocessor:
                 le.fit(df[col].values)
                 self._label_encoder_writer(le.to_bytes(), col)
             else:
-                le = LabelEncoder.from_bytes(self._label_encoder_reader(col))
+                le = LabelEncoder.load(self._label_encoder_reader(col))
             df[col] = le.transform(df[col].values)
 
         df = df.sort_values('date')
         return df
 
-    def _preprocess_dask(self, df: pd.DataFrame, df_query: pd.DataFrame, is_train: bool):
-        dask_util = importlib.import_module("spai.utils.dask")
-        self._client, self._cluster = dask_util.get_dask_client()
-
-        logger.info("start _preprocess")
-        df = self._preprocess(df, df_query, dask_util)
-        logger.info("finished _preprocess")
-
+    def _encode(self, df: pd.DataFrame, is_train: bool) -> pd.DataFrame:
         logger.info("start add_catcodes")
         df = self.add_catcodes(df, is_train)
         logger.info("finished add_catcodes")
@@ -391,33 +442,62 @@ class SPAPreprocessor:
         df = df.drop(agg_feature_cols, axis=1)
         df.reset_index(drop=True, inplace=True)
 
+        return df
+
+    def _preprocess_dask(self, df: pd.DataFrame, df_query: pd.DataFrame, is_train: bool, target_date=None):
+        dask_util = importlib.import_module("spai.utils.dask")
+        self._client, self._cluster = dask_util.get_dask_client()
+
+        logger.info("start _preprocess")
+        df = self._preprocess(df, df_query, dask_util, target_date)
+        logger.info("finished _preprocess")
+
+        df = self._encode(df, is_train)
+
         self._cluster.close()
         self._client.close()
         return df
 
-    def _preprocess_pandas(self, df: pd.DataFrame, df_query: pd.DataFrame, is_train: bool):
+    def _preprocess_pandas(self, df: pd.DataFrame, df_query: pd.DataFrame, is_train: bool, target_date=None):
 
         logger.info("start preprocess_ad")
-        df = self._preprocess(df, df_query)
+        df = self._preprocess(df, df_query, target_date=target_date)
         logger.info("finished preprocess_ad")
 
-        logger.info("start add_catcodes")
-        df = self.add_catcodes(df, is_train)
-        logger.info("finished add_catcodes")
-
-        df["weight"] = df[WEIGHT_COLUMN].fillna(0)
-
-        df = df.drop(agg_feature_cols, axis=1)
-        df.reset_index(drop=True, inplace=True)
+        df = self._encode(df, is_train)
 
         return df
 
-    def preprocess(self, df: pd.DataFrame, df_query: pd.DataFrame, is_train: bool) -> pd.DataFrame:
+    def preprocess(
+            self, df: pd.DataFrame, df_query: pd.DataFrame, is_train: bool, target_date=None) -> pd.DataFrame:
+        """前処理
 
+        Args:
+            target_date (datetime): 指定した場合、その日の行のみ特徴量を計算して返す(予測用)
+        """
         if self._is_use_dask:
-            df = self._preprocess_dask(df, df_query, is_train)
+            df = self._preprocess_dask(df, df_query, is_train, target_date)
         else:
-            df = self._preprocess_pandas(df, df_query, is_train)
+            df = self._preprocess_pandas(df, df_query, is_train, target_date)
+
+        if callable(self._output):
+            self._output(df)
+
+        return df
+
+    def preprocess_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        """spai.service.features.build_featuresで計算した特徴量から、このモデルで使う列を取り出して前処理する(予測用)
+
+        Args:
+            df (pd.DataFrame): build_featuresの結果
+        Returns:
+            pd.DataFrame: preprocessにtarget_dateを指定した場合と同じ結果
+        """
+        input_dtypes, output_dtypes = get_dtypes()
+        columns = [d[0] for d in output_dtypes]
+        df = df[columns].astype({column: input_dtypes[column] for column in columns if column in input_dtypes})
+
+        df = self._encode(df, is_train=False)
 
         if callable(self._output):
             self._output(df)
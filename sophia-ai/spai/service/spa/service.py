@@ -1,3 +1,9 @@
+import datetime
+
+import pandas as pd
+
+from spai.service.features import split_by_unit, unit_keys
+
 from .preprocess import SPAPreprocessor
 from .estimator import SPAEstimator
 
@@ -13,6 +19,28 @@ class SPAPredictionService:
         self._estimator.fit(df)
 
     def predict(self, df, df_query, today):
-        df = self._preprocessor.preprocess(df, df_query, False)
+        # 予測に使うのは前日の行のみのため、前日の行のみ特徴量を計算する
+        yesterday = today - datetime.timedelta(days=1)
+        df = self._preprocessor.preprocess(df, df_query, False, target_date=yesterday)
+        df = self._estimator.predict(df, today)
+        return df
+
+    def predict_features(self, df_features, today):
+        """spai.service.features.build_featuresで計算した特徴量から予測する"""
+        df = self._preprocessor.preprocess_features(df_features)
         df = self._estimator.predict(df, today)
         return df
+
+    def predict_many(self, dfs_features, today):
+        """複数unitの特徴量をまとめて1回で前処理・予測し、unitごとに分割して返す
+
+        モデルの読み込み、LabelEncoderの変換、予測をunitごとに繰り返さないため、unit数が多い場合に使う。
+        Args:
+            dfs_features (List[pd.DataFrame]): unitごとのbuild_featuresの結果
+            today (datetime): 予測日
+        Returns:
+            Dict[Tuple[int, Optional[int]], pd.DataFrame]: (advertising_account_id, portfolio_id)ごとの予測結果
+        """
+        df_features = pd.concat(dfs_features, ignore_index=True)
+        df = self.predict_features(df_features, today)
+        return split_by_unit(df, unit_keys(df_features))
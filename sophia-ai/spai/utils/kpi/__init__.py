@@ -3,13 +3,25 @@ from .cost import (
     target_cost,
     used_cost,
 )
+from .panel import DailyPanel
 from .kpi import (
     agg_feats,
     merge_feats,
+    shift_join,
     merge_agg_feats,
     merge_cutoff_feats,
+    merge_window_feats,
+    rollup_means,
+    rolling_window_sums,
+    grouped_rolling,
+    trailing_reduce,
+    agg_feats_at,
+    merge_feats_at,
+    merge_agg_feats_at,
+    merge_cutoff_feats_at,
     calc_kpis,
     calc_lag,
+    lag_rows,
     calc_mean,
     calc_placement_kpi,
     safe_div,
@@ -18,6 +30,7 @@ from .kpi import (
     adjust_roas_target,
     purpose,
     mode,
+    segmented_ewm,
     ewm,
     calc_unit_weekly_cpc_for_cap,
     get_C,
@@ -27,12 +40,24 @@ __all__ = [
     remaining_days,
     target_cost,
     used_cost,
+    DailyPanel,
     agg_feats,
     merge_feats,
+    shift_join,
     merge_agg_feats,
     merge_cutoff_feats,
+    merge_window_feats,
+    rollup_means,
+    rolling_window_sums,
+    grouped_rolling,
+    trailing_reduce,
+    agg_feats_at,
+    merge_feats_at,
+    merge_agg_feats_at,
+    merge_cutoff_feats_at,
     calc_kpis,
     calc_lag,
+    lag_rows,
     calc_mean,
     calc_placement_kpi,
     safe_div,
@@ -41,6 +66,7 @@ __all__ = [
     adjust_roas_target,
     purpose,
     mode,
+    segmented_ewm,
     ewm,
     calc_unit_weekly_cpc_for_cap,
     get_C,
@@ -2,6 +2,7 @@ from datetime import timedelta
 import numpy as np
 import pandas as pd
 
+from .panel import DailyPanel, factorize, window_days
 
 agg_feature_cols = ['impressions', 'clicks',
                     'costs', 'conversions', 'sales']
@@ -39,38 +40,205 @@ def calc_kpis(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def agg_feats(df, freq, method, prefix, key_column, feature_columns, date_column='date'):
-    min_periods = 1
+def rolling_window_sums(values, times, segment_ids, windows):
+    """セグメントごとの時間窓の合計と欠損でない値の数を、全ての窓・列についてまとめて計算する
+
+    groupby(...).rolling(window, on=...)と同じく、各行の窓は同じセグメントの自身以前の行のうち、
+    時刻が(自身の時刻 - window, 自身の時刻]の行とする。
+    累積和の差で求めると、大きな値の後の小さな値の窓で桁落ちし比率の特徴量が不安定になるため、
+    窓に入る行を1行ずつずらしながら足し合わせる。ループは窓に入る行数の最大値(日次のデータの28Dの窓では28回)となる。
+    Args:
+        values (np.ndarray): (行数, 列数)の値。欠損値はNaN
+        times (np.ndarray): 各行の時刻(datetime64)。セグメント内で昇順に並べる
+        segment_ids (np.ndarray): 各行のセグメント。同じセグメントの行は連続して並べる
+        windows (List[Union[str, pd.Timedelta]]): 窓の幅
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (窓の数, 行数, 列数)の合計と、欠損でない値の数
+    """
+    values = np.asarray(values, dtype=np.float64)
+    segment_ids = np.asarray(segment_ids)
+    times = np.asarray(times, dtype="datetime64[ns]").view(np.int64)
+    window_ns = [pd.Timedelta(window).value for window in windows]
+    n = len(values)
+
+    is_observation = ~np.isnan(values)
+    observations = is_observation.astype(np.float64)
+    values = np.where(is_observation, values, 0.0)
+    if is_observation.all():
+        # 欠損値がなければ値の数は全ての列で同じため、1列分のみ数える
+        observations = observations[:, :1]
+
+    sums = np.zeros((len(windows),) + values.shape)
+    counts = np.zeros((len(windows),) + observations.shape)
+    for offset in range(n):
+        # 各行(current)と、その offset 行前の行(previous)
+        current, previous = slice(offset, None), slice(None, n - offset)
+        is_same = segment_ids[current] == segment_ids[previous]
+        elapsed = times[current] - times[previous]
+
+        # 時刻はセグメント内で昇順のため、どの窓にも入らなくなれば以降のoffsetも入らない
+        is_active = False
+        for i, window in enumerate(window_ns):
+            in_window = (is_same & (elapsed < window))[:, np.newaxis]
+            if not in_window.any():
+                continue
+            is_active = True
+            np.add(sums[i, current], values[previous], out=sums[i, current], where=in_window)
+            np.add(counts[i, current], observations[previous], out=counts[i, current], where=in_window)
+
+        if not is_active:
+            break
+
+    return sums, np.broadcast_to(counts, sums.shape)
+
+
+def _daily_panel(df, key_columns, columns, date_column, windows=(), dropna=True):
+    """backend='dense'のDailyPanelを作成する。キーと日付の組が重複する場合や、1日単位でない日付・窓はValueErrorとする
+    """
+    panel = None
+    if all(window_days(window) is not None for window in windows):
+        panel = DailyPanel.from_frame(df, key_columns, columns, date_column, dropna=dropna)
+    if panel is None:
+        raise ValueError("dense backend requires one row per key per day")
+    return panel
+
+
+def grouped_rolling(df, key_column, columns, windows, method='mean', min_periods=1, date_column='date',
+                    backend='long'):
+    """キーごとの時間窓の集計を、全ての窓・列について1回でまとめて計算する
+
+    窓ごとの df.groupby(key_column).rolling(window, on=date_column, min_periods=min_periods)[columns].{method}()
+    と同じ値を、dfの行に揃えて返す。キーが欠損値の行はNaNとする。
+    Args:
+        df (pd.DataFrame): 集計対象。キーごとに日付の昇順に並べる
+        key_column (str): キーの列
+        columns (List[str]): 集計する列
+        windows (List[str]): 窓の幅
+        method (str): sum, mean
+        min_periods (int): 窓内の欠損でない値がこの数未満の行はNaNとする
+        date_column (str): 日付の列
+        backend (str): long(rolling_window_sums)・dense(DailyPanel)。denseはキーと日付ごとに1行の日次データのみ
+    Returns:
+        List[pd.DataFrame]: 窓ごとの集計結果(indexはdf.index)
+    """
+    if backend == 'dense':
+        panel = _daily_panel(df, [key_column], columns, date_column, windows)
+        return [
+            pd.DataFrame(values, index=df.index, columns=columns)
+            for values in panel.rolling(windows, method, min_periods)
+        ]
+
+    codes, _ = pd.factorize(df[key_column], sort=True)
+    times = df[date_column].to_numpy(dtype="datetime64[ns]")
+    positions = np.flatnonzero(codes >= 0)
+    order = positions[np.lexsort((times[positions], codes[positions]))]
+
+    sums, counts = rolling_window_sums(
+        df[columns].to_numpy(dtype=np.float64)[order], times[order], codes[order], windows)
+    if method == 'mean':
+        values = np.divide(sums, counts, out=np.full_like(sums, np.nan), where=counts > 0)
+    else:
+        values = sums
+    values = np.where(counts >= min_periods, values, np.nan)
+
+    results = []
+    for window_values in values:
+        result = np.full((len(df), len(columns)), np.nan)
+        result[order] = window_values
+        results.append(pd.DataFrame(result, index=df.index, columns=columns))
+
+    return results
+
+
+def rollup_means(df, levels, columns, date_column='date', fill_value=None):
+    """複数の階層のキーについて、キー・日付ごとの列の平均をまとめて計算する
+
+    全ての階層のキーと日付の組ごとの合計と欠損でない値の数を全行に対する1回のgroupbyで求め、
+    各階層はその結果をさらに合計して平均とする。階層ごとに全行をgroupbyする
+    df.groupby(key_columns + [date_column], dropna=False)[columns].mean() と同じ値(合計の順による丸め誤差を除く)となる。
+    Args:
+        df (pd.DataFrame): 集計対象
+        levels (Dict[str, List[str]]): 階層の名前とキーの列
+        columns (List[str]): 平均する列
+        date_column (str): 日付の列
+        fill_value (Optional[float]): 指定した場合は欠損値をこの値にしてから平均する
+    Returns:
+        Dict[str, pd.DataFrame]: 階層ごとの、キー・日付順に並べた(キーの列, 日付, columns)の平均
+    """
+    keys = list(dict.fromkeys(key for key_columns in levels.values() for key in key_columns))
+    values = df[columns] if fill_value is None else df[columns].fillna(fill_value)
+    sum_columns = [f"sum_{i}" for i in range(len(columns))]
+    count_columns = [f"count_{i}" for i in range(len(columns))]
+    totals = pd.concat([
+        df[keys + [date_column]],
+        values.set_axis(sum_columns, axis=1),
+        values.notna().astype(np.float64).set_axis(count_columns, axis=1),
+    ], axis=1).groupby(keys + [date_column], dropna=False, sort=False).sum().reset_index()
+
+    means = {}
+    for name, key_columns in levels.items():
+        level = totals.groupby(key_columns + [date_column], dropna=False).sum(numeric_only=True)
+        counts = level[count_columns].to_numpy()
+        level_means = np.divide(
+            level[sum_columns].to_numpy(), counts, out=np.full(counts.shape, np.nan), where=counts > 0)
+        means[name] = pd.concat([
+            level.index.to_frame(index=False),
+            pd.DataFrame(level_means, columns=columns),
+        ], axis=1)
+
+    return means
+
+
+def _window_input(df, key_column, date_column, means=None):
+    """rolling・ewmの集計対象。キー・日付順に並べ、欠損値は0とする。ad_id以外のキーは日付ごとに平均する
+
+    meansを指定した場合は、ad_id以外のキーの日付ごとの平均として使う(rollup_meansのfill_value=0.0の結果)。
+    """
+    if means is not None:
+        res = means[means[key_column].notna() & means[date_column].notna()]
+        return res[[key_column, date_column] + agg_feature_cols].reset_index(drop=True)
 
-    df = df.sort_values([key_column, date_column])
-    res = df[agg_feature_cols + [key_column, date_column]]
+    res = df[agg_feature_cols + [key_column, date_column]].sort_values([key_column, date_column])
 
     if key_column != "ad_id":
         res = res.fillna(0.0).groupby([key_column, date_column]).mean().reset_index()
 
-    res = res.sort_values([key_column, date_column])
-    dates = res[date_column].values
-    ids = res[key_column].values
-    res = res.fillna(0.0).groupby(key_column, group_keys=False)
-
-    if method == 'rolling':
-        res = res.rolling(
-            freq,
-            on=date_column,
-            min_periods=min_periods
-        ).mean()[agg_feature_cols]
-    else:
-        res = ewm(res, freq, min_periods, agg_feature_cols)
+    return res.sort_values([key_column, date_column]).fillna(0.0).reset_index(drop=True)
 
-    res = res.fillna(0.0).reset_index().rename(columns={'level_1': 'index'})
 
-    # ewmの場合にdateとad_idがindexに含まれない
-    if date_column not in res.columns:
-        res[date_column] = dates
-    if key_column not in res.columns:
-        res[key_column] = ids
+def _window_values(res, windows, key_column, date_column):
+    """_window_inputの各行の、窓ごとのrolling(平均)・ewmの値を計算する
 
-    added_column = []
+    rollingの窓はgrouped_rolling、ewmの半減期はsegmented_ewmで、それぞれ全ての窓を1回で計算する。
+    Args:
+        windows (List[Tuple[str, str]]): (freq, method)のリスト。methodがrolling以外の場合はewm
+    Returns:
+        List[np.ndarray]: 窓ごとの(行数, agg_feature_colsの数)の値。欠損値は0とする
+    """
+    values = [None] * len(windows)
+    rolling = [i for i, (_, method) in enumerate(windows) if method == 'rolling']
+    ewms = [i for i, (_, method) in enumerate(windows) if method != 'rolling']
+
+    if len(rolling) > 0:
+        results = grouped_rolling(
+            res, key_column, agg_feature_cols, [windows[i][0] for i in rolling], 'mean', date_column=date_column)
+        for i, result in zip(rolling, results):
+            values[i] = result.to_numpy()
+    if len(ewms) > 0:
+        results = segmented_ewm(
+            res[agg_feature_cols].to_numpy(dtype=np.float64), res[date_column].to_numpy(),
+            res[key_column].to_numpy(), [windows[i][0] for i in ewms], min_periods=1)
+        for i, result in zip(ewms, results):
+            values[i] = result
+
+    return [np.where(np.isnan(value), 0.0, value) for value in values]
+
+
+def _kpi_feats(values, prefix, key_column, feature_columns):
+    """rolling・ewmの値から、比率の特徴量(列名は{key_column}_{prefix}_{kpi})を計算する
+    """
+    columns = dict(zip(agg_feature_cols, values.T))
+    feats = {}
     for kpi_name, div_fields in {
         "ctr": ("clicks", "impressions"),
         "cvr": ("conversions", "clicks"),
@@ -80,13 +248,19 @@ def agg_feats(df, freq, method, prefix, key_column, feature_columns, date_column
         column = feat_column_name(key_column, prefix, kpi_name)
         if key_column == "ad_id" \
                 or any([feature_column.endswith(column) for feature_column in feature_columns]):
-            added_column.append(column)
-            res[column] = safe_div(
-                res[div_fields[0]].values,
-                res[div_fields[1]].values
-            )
+            feats[column] = safe_div(columns[div_fields[0]], columns[div_fields[1]])
+
+    return feats
+
+
+def agg_feats(df, freq, method, prefix, key_column, feature_columns, date_column='date'):
+    res = _window_input(df, key_column, date_column)
+    values = _window_values(res, [(freq, method)], key_column, date_column)[0]
 
-    res = res[[key_column, date_column] + agg_feature_cols + added_column]
+    res = res[[key_column, date_column]].copy()
+    res[agg_feature_cols] = values
+    for column, value in _kpi_feats(values, prefix, key_column, feature_columns).items():
+        res[column] = value
 
     return res
 
@@ -113,52 +287,253 @@ def merge_feats(df, feats, prefix, key_column, date_column='date'):
     return out
 
 
+def shift_join(df, feats, key_column, date_column='date'):
+    """キーごとに、dfの各行の日付より前で最新の日付のfeatsの行を結合する
+
+    pd.merge_asof(..., by=key_column, allow_exact_matches=False, direction='backward') と同じ行を結合するが、
+    dfを並べ替えずに元のindexの順(結果のindexは0からの連番)で返す。
+    featsがキー・日付順に並んでいる(agg_featsの結果)ことを利用し、dfの各行について
+    featsの同じキー・日付の先頭の行の位置を二分探索で求め、その1行前の行を同じキーの場合のみ結合する。
+    同じキー・日付の行が複数ある場合は、merge_asofと同じく最後の行を結合する。
+    Args:
+        df (pd.DataFrame): 結合先
+        feats (pd.DataFrame): キー・日付ごとの特徴量
+    Returns:
+        pd.DataFrame: dfにfeatsのkey_column, date_column以外の列を追加したデータ
+    """
+    df_dates = pd.to_datetime(df[date_column])
+    if df_dates.isna().any():
+        raise ValueError("Merge keys contain null values on left side")
+    feats_dates = pd.to_datetime(feats[date_column]).to_numpy(dtype="datetime64[ns]")
+
+    key_codes, keys = factorize(feats[key_column], dropna=False)
+    dates = np.unique(feats_dates)
+    # 日付をfeatsの日付の中での順位にし、キーと組み合わせた1つの整数で比較する
+    width = len(dates) + 1
+    feats_positions = key_codes.astype(np.int64) * width + np.searchsorted(dates, feats_dates)
+    if (np.diff(feats_positions) < 0).any():
+        order = np.argsort(feats_positions, kind='stable')
+        feats, feats_positions = feats.iloc[order], feats_positions[order]
+
+    df_codes = pd.Index(keys).get_indexer(df[key_column])
+    df_positions = df_codes.astype(np.int64) * width + np.searchsorted(dates, df_dates.to_numpy())
+    positions = np.searchsorted(feats_positions, df_positions, side='left') - 1
+    is_matched = (df_codes >= 0) & (positions >= 0)
+    is_matched[is_matched] = feats_positions[positions[is_matched]] // width == df_codes[is_matched]
+
+    columns = [column for column in feats.columns if column not in [key_column, date_column]]
+    values = feats[columns].reset_index(drop=True).reindex(np.where(is_matched, positions, -1))
+
+    out = df.copy()
+    out[date_column] = df_dates
+    if not df.index.is_monotonic_increasing:
+        order = np.argsort(df.index.to_numpy(), kind='stable')
+        out, values = out.iloc[order], values.iloc[order]
+    return pd.concat([out.reset_index(drop=True), values.reset_index(drop=True)], axis=1)
+
+
 def merge_agg_feats(df, freq, method, prefix, key_column, feature_columns=None, date_column='date'):
-    df['index'] = df.index
     feats = agg_feats(df, freq, method, prefix, key_column, feature_columns, date_column)
-    df = merge_feats(df, feats, prefix, key_column, date_column)
-    df = df.sort_values('index').reset_index(drop=True)
-    return df.drop('index', axis=1)
+    # merge_featsと同じく、dfと重複する列名は{key_column}_{prefix}_{列名}とする
+    suffix = f'_{key_column}_{prefix}'
+    feats = feats.rename(columns={
+        column: f'{column}{suffix}' for column in feats.columns
+        if column in df.columns and column not in [key_column, date_column]})
+    out = shift_join(df, feats, key_column, date_column)
+    out.columns = [
+        f'{key_column}_{prefix}_{col.replace(suffix, "")}' if suffix in col else col for col in out.columns]
+    return out
+
+
+def merge_window_feats(df, windows, key_column, feature_columns=None, date_column='date', means=None):
+    """1つのキーについて、複数の窓のrolling・ewmの特徴量をまとめて計算して結合する
+
+    windowsの順にmerge_agg_featsを繰り返した結果と同じとなるが、集計対象の作成、
+    全ての窓のrolling・ewmの計算、結合をそれぞれ1回で行う。
+    Args:
+        windows (List[Tuple[str, str, str]]): (freq, method, prefix)のリスト
+        means (Optional[pd.DataFrame]): ad_id以外のキーの、rollup_means(..., agg_feature_cols, fill_value=0.0)の結果
+    """
+    res = _window_input(df, key_column, date_column, means)
+    values = _window_values(res, [(freq, method) for freq, method, _ in windows], key_column, date_column)
+
+    feats = res[[key_column, date_column]].copy()
+    for (_, _, prefix), window_values in zip(windows, values):
+        for column, value in zip(agg_feature_cols, window_values.T):
+            feats[feat_column_name(key_column, prefix, column)] = value
+        for column, value in _kpi_feats(window_values, prefix, key_column, feature_columns).items():
+            feats[column] = value
+
+    return shift_join(df, feats, key_column, date_column)
 
 
 def merge_cutoff_feats(df):
     """足切り用の特徴量の計算
     """
-    df['index'] = df.index
-    df = df.sort_values(['ad_id', 'date'])
-    res = df[["ad_id", "date", "clicks", "conversions", "sales"]]
-    res = res.fillna(0.0).groupby('ad_id')
+    res = df.sort_values(['ad_id', 'date'])[["ad_id", "date", "clicks", "conversions", "sales"]].fillna(0.0)
+
+    weekly_sum, monthly_sum = grouped_rolling(
+        res, "ad_id", ["clicks", "conversions", "sales"], ["7D", "28D"], 'sum')
+
+    feats = res[["ad_id", "date"]].copy()
+    feats["ad_id_weekly_sum_clicks"] = weekly_sum["clicks"].fillna(0.0)
+    for column in ["conversions", "sales"]:
+        feats[f"ad_id_monthly_sum_{column}"] = monthly_sum[column].fillna(0.0)
+
+    return shift_join(df, feats, "ad_id")
+
+
+def trailing_reduce(df, target_date, key_column, columns, freq, method, date_column='date'):
+    """キーごとに、target_dateより前で最新の日付を終端とする窓でcolumnsを集計する
+
+    merge_featsで対象日の行に結合される、rolling・ewmの最後の値のみを計算する。
+    Args:
+        df (pd.DataFrame): 集計対象
+        target_date (datetime): 対象日
+        key_column (str): キーの列
+        columns (List[str]): 集計する列
+        freq (str): 窓の幅。methodがewmの場合は半減期
+        method (str): sum, mean(窓内の合計・平均), ewm(全履歴の指数加重平均)
+        date_column (str): 日付の列
+    Returns:
+        pd.DataFrame: キーと集計結果
+    """
+    history = df.loc[df[date_column] < target_date, [key_column, date_column] + columns].fillna(0.0)
+    last_date = history.groupby(key_column)[date_column].transform('max')
+
+    if method == 'ewm':
+        # adjust=Trueのewmの最後の値は、最後の日付からの経過時間で重み付けした平均となる
+        weight = np.power(0.5, (last_date - history[date_column]) / pd.Timedelta(freq))
+        keys = history[key_column]
+        res = history[columns].mul(weight, axis=0).groupby(keys).sum() \
+            .div(weight.groupby(keys).sum(), axis=0)
+    else:
+        # rollingの窓は(最後の日付 - freq, 最後の日付]
+        history = history[history[date_column] > last_date - pd.Timedelta(freq)]
+        res = history.groupby(key_column)[columns].agg(method)
+
+    return res.reset_index()
+
+
+def agg_feats_at(df, target_date, freq, method, prefix, key_column, feature_columns, date_column='date'):
+    """agg_featsの結果のうち、merge_featsでtarget_dateの行に結合される値のみを計算する
+    Returns:
+        pd.DataFrame: キーと特徴量(列名は{key_column}_{prefix}_{値})
+    """
+    res = df.loc[df[date_column] < target_date, agg_feature_cols + [key_column, date_column]]
+    if key_column != "ad_id":
+        res = res.fillna(0.0).groupby([key_column, date_column]).mean().reset_index()
+
+    res = trailing_reduce(
+        res, target_date, key_column, agg_feature_cols, freq,
+        'ewm' if method == 'ewm' else 'mean', date_column)
 
-    weekly_sum = res.rolling('7D', on='date', min_periods=1)
-    monthly_sum = res.rolling('28D', on='date', min_periods=1)
+    for column, value in _kpi_feats(res[agg_feature_cols].to_numpy(), prefix, key_column, feature_columns).items():
+        res[column] = value
 
-    weekly_sum = weekly_sum[['clicks']].sum().fillna(
-        0.0).reset_index().rename(columns={'level_1': 'index'})
+    return res.rename(columns={col: feat_column_name(key_column, prefix, col) for col in agg_feature_cols})
 
-    monthly_sum = monthly_sum[['conversions', 'sales']].sum().fillna(
-        0.0).reset_index().rename(columns={'level_1': 'index'})
 
-    df = merge_feats(df, weekly_sum, prefix="weekly_sum", key_column="ad_id")
-    df = merge_feats(df, monthly_sum, prefix="monthly_sum", key_column="ad_id")
+def merge_feats_at(df, feats, key_column):
+    """キーごとの特徴量を結合する(merge_featsのtarget_dateの行のみを対象とする版)
+    """
+    feats = feats.copy()
+    feats[key_column] = feats[key_column].astype(df[key_column].dtype)
+    return pd.merge(df, feats, how='left', on=key_column)
+
+
+def merge_agg_feats_at(df, history, target_date, freq, method, prefix, key_column, feature_columns=None,
+                       date_column='date'):
+    """merge_agg_featsのtarget_dateの行のみを対象とする版
+
+    Args:
+        df (pd.DataFrame): target_dateの行
+        history (pd.DataFrame): 特徴量の計算に使う、target_dateより前の行を含むデータ
+    """
+    feats = agg_feats_at(history, target_date, freq, method, prefix, key_column, feature_columns, date_column)
+    return merge_feats_at(df, feats, key_column)
+
+
+def merge_cutoff_feats_at(df, history, target_date):
+    """merge_cutoff_featsのtarget_dateの行のみを対象とする版
+
+    Args:
+        df (pd.DataFrame): target_dateの行
+        history (pd.DataFrame): 特徴量の計算に使う、target_dateより前の行を含むデータ
+    """
+    for prefix, freq, columns in [
+        ("weekly_sum", "7D", ["clicks"]),
+        ("monthly_sum", "28D", ["conversions", "sales"]),
+    ]:
+        feats = trailing_reduce(history, target_date, "ad_id", columns, freq, "sum")
+        feats = feats.rename(columns={col: f"ad_id_{prefix}_{col}" for col in columns})
+        df = merge_feats_at(df, feats, "ad_id")
 
-    df = df.sort_values('index').reset_index(drop=True)
+    return df
 
-    return df.drop('index', axis=1)
 
+def calc_lag(df, column, days=14, key_columns=['ad_type', 'ad_id'], date_column="date", col_name_format="ad_id",
+             backend='long'):
+    """キーごとに、1日前からdays日前までの値の列を追加する
 
-def calc_lag(df, column, days=14, key_columns=['ad_type', 'ad_id'], date_column="date", col_name_format="ad_id"):
+    backendがlongの場合はgroupby.shift、denseの場合はDailyPanelのスライスで計算する。
+    denseはキーと日付ごとに1行の欠けのない日次データのみで、groupby.shiftと同じ値となる。
+    """
     df = df.sort_values(key_columns + [date_column])
+
+    panel = None
+    if backend == 'dense':
+        panel = _daily_panel(df, key_columns, [column], date_column, dropna=False)
+        if panel.has_gaps:
+            raise ValueError(f"dense backend requires every day between the first and last day of {key_columns}")
+
     for _n in range(days):
         n = _n + 1
         col_name = col_name_format.format(day=n)
-        df[col_name] = df[key_columns + [column]].groupby(key_columns, dropna=False)[column].shift(n)
+        if panel is not None:
+            df[col_name] = panel.lag(n)[:, 0]
+        else:
+            df[col_name] = df[key_columns + [column]].groupby(key_columns, dropna=False)[column].shift(n)
 
     return df
 
 
-def calc_mean(df, columns, key_columns=['ad_type', 'ad_id'], prefix="ad_id", date_column="date"):
+def lag_rows(df, target_date, key_columns_list, days, date_column="date"):
+    """calc_lagでtarget_dateの行のラグを計算するのに必要な行のみを返す
+
+    calc_lagは行をdays行までずらすため、target_dateの行のラグは、キーごとにtarget_dateより前で
+    最新のdays日分の行から求まる。キー・日付ごとの平均が変わらないよう、日付単位で行を残す。
+    行の順序は変えないため、残した行で計算したtarget_dateの行のラグは全行で計算した値と同じとなる。
+    Args:
+        df (pd.DataFrame): 全期間のデータ
+        target_date (datetime): 対象日
+        key_columns_list (Iterable[List[str]]): calc_lagのキーの列のリスト
+        days (int): calc_lagの日数
+        date_column (str): 日付の列
+    Returns:
+        pd.DataFrame: target_dateの行と、ラグの計算に使う直前の行
+    """
+    keep = (df[date_column] == target_date).to_numpy()
+    is_history = (df[date_column] < target_date).to_numpy()
+    history = df.loc[is_history]
+    positions = np.flatnonzero(is_history)
+    for key_columns in key_columns_list:
+        rank = history.groupby(key_columns, dropna=False)[date_column].rank(method="dense", ascending=False)
+        keep[positions[rank.to_numpy() <= days]] = True
+
+    return df.loc[keep].copy()
+
+
+def calc_mean(df, columns, key_columns=['ad_type', 'ad_id'], prefix="ad_id", date_column="date", means=None):
+    """キー・日付ごとの列の平均を、{prefix}_{列名}の列として追加する
+
+    meansを指定した場合は、キー・日付ごとの平均として使う(rollup_meansの結果)。
+    """
     group_key = key_columns + [date_column]
-    sum_df = df[group_key + columns].groupby(group_key, dropna=False).mean()
+    if means is not None:
+        sum_df = means[group_key + columns]
+    else:
+        sum_df = df[group_key + columns].groupby(group_key, dropna=False).mean()
     sum_df = sum_df.rename(columns={column: f"{prefix}_{column}" for column in columns})
 
     return pd.merge(df, sum_df, how="left", on=key_columns + [date_column])
@@ -261,13 +636,97 @@ def mode(df: pd.DataFrame) -> pd.Series:
     return pd.Series(output, index=df.index)
 
 
-def ewm(grp_df, halflife, min_periods, agg_query_feature_cols, date_col="date"):
-    return grp_df.apply(
-        lambda x: x.ewm(
-            halflife=halflife,
-            times=x[date_col].values,
-            min_periods=min_periods
-        )[agg_query_feature_cols].mean())
+def segmented_ewm(values, times, segment_ids, halflives, min_periods=0):
+    """時刻で重み付けした指数加重平均を、全セグメント・複数の列・複数の半減期についてまとめて計算する
+
+    各セグメントについて pd.DataFrame.ewm(halflife=..., times=..., min_periods=...).mean() と同じ値となる。
+    各行の値は、同じセグメントの自身以前の欠損でない値を 0.5 ** (経過時間 / 半減期) で重み付けした平均で、
+    欠損でない値がmin_periods(1未満の場合は1)個未満の行はNaNとする。
+    重み付きの合計と重みの合計の漸化式 S_i = d_i * S_{i-1} + x_i (d_iは前の行からの減衰率。セグメントの先頭は0)を、
+    参照する範囲を倍々に広げる走査で解くため、Pythonのループは高々log2(セグメントの最大の行数)回となる。
+    Args:
+        values (np.ndarray): (行数, 列数)の値。欠損値はNaN
+        times (np.ndarray): 各行の時刻(datetime64)
+        segment_ids (np.ndarray): 各行のセグメント。同じセグメントの行は連続して並べる
+        halflives (List[Union[str, pd.Timedelta]]): 半減期
+        min_periods (int): 最小の観測数
+    Returns:
+        np.ndarray: (半減期の数, 行数, 列数)の指数加重平均
+    """
+    values = np.asarray(values, dtype=np.float64)
+    segment_ids = np.asarray(segment_ids)
+    n = len(values)
+
+    is_observation = ~np.isnan(values)
+    # 値の加重和と重みの和を並べて同時に走査する
+    state = np.concatenate([np.where(is_observation, values, 0.0), is_observation.astype(np.float64)], axis=1)
+    state = np.repeat(state[np.newaxis], len(halflives), axis=0)
+
+    is_start = np.ones(n, dtype=bool)
+    is_start[1:] = segment_ids[1:] != segment_ids[:-1]
+    elapsed = np.zeros(n)
+    elapsed[1:] = np.diff(np.asarray(times, dtype="datetime64[ns]").view(np.int64))
+    halflife_ns = np.array([pd.Timedelta(halflife).value for halflife in halflives], dtype=np.float64)
+    with np.errstate(over="ignore"):
+        decay = np.where(is_start, 0.0, np.power(0.5, elapsed / halflife_ns[:, np.newaxis]))
+
+    shift = 1
+    while shift < n and decay[:, shift:].any():
+        state[:, shift:] += decay[:, shift:, np.newaxis] * state[:, :-shift]
+        decay[:, shift:] = decay[:, shift:] * decay[:, :-shift]
+        shift *= 2
+
+    # セグメント内の欠損でない値の数
+    counts = np.cumsum(is_observation, axis=0)
+    start_positions = np.maximum.accumulate(np.where(is_start, np.arange(n), 0))
+    nobs = counts - counts[start_positions] + is_observation[start_positions]
+
+    num_columns = values.shape[1]
+    weighted_sum, weight_sum = state[:, :, :num_columns], state[:, :, num_columns:]
+    is_valid = (nobs >= max(min_periods, 1)) & (weight_sum > 0)
+    return np.divide(weighted_sum, weight_sum, out=np.full_like(weighted_sum, np.nan), where=is_valid)
+
+
+def ewm(grp_df, halflife, min_periods, agg_query_feature_cols, date_col="date", backend='long'):
+    """グループごとの時刻で重み付けした指数加重平均
+
+    grp_df.apply(lambda x: x.ewm(halflife=halflife, times=x[date_col].values, min_periods=min_periods)
+    [agg_query_feature_cols].mean()) と同じ結果(indexを含む)を、segmented_ewmで全グループまとめて計算する。
+    grp_dfは列名(またはそのリスト)でgroupbyしたものとする。
+    backendがdenseの場合はDailyPanel.ewmで計算する。denseはキーと日付ごとに1行の日次データのみで、
+    日付に欠けがあってもlongと同じ値となる。
+    """
+    df = grp_df.obj
+    key_columns = grp_df.keys if isinstance(grp_df.keys, list) else [grp_df.keys]
+    codes = grp_df.ngroup()
+    # キーが欠損値の行(dropna=True)はapplyの結果に含まれない
+    positions = np.flatnonzero(codes.notna().to_numpy())
+    codes = codes.to_numpy()[positions].astype(np.int64)
+    order = positions[np.argsort(codes, kind="stable")]
+
+    if backend == 'dense':
+        panel = _daily_panel(df, key_columns, agg_query_feature_cols, date_col, dropna=grp_df.dropna)
+        values = panel.ewm([halflife], min_periods)[0][order]
+    else:
+        values = segmented_ewm(
+            df[agg_query_feature_cols].to_numpy(dtype=np.float64)[order],
+            df[date_col].to_numpy()[order],
+            np.sort(codes, kind="stable"),
+            [halflife],
+            min_periods,
+        )[0]
+
+    if grp_df.group_keys:
+        # グループの順に、キーの列の値と元のindexを持つ
+        keys = df[key_columns].take(order)
+        index = pd.MultiIndex.from_arrays([keys[column] for column in key_columns] + [df.index.take(order)])
+    else:
+        # applyと同じく元の行の順に戻す
+        back = np.argsort(order, kind="stable")
+        values = values[back]
+        index = df.index.take(order[back])
+
+    return pd.DataFrame(values, index=index, columns=agg_query_feature_cols)
 
 
 def calc_unit_weekly_cpc_for_cap(df, today):
@@ -0,0 +1,217 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+_DAY_NS = pd.Timedelta("1D").value
+
+
+def window_days(window) -> Optional[int]:
+    """窓の幅の日数。1日単位でない場合はNoneを返す"""
+    window_ns = pd.Timedelta(window).value
+    if window_ns <= 0 or window_ns % _DAY_NS != 0:
+        return None
+    return window_ns // _DAY_NS
+
+
+def factorize(values, dropna: bool = True):
+    """pd.factorizeと同じく値を整数のコードにする。dropnaがFalseの場合は欠損値も最後のキーとする
+
+    pandas<1.5のpd.factorizeにはuse_na_sentinelがないため、欠損値のコード(-1)をここで置き換える。
+    Args:
+        values (array-like): 値
+        dropna (bool): 欠損値のコードを-1とする
+    Returns:
+        Tuple[np.ndarray, pd.Index]: コードと、コードの順の値
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Index(uniques)
+    if not dropna and (codes < 0).any():
+        uniques = uniques.insert(len(uniques), np.nan)
+        codes = np.where(codes < 0, len(uniques) - 1, codes)
+    return codes, uniques
+
+
+class DailyPanel:
+    """キー×日付ごとに1行の日次データを、(キーの数, 日数, 列数)の密な配列にしたもの
+
+    ラグ・時間窓の集計・指数加重平均を日付の軸方向のスライスの演算で計算し、
+    scatterで元の行に戻す。元の行が存在しない日付はNaNとする。
+    キーと日付の組が重複する場合や、日付が1日単位でない場合は配列にできない。
+    """
+
+    def __init__(self, values: np.ndarray, entity_codes: np.ndarray, day_codes: np.ndarray):
+        """
+        Args:
+            values (np.ndarray): (キーの数, 日数, 列数)の値
+            entity_codes (np.ndarray): 元の各行のキーの位置。キーが欠損値で除外した行は-1
+            day_codes (np.ndarray): 元の各行の日付の位置
+        """
+        self.values = values
+        self.entity_codes = entity_codes
+        self.day_codes = day_codes
+
+        self._rows = np.flatnonzero(entity_codes >= 0)
+        self._present = np.zeros(values.shape[:2], dtype=bool)
+        self._present[entity_codes[self._rows], day_codes[self._rows]] = True
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        key_columns: List[str],
+        columns: List[str],
+        date_column: str = "date",
+        dropna: bool = True,
+        max_density_ratio: float = 4.0,
+    ) -> Optional["DailyPanel"]:
+        """データフレームから作成する。配列にできない場合はNoneを返す
+
+        Args:
+            df (pd.DataFrame): キー×日付ごとに1行のデータ
+            key_columns (List[str]): キーの列
+            columns (List[str]): 配列にする列
+            date_column (str): 日付の列。時刻が0時のdatetime64
+            dropna (bool): キーが欠損値の行を除外する(結果はNaNとする)。Falseの場合は欠損値も1つのキーとする
+            max_density_ratio (float): 配列の要素数(キーの数×日数)が行数のこの倍数を超える場合は作成しない
+        Returns:
+            Optional[DailyPanel]: 作成したDailyPanel
+        """
+        if not pd.api.types.is_datetime64_dtype(df[date_column].dtype):
+            return None
+
+        times = df[date_column].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        if len(times) == 0 or (times % _DAY_NS != 0).any():
+            return None
+
+        if len(key_columns) == 1:
+            entity_codes, entities = factorize(df[key_columns[0]], dropna=dropna)
+            num_entities = len(entities)
+        else:
+            entity_codes = df.groupby(key_columns, dropna=dropna, sort=False).ngroup()
+            entity_codes = entity_codes.fillna(-1).to_numpy(dtype=np.int64)
+            num_entities = int(entity_codes.max()) + 1
+        entity_codes = np.asarray(entity_codes, dtype=np.int64)
+
+        rows = entity_codes >= 0
+        if not rows.any():
+            return None
+        start = times[rows].min()
+        day_codes = (times - start) // _DAY_NS
+        num_days = int(day_codes[rows].max()) + 1
+        if num_entities * num_days > max_density_ratio * len(df) + num_days:
+            return None
+
+        cells = entity_codes[rows] * num_days + day_codes[rows]
+        if np.bincount(cells, minlength=num_entities * num_days).max() > 1:
+            return None
+
+        values = np.full((num_entities, num_days, len(columns)), np.nan)
+        values[entity_codes[rows], day_codes[rows]] = df[columns].to_numpy(dtype=np.float64)[rows]
+        return cls(values, entity_codes, day_codes)
+
+    @property
+    def has_gaps(self) -> bool:
+        """キーの最初と最後の日付の間に、行が存在しない日付があるか"""
+        present = self._present
+        num_days = present.shape[1]
+        first = present.argmax(axis=1)
+        last = num_days - 1 - present[:, ::-1].argmax(axis=1)
+        return bool((present.sum(axis=1) != last - first + 1).any())
+
+    def scatter(self, values: np.ndarray) -> np.ndarray:
+        """(..., キーの数, 日数, 列数)の配列を、元の行に揃えた(..., 行数, 列数)の配列にする
+
+        Args:
+            values (np.ndarray): 配列の演算の結果
+        Returns:
+            np.ndarray: 元の各行の値。キーが欠損値で除外した行はNaN
+        """
+        result = np.full(values.shape[:-3] + (len(self.entity_codes), values.shape[-1]), np.nan)
+        result[..., self._rows, :] = values[..., self.entity_codes[self._rows], self.day_codes[self._rows], :]
+        return result
+
+    def lag(self, days: int) -> np.ndarray:
+        """days日前の値
+
+        キーの日付に欠けがなければ、groupby(key_columns).shift(days)と同じ値となる。
+        Args:
+            days (int): 日数
+        Returns:
+            np.ndarray: 元の各行の(行数, 列数)の値
+        """
+        shifted = np.full_like(self.values, np.nan)
+        if days < self.values.shape[1]:
+            shifted[:, days:] = self.values[:, :self.values.shape[1] - days]
+        return self.scatter(shifted)
+
+    def rolling(self, windows: List[str], method: str = "mean", min_periods: int = 1) -> np.ndarray:
+        """時間窓の集計。各行の窓は(自身の日付 - window, 自身の日付]とする
+
+        rolling_window_sumsと同じく窓に入る日を1日ずつずらしながら足し合わせるため、
+        grouped_rollingと同じ順に足し合わせた同じ値となる。
+        Args:
+            windows (List[str]): 窓の幅。1日単位
+            method (str): sum, mean
+            min_periods (int): 窓内の欠損でない値がこの数未満の行はNaNとする
+        Returns:
+            np.ndarray: 元の各行の(窓の数, 行数, 列数)の値
+        """
+        num_days = self.values.shape[1]
+        is_observation = ~np.isnan(self.values)
+        values = np.where(is_observation, self.values, 0.0)
+        observations = is_observation.astype(np.float64)
+        if is_observation.all():
+            # 欠損値がなければ値の数は全ての列で同じため、1列分のみ数える
+            observations = observations[:, :, :1]
+
+        days = [window_days(window) for window in windows]
+        if any(day is None for day in days):
+            raise ValueError(f"windows must be multiples of 1 day: {windows}")
+
+        # 短い窓から順に、窓の日数分ずらし終えた時点の合計を記録する
+        sums = np.zeros_like(values)
+        counts = np.zeros_like(observations)
+        results = [None] * len(windows)
+        offset = 0
+        for i in np.argsort(days, kind="stable"):
+            for offset in range(offset, min(days[i], num_days)):
+                sums[:, offset:] += values[:, :num_days - offset]
+                counts[:, offset:] += observations[:, :num_days - offset]
+            offset = min(days[i], num_days)
+
+            if method == "mean":
+                window_sums = np.divide(sums, counts, out=np.full_like(sums, np.nan), where=counts > 0)
+            else:
+                window_sums = sums.copy()
+            results[i] = np.where(counts >= min_periods, window_sums, np.nan)
+
+        return self.scatter(np.stack(results))
+
+    def ewm(self, halflives: List[str], min_periods: int = 0) -> np.ndarray:
+        """時刻で重み付けした指数加重平均。segmented_ewmと同じ値となる
+
+        1日あたりの減衰率が一定のため、漸化式 S_d = a * S_{d-1} + x_d を参照する日数を倍々に広げる走査で解く。
+        Args:
+            halflives (List[str]): 半減期
+            min_periods (int): 最小の観測数
+        Returns:
+            np.ndarray: 元の各行の(半減期の数, 行数, 列数)の値
+        """
+        num_days, num_columns = self.values.shape[1:]
+        is_observation = ~np.isnan(self.values)
+        state = np.concatenate([np.where(is_observation, self.values, 0.0), is_observation.astype(np.float64)], axis=2)
+        state = np.repeat(state[np.newaxis], len(halflives), axis=0)
+
+        decay = np.array([0.5 ** (_DAY_NS / pd.Timedelta(halflife).value) for halflife in halflives])
+        shift = 1
+        while shift < num_days:
+            state[:, :, shift:] += decay[:, np.newaxis, np.newaxis, np.newaxis] * state[:, :, :-shift]
+            decay = decay * decay
+            shift *= 2
+
+        nobs = np.cumsum(is_observation, axis=1)
+        weighted_sum, weight_sum = state[..., :num_columns], state[..., num_columns:]
+        is_valid = (nobs >= max(min_periods, 1)) & (weight_sum > 0)
+        return self.scatter(
+            np.divide(weighted_sum, weight_sum, out=np.full_like(weighted_sum, np.nan), where=is_valid))
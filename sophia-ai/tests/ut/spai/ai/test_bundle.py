@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from spai.ai.boosting import LGBModel
+from spai.ai.bundle import ModelBundle
+from spai.ai.preprocess import LabelEncoder
+
+
+@pytest.fixture
+def X():
+    np.random.seed(42)
+    X = pd.DataFrame(np.random.randn(100, 3), columns=["a", "b", "c"])
+    X["a"] = np.random.randint(0, 10, 100)
+    return X
+
+
+def test_bundle_io(X):
+    model = LGBModel({"cat_features": [0]})
+    model.fit(X, pd.Series(np.random.randn(100)))
+    le = LabelEncoder().fit(["x", "y"])
+
+    bundle = ModelBundle({"kpi": "cpc", "feature_columns": ["a", "b", "c"]})
+    bundle.add_label_encoder("match_type", le.to_bytes())
+    bundle.set_model(model.to_bytes())
+
+    bundle_reconst = ModelBundle.from_bytes(bundle.to_bytes())
+    assert bundle_reconst.manifest["kpi"] == "cpc"
+    assert bundle_reconst.manifest["feature_columns"] == ["a", "b", "c"]
+    assert bundle_reconst.manifest["label_encoders"] == ["match_type"]
+    assert bundle_reconst.label_encoder_names == ["match_type"]
+
+    model_reconst = bundle_reconst.load_model(LGBModel)
+    np.testing.assert_array_equal(model.predict(X), model_reconst.predict(X))
+    # デシリアライズした結果は使い回す
+    assert bundle_reconst.load_model(LGBModel) is model_reconst
+
+    le_reconst = bundle_reconst.load_label_encoder("match_type")
+    np.testing.assert_array_equal(le.transform(["x", "z"]), le_reconst.transform(["x", "z"]))
+    with pytest.raises(KeyError):
+        bundle_reconst.load_label_encoder("not_exists")
+
+
+def test_bundle_errors():
+    with pytest.raises(ValueError):
+        ModelBundle().to_bytes()
+    with pytest.raises(ValueError):
+        ModelBundle.from_bytes(b"not a bundle")
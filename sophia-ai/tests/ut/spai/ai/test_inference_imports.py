@@ -0,0 +1,36 @@
+import sys
+import subprocess
+
+import pytest
+
+
+@pytest.mark.parametrize("module", [
+    "spai.ai.inference",
+    "spai.ai.boosting",
+    "spai.service.cpc.estimator",
+    "spai.service.cvr.estimator",
+    "spai.service.spa.estimator",
+])
+def test_inference_imports_without_training_dependencies(module):
+    # 既にimport済みのモジュールの影響を受けないよう、新しいプロセスで確認する
+    script = (
+        "import sys\n"
+        f"import {module}\n"
+        "print(','.join(m for m in ['optuna', 'catboost', 'category_encoders'] if m in sys.modules))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", script], check=True, capture_output=True, text=True,
+    ).stdout
+
+    assert out.strip() == ""
+
+
+def test_lazy_attributes():
+    from spai.ai import boosting
+    from spai.ai.boosting.catboost_wrap import CatBoostModel
+    from spai.ai.boosting.tune_params import get_tuned_params
+
+    assert boosting.CatBoostModel is CatBoostModel
+    assert boosting.get_tuned_params is get_tuned_params
+    with pytest.raises(AttributeError):
+        boosting.not_exists
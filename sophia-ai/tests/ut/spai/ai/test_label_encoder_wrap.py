@@ -1,7 +1,10 @@
 import numpy as np
+import pandas as pd
 import pytest
+from sklearn import preprocessing
 
 from spai.ai.preprocess import LabelEncoder
+from spai.ai.utils import serialize
 
 
 @pytest.fixture
@@ -27,3 +30,37 @@ def test_io_bytes(model, X):
     label = model.transform(X)
     label_reconst = model_reconst.transform(X)
     np.testing.assert_array_equal(label, label_reconst)
+
+
+def _sklearn_transform(le, data_list):
+    # 以前の実装(sklearnのLabelEncoderで、学習時にない値をUnknownに置換してからtransform)
+    data_list = [str(x) for x in data_list]
+    data_list = [x if x in le.classes_ else "Unknown" for x in data_list]
+    return le.transform(data_list)
+
+
+@pytest.mark.parametrize("fit_data, transform_data", [
+    (np.array(["a", "b", "c"], dtype=object), np.array(["a", "z", None, np.nan, "b"], dtype=object)),
+    (np.array([1.0, np.nan, 2.5]), np.array([np.nan, 2.5, 3.0])),
+    (pd.array(["x", None, "y"], dtype="string"), pd.array(["x", None, "q"], dtype="string")),
+    ([1, "1", None], ["1", None, "None", 2]),
+    ([1, 2, 3], np.array([1, 1.0, 2, True, 4], dtype=object)),
+    (np.array([0.0, 1.0]), np.array([-0.0, 0.0, 1.0])),
+    (pd.Series(["a", "b"], index=[5, 7]), pd.Series(["b", "c", None], index=[9, 3, 1])),
+    ([], ["a"]),
+])
+def test_compatible_with_sklearn(fit_data, transform_data):
+    sklearn_le = preprocessing.LabelEncoder().fit([str(x) for x in fit_data] + ["Unknown"])
+    expected = _sklearn_transform(sklearn_le, transform_data)
+
+    model = LabelEncoder().fit(fit_data)
+    np.testing.assert_array_equal(model.classes_, sklearn_le.classes_)
+    np.testing.assert_array_equal(model.transform(transform_data), expected)
+
+    # sklearnのLabelEncoderを保存した以前の形式も読み込める
+    legacy = LabelEncoder.from_bytes(serialize(sklearn_le))
+    np.testing.assert_array_equal(legacy.transform(transform_data), expected)
+
+
+def test_transform_empty(model):
+    assert len(model.transform([])) == 0
@@ -1,7 +1,11 @@
+import pickle
+import tempfile
+
 import numpy as np
 import pandas as pd
 import pytest
-from spai.ai.boosting import LGBModel
+from spai.ai.boosting import LGBModel, Log1pModel
+from spai.ai.utils import pack_sections, serialize, unpack_sections
 
 
 @pytest.mark.parametrize("has_weight", [False, True])
@@ -87,3 +91,90 @@ def test_io_bytes(model, X):
     pred_reconst = model_reconst.predict(X)
 
     np.testing.assert_array_equal(pred, pred_reconst)
+
+
+def test_io_bytes_encoder(model, X):
+    model_bin = model.to_bytes()
+    _, sections = unpack_sections(model_bin, b"SPAILGB\x00")
+    # CatBoostEncoderは保存せず、LookupEncoderで変換する
+    assert "cbe" not in sections
+
+    model_reconst = LGBModel.from_bytes(model_bin)
+    assert model_reconst._cbe is None
+    np.testing.assert_array_equal(
+        model_reconst.predict(X), model._model.predict(model._cbe.transform(X)))
+
+
+def test_io_cbe_bytes(model, X):
+    # CatBoostEncoderをpickleで保存していた以前のto_bytesの形式
+    model_bin = pack_sections(b"SPAILGB\x00", 1, {
+        "model": model._model.model_to_string().encode(),
+        "params": pickle.dumps(model.params),
+        "cbe": pickle.dumps(model._cbe),
+    })
+    model_reconst = LGBModel.from_bytes(model_bin)
+
+    assert model_reconst._encoder is not None
+    np.testing.assert_array_equal(model.predict(X), model_reconst.predict(X))
+
+
+def _legacy_to_bytes(model):
+    # joblibで圧縮していた以前のto_bytesの形式
+    with tempfile.NamedTemporaryFile() as tf:
+        model._model.save_model(tf.name)
+        with open(tf.name, "rb") as f:
+            model_bin = f.read()
+
+    return serialize({"model": model_bin, "cbe": model._cbe, "params": model.params})
+
+
+def test_io_legacy_bytes(model, X):
+    model_reconst = LGBModel.from_bytes(_legacy_to_bytes(model))
+
+    assert model_reconst.params == model.params
+    np.testing.assert_array_equal(model.predict(X), model_reconst.predict(X))
+
+
+def test_io_bytes_format(X):
+    np.random.seed(42)
+    model = Log1pModel()
+    model.fit(X, pd.Series(np.random.rand(100)))
+
+    model_bin = model.to_bytes()
+    assert model_bin.startswith(b"SPAILGB")
+
+    model_reconst = Log1pModel.from_bytes(model_bin)
+    assert isinstance(model_reconst, Log1pModel)
+    assert model_reconst._cbe is None
+    np.testing.assert_array_equal(model.predict(X), model_reconst.predict(X))
+
+    # 未対応のバージョンはエラーにする
+    with pytest.raises(ValueError):
+        Log1pModel.from_bytes(model_bin[:8] + b"\xff\xff" + model_bin[10:])
+
+
+@pytest.mark.parametrize("dtypes", [
+    {},
+    {"col_0": "float32"},
+    {"col_0": "int32", "col_1": "float32"},
+    {"col_0": "bool"},
+])
+def test_predict_matrix(X, dtypes):
+    np.random.seed(42)
+    X = X.astype(dtypes)
+    X.iloc[:10, 1] = np.nan
+    model = LGBModel()
+    model.fit(X, pd.Series(np.random.randn(100)))
+
+    # DataFrameをBoosterに渡した場合と同じ予測値になる
+    np.testing.assert_array_equal(model.predict(X), model._model.predict(X))
+    np.testing.assert_array_equal(model.predict(X[:1]), model._model.predict(X[:1]))
+
+
+def test_predict_pandas_categorical(X):
+    np.random.seed(42)
+    X = X.astype({"col_0": "category"})
+    model = LGBModel()
+    model.fit(X, pd.Series(np.random.randn(100)))
+
+    np.testing.assert_array_equal(model.predict(X), model._model.predict(X))
@@ -0,0 +1,71 @@
+import category_encoders as ce
+import numpy as np
+import pandas as pd
+import pytest
+
+from spai.ai.preprocess import LookupEncoder
+
+
+@pytest.fixture
+def cbe():
+    np.random.seed(42)
+    X = pd.DataFrame({
+        "col_0": np.random.randint(low=0, high=10, size=100),
+        "col_1": np.random.randint(low=0, high=100, size=100).astype(float),
+        "col_2": np.random.randn(100),
+    })
+    X.iloc[:5, 1] = np.nan
+    y = pd.Series(np.random.randn(100))
+
+    cbe = ce.CatBoostEncoder(cols=["col_0", "col_1"])
+    cbe.fit(X, y)
+    return cbe
+
+
+@pytest.fixture
+def X():
+    np.random.seed(100)
+    # 学習時にない値(10以上、負の値、小数)と欠損値を含む
+    X = pd.DataFrame({
+        "col_0": np.random.randint(low=-2, high=12, size=100),
+        "col_1": np.random.randint(low=0, high=120, size=100).astype(float),
+        "col_2": np.random.randn(100),
+    })
+    X.iloc[:10, 1] = np.nan
+    X.iloc[10:15, 1] = 0.5
+    return X
+
+
+def test_transform(cbe, X):
+    encoder = LookupEncoder.from_catboost_encoder(cbe)
+    X_orig = X.copy()
+
+    pd.testing.assert_frame_equal(encoder.transform(X), cbe.transform(X))
+    pd.testing.assert_frame_equal(encoder.transform(X[:1]), cbe.transform(X[:1]))
+    # 入力は変更しない
+    pd.testing.assert_frame_equal(X, X_orig)
+
+
+def test_transform_unseen_nan(cbe, X):
+    # 学習時に欠損値がない列の欠損値は事前分布の値になる
+    X["col_0"] = X["col_0"].astype(float)
+    X.iloc[:3, 0] = np.nan
+    encoder = LookupEncoder.from_catboost_encoder(cbe)
+
+    result = encoder.transform(X)
+    pd.testing.assert_frame_equal(result, cbe.transform(X))
+    assert (result["col_0"][:3] == encoder.prior).all()
+
+
+def test_io_bytes(cbe, X):
+    encoder = LookupEncoder.from_catboost_encoder(cbe)
+    encoder_reconst = LookupEncoder.from_bytes(encoder.to_bytes())
+
+    pd.testing.assert_frame_equal(encoder.transform(X), encoder_reconst.transform(X))
+
+
+def test_not_numeric():
+    X = pd.DataFrame({"col_0": ["a", "b", "a", "c"]})
+    cbe = ce.CatBoostEncoder(cols=["col_0"]).fit(X, pd.Series([1.0, 0.0, 1.0, 0.0]))
+
+    assert LookupEncoder.from_catboost_encoder(cbe) is None
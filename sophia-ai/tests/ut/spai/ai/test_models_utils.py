@@ -1,5 +1,5 @@
 import pytest
-from spai.ai.utils import serialize, deserialize
+from spai.ai.utils import serialize, deserialize, pack_sections, unpack_sections, has_magic
 
 
 @pytest.mark.parametrize("obj", [1, (3, 5), {"a": 1}])
@@ -7,3 +7,17 @@ def test_serialization(obj):
     binary = serialize(obj)
     recon_obj = deserialize(binary)
     assert obj == recon_obj
+
+
+def test_pack_sections():
+    binary = pack_sections(b"MAGIC", 3, {"a": b"abc", "empty": b"", "b": b"\x00\x01"})
+
+    assert has_magic(binary, b"MAGIC")
+    assert not has_magic(binary, b"OTHER")
+
+    version, sections = unpack_sections(binary, b"MAGIC")
+    assert version == 3
+    assert {name: bytes(data) for name, data in sections.items()} == {"a": b"abc", "empty": b"", "b": b"\x00\x01"}
+
+    with pytest.raises(ValueError):
+        unpack_sections(binary, b"OTHER")
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from spai.ai.boosting import LGBModel
+from spai.ai.prediction_cache import cached_predict, prediction_cache_key
+
+
+class DictCache:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def put(self, key, preds):
+        self.values[key] = preds
+
+
+@pytest.fixture
+def X():
+    np.random.seed(42)
+    return pd.DataFrame(np.random.randn(100, 5), columns=[f"col_{i}" for i in range(5)])
+
+
+@pytest.fixture
+def model(X):
+    np.random.seed(42)
+    model = LGBModel({"num_boost_round": 10})
+    model.fit(X, pd.Series(np.random.randn(100)))
+    return model
+
+
+def test_prediction_cache_key(model, X):
+    key = prediction_cache_key(model, X)
+    assert key == prediction_cache_key(model, X.copy())
+    # 読み込み直したモデルのバイナリが同じであれば、to_bytesとfrom_bytesで同じバージョンとなる
+    assert LGBModel.from_bytes(model.to_bytes()).fingerprint == model.fingerprint
+
+    X_changed = X.copy()
+    X_changed.iloc[0, 0] += 1
+    assert key != prediction_cache_key(model, X_changed)
+    assert key != prediction_cache_key(model, X.astype("float32"))
+    assert key != prediction_cache_key(model, X.iloc[::-1])
+
+    other = LGBModel({"num_boost_round": 5})
+    other.fit(X, pd.Series(np.random.randn(100)))
+    assert key != prediction_cache_key(other, X)
+
+
+def test_cached_predict(model, X, mocker):
+    cache = DictCache()
+    spy = mocker.spy(model, "predict")
+
+    preds = cached_predict(model, X, cache)
+    np.testing.assert_array_equal(cached_predict(model, X, cache), preds)
+    assert spy.call_count == 1
+
+    # キャッシュがない場合は毎回予測する
+    np.testing.assert_array_equal(cached_predict(model, X), preds)
+    assert spy.call_count == 2
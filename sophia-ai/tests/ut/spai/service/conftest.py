@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from spai.service.cpc.preprocess import agg_feature_cols
+from spai.service.cvr.preprocess import agg_query_feature_cols
+
+
+@pytest.fixture
+def df_history():
+    """複数の広告・キャンペーンで、日付の欠けや欠損値を含む40日分のデータ"""
+    rng = np.random.default_rng(0)
+    dfs = []
+    for ad_id, campaign_id in [(1, 1), (2, 1), (3, 2)]:
+        dates = pd.date_range("2021-01-01", periods=40)
+        dates = dates[rng.random(len(dates)) > 0.2].append(pd.DatetimeIndex(["2021-02-09"]))
+        df = pd.DataFrame({"date": dates.unique()})
+        df["ad_id"] = ad_id
+        df["campaign_id"] = campaign_id
+        dfs.append(df)
+
+    df = pd.concat(dfs, ignore_index=True)
+    df['unit_id'] = "1_1"
+    df["advertising_account_id"] = 1
+    df["portfolio_id"] = 1
+    df["ad_group_id"] = 1
+    df["ad_type"] = "keyword"
+    df["bidding_price"] = rng.integers(50, 150, len(df)).astype(float)
+    df[agg_feature_cols] = rng.integers(0, 10, (len(df), len(agg_feature_cols))).astype(float)
+    df.loc[rng.random(len(df)) < 0.1, "clicks"] = np.nan
+    df["match_type"] = "match_type"
+    df["campaign_type"] = "campaign_type"
+    df["targeting_type"] = "targeting_type"
+    df["budget"] = 100
+    df["budget_type"] = "budget_type"
+    df["account_type"] = "account_type"
+    df["optimization_purpose"] = 0
+    df["uid"] = 1
+    return df
+
+
+@pytest.fixture
+def df_history_query(df_history):
+    """df_historyの各行に対応するクエリのデータ"""
+    df_query = df_history[["unit_id", "advertising_account_id", "portfolio_id", "ad_group_id",
+                           "campaign_id", "ad_type", "ad_id", "date", "uid"]].copy()
+    df_query["query"] = "query"
+    df_query[agg_query_feature_cols] = np.arange(len(df_query) * 2).reshape(-1, 2) % 5
+    df_query["index"] = df_query.index
+    return df_query
+
+
+@pytest.fixture
+def df_history_placement():
+    """df_historyと同じ40日分の、キャンペーンの掲載枠ごとのデータ"""
+    dfs = []
+    for predicate in ["placementProductPage", "placementTop"]:
+        df = pd.DataFrame({"date": pd.date_range("2021-01-01", periods=40)})
+        df["campaign_id"] = 1
+        df["clicks"] = 2
+        df["conversions"] = 1
+        df["costs"] = 3
+        df["impressions"] = 4
+        df["predicate"] = predicate
+        dfs.append(df)
+
+    return pd.concat(dfs, ignore_index=True)
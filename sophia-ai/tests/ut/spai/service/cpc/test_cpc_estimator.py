@@ -118,5 +118,21 @@ def test_estimator(df, df_placement):
     for col in OUTPUT_COLUMNS:
         assert col in result_df.columns
 
+    # 予測値のキャッシュがある場合は、2回目の予測でキャッシュを参照する
+    # predictは入力のカテゴリ列を変更するため、同じ入力のコピーを渡す
+    prepr_df = preprocessor.preprocess(df, df_placement, is_train=False)
+    result_df = estimator.predict(prepr_df.copy(), today)
+    cache = {}
+    cache_estimator = CPCEstimator(
+        model_reader=read_model(binary_dir),
+        is_tune=False,
+        prediction_cache=type("DictCache", (), {
+            "get": lambda self, key: cache.get(key),
+            "put": lambda self, key, preds: cache.__setitem__(key, preds),
+        })())
+    pd.testing.assert_frame_equal(cache_estimator.predict(prepr_df.copy(), today), result_df)
+    pd.testing.assert_frame_equal(cache_estimator.predict(prepr_df.copy(), today), result_df)
+    assert len(cache) == 1
+
     # binファイルを削除
     shutil.rmtree(binary_dir)
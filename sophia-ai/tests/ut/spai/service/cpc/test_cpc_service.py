@@ -5,6 +5,7 @@ import datetime
 import numpy as np
 import pandas as pd
 
+from spai.service.features import build_features
 from spai.service.cpc.service import CPCPredictionService
 from spai.service.cpc.preprocess import CPCPreprocessor, agg_feature_cols, get_dtypes
 from spai.service.cpc.estimator import CPCEstimator
@@ -115,6 +116,20 @@ def test_service(df, df_placement):
 
     result = service.predict(df.copy(), df_placement.copy(), today)
 
+    # 共通の特徴量から予測した場合も同じ結果になる
+    df_query = pd.DataFrame(columns=["query", "campaign_id", "ad_type", "ad_id", "portfolio_id", "date",
+                                     "query_clicks", "query_conversions"])
+    df_features = build_features(df.copy(), df_query, today - datetime.timedelta(days=1))
+    pd.testing.assert_frame_equal(service.predict_features(df_features, df_placement.copy(), today), result)
+
+    # 複数unitをまとめて予測した場合も、unitごとに予測した場合と同じ結果になる
+    df_features_other = df_features.assign(advertising_account_id=2, portfolio_id=pd.NA)
+    results = service.predict_many([df_features, df_features_other], df_placement.copy(), today)
+    assert list(results) == [(1, 1), (2, None)]
+    pd.testing.assert_frame_equal(results[(1, 1)], result.reset_index(drop=True))
+    expected_other = service.predict_features(df_features_other, df_placement.copy(), today)
+    pd.testing.assert_frame_equal(results[(2, None)], expected_other.reset_index(drop=True))
+
     # binファイルを削除
     shutil.rmtree(binary_dir)
 
@@ -0,0 +1,72 @@
+import os
+import shutil
+import pandas as pd
+import pytest
+
+from spai.service.features import build_features, split_by_unit, unit_keys
+from spai.service.cpc.preprocess import CPCPreprocessor
+from spai.service.cvr.preprocess import CVRPreprocessor
+from spai.service.spa.preprocess import SPAPreprocessor
+
+
+def read_label_encoder(dir):
+    def func(col):
+        path = dir + f'/{col}.bin'
+        with open(path, mode='rb') as f:
+            return f.read()
+
+    return func
+
+
+def write_label_encoder(dir):
+    def func(binary, col):
+        path = dir + f'/{col}.bin'
+        with open(path, mode='wb') as f:
+            return f.write(binary)
+
+    return func
+
+
+@pytest.mark.parametrize("preprocessor_class", [CPCPreprocessor, CVRPreprocessor, SPAPreprocessor])
+def test_build_features(df_history, df_history_query, df_history_placement, preprocessor_class):
+    label_dir = os.path.dirname(__file__) + f'/tmp_{preprocessor_class.__name__}'
+    os.makedirs(label_dir, exist_ok=True)
+    preprocessor = preprocessor_class(
+        label_encoder_writer=write_label_encoder(label_dir),
+        label_encoder_reader=read_label_encoder(label_dir),
+    )
+    other_input = df_history_placement if preprocessor_class is CPCPreprocessor else df_history_query
+    target_date = pd.Timestamp("2021-02-09")
+
+    preprocessor.preprocess(df_history.copy(), other_input.copy(), is_train=True)
+    expected = preprocessor.preprocess(df_history.copy(), other_input.copy(), is_train=False, target_date=target_date)
+
+    df_features = build_features(df_history.copy(), df_history_query.copy(), target_date)
+    if preprocessor_class is CPCPreprocessor:
+        result = preprocessor.preprocess_features(df_features, df_history_placement.copy())
+    else:
+        result = preprocessor.preprocess_features(df_features)
+
+    # 特徴量は他のモデルと共有するため、変更されない
+    assert "weight" not in df_features.columns
+    pd.testing.assert_frame_equal(result, expected)
+
+    # binファイルを削除
+    shutil.rmtree(label_dir)
+
+
+def test_split_by_unit():
+    df = pd.DataFrame({
+        "advertising_account_id": [1, 2, 1, 2],
+        "portfolio_id": pd.array([1, None, 1, 3], dtype="Int64"),
+        "value": [0, 1, 2, 3],
+    })
+
+    assert unit_keys(df) == [(1, 1), (2, None), (2, 3)]
+
+    result = split_by_unit(df, [(3, None)])
+    assert list(result) == [(1, 1), (2, None), (2, 3), (3, None)]
+    assert result[(1, 1)]["value"].tolist() == [0, 2]
+    assert result[(2, None)]["value"].tolist() == [1]
+    assert len(result[(3, None)]) == 0
+    assert list(result[(3, None)].columns) == list(df.columns)
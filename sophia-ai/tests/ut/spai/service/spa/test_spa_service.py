@@ -5,6 +5,7 @@ import datetime
 import numpy as np
 import pandas as pd
 
+from spai.service.features import build_features
 from spai.service.spa.service import SPAPredictionService
 from spai.service.spa.preprocess import SPAPreprocessor, agg_feature_cols, agg_query_feature_cols, get_dtypes
 from spai.service.spa.estimator import SPAEstimator
@@ -113,6 +114,19 @@ def test_service(df, df_query):
 
     result = service.predict(df.copy(), df_query.copy(), today)
 
+    # 共通の特徴量から予測した場合も同じ結果になる
+    # CPCの入力も必要となる
+    df_features = build_features(df.assign(bidding_price=100.0), df_query.copy(), today - datetime.timedelta(days=1))
+    pd.testing.assert_frame_equal(service.predict_features(df_features, today), result)
+
+    # 複数unitをまとめて予測した場合も、unitごとに予測した場合と同じ結果になる
+    df_features_other = df_features.assign(advertising_account_id=2, portfolio_id=pd.NA)
+    results = service.predict_many([df_features, df_features_other], today)
+    assert list(results) == [(1, 1), (2, None)]
+    pd.testing.assert_frame_equal(results[(1, 1)], result.reset_index(drop=True))
+    expected_other = service.predict_features(df_features_other, today)
+    pd.testing.assert_frame_equal(results[(2, None)], expected_other.reset_index(drop=True))
+
     # binファイルを削除
     shutil.rmtree(binary_dir)
 
@@ -0,0 +1,50 @@
+import os
+import shutil
+import pandas as pd
+import pytest
+
+from spai.service.cpc.preprocess import CPCPreprocessor
+from spai.service.cvr.preprocess import CVRPreprocessor
+from spai.service.spa.preprocess import SPAPreprocessor
+
+
+def read_label_encoder(dir):
+    def func(col):
+        path = dir + f'/{col}.bin'
+        with open(path, mode='rb') as f:
+            return f.read()
+
+    return func
+
+
+def write_label_encoder(dir):
+    def func(binary, col):
+        path = dir + f'/{col}.bin'
+        with open(path, mode='wb') as f:
+            return f.write(binary)
+
+    return func
+
+
+@pytest.mark.parametrize("preprocessor_class", [CPCPreprocessor, CVRPreprocessor, SPAPreprocessor])
+def test_preprocess_target_date(df_history, df_history_query, df_history_placement, preprocessor_class):
+    # target_dateを指定した結果は、全期間の結果のtarget_dateの行と同じとなる
+    label_dir = os.path.dirname(__file__) + f'/tmp_{preprocessor_class.__name__}'
+    os.makedirs(label_dir, exist_ok=True)
+    preprocessor = preprocessor_class(
+        label_encoder_writer=write_label_encoder(label_dir),
+        label_encoder_reader=read_label_encoder(label_dir),
+    )
+    other_input = df_history_placement if preprocessor_class is CPCPreprocessor else df_history_query
+    target_date = pd.Timestamp("2021-02-09")
+
+    preprocessor.preprocess(df_history.copy(), other_input.copy(), is_train=True)
+    expected = preprocessor.preprocess(df_history.copy(), other_input.copy(), is_train=False)
+    result = preprocessor.preprocess(df_history.copy(), other_input.copy(), is_train=False, target_date=target_date)
+
+    expected = expected[expected["date"] == target_date].sort_values("ad_id").reset_index(drop=True)
+    result = result.sort_values("ad_id").reset_index(drop=True)
+    pd.testing.assert_frame_equal(result, expected, check_exact=False)
+
+    # binファイルを削除
+    shutil.rmtree(label_dir)
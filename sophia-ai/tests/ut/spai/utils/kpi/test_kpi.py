@@ -8,13 +8,21 @@ from spai.utils.kpi import (
     agg_feats,
     calc_kpis,
     calc_lag,
+    lag_rows,
     calc_mean,
     calc_placement_kpi,
     merge_agg_feats,
+    merge_agg_feats_at,
     merge_cutoff_feats,
     merge_feats,
+    merge_window_feats,
+    rollup_means,
+    shift_join,
+    grouped_rolling,
+    rolling_window_sums,
     safe_div,
     ewm,
+    segmented_ewm,
     calc_unit_weekly_cpc_for_cap,
 )
 
@@ -131,6 +139,24 @@ def test_merge_agg_feats(df, freq, method, prefix, key_column):
     merge_agg_feats(df, freq, method, prefix, key_column, FEATURE_COLUMNS)
 
 
+@pytest.mark.parametrize("freq, method, prefix", [("7D", "ewm", "ewm7"), ("7D", "rolling", "weekly"),
+                                                  ("28D", "rolling", "monthly")])
+@pytest.mark.parametrize("key_column", ["ad_id", "campaign_id", "unit_id"])
+def test_merge_agg_feats_at(df, freq, method, prefix, key_column):
+    df = pd.concat([df, df.assign(ad_id=2)], ignore_index=True)
+    df = df.drop([3, 10]).reset_index(drop=True)
+    df[agg_feature_cols] = df[agg_feature_cols].astype(float)
+    target_date = df["date"].max()
+
+    expected = merge_agg_feats(df.copy(), freq, method, prefix, key_column, FEATURE_COLUMNS)
+    expected = expected[expected["date"] == target_date].reset_index(drop=True)
+    result = merge_agg_feats_at(
+        df[df["date"] == target_date].reset_index(drop=True), df, target_date,
+        freq, method, prefix, key_column, FEATURE_COLUMNS)
+
+    pd.testing.assert_frame_equal(result[expected.columns], expected, check_exact=False)
+
+
 def test_safe_div():
     x = np.random.randn(5)
     y = np.random.randn(5)
@@ -347,6 +373,153 @@ def test_ewm(df, date_col):
         pd.testing.assert_series_equal(pd.Series(answer, name=col), res[col])
 
 
+@pytest.fixture
+def df_ewm():
+    np.random.seed(42)
+    n = 500
+    df = pd.DataFrame({
+        "key_col": np.random.randint(0, 20, n).astype(float),
+        "date": pd.Timestamp("2022-01-01") + pd.to_timedelta(np.random.randint(0, 60, n), unit="D"),
+        "data_1": np.random.rand(n),
+        "data_2": np.random.rand(n),
+    }, index=np.random.permutation(n))
+    df.loc[df.sample(frac=0.2, random_state=1).index, "data_1"] = np.nan
+    df.loc[df.sample(frac=0.05, random_state=2).index, "key_col"] = np.nan
+    return df.sort_values(["key_col", "date"])
+
+
+@pytest.mark.parametrize("min_periods", [0, 1, 3])
+def test_segmented_ewm(df_ewm, min_periods):
+    df = df_ewm.dropna(subset=["key_col"])
+    halflives = ["4D", "7D", "28D"]
+    res = segmented_ewm(
+        df[["data_1", "data_2"]].to_numpy(), df["date"].to_numpy(), df["key_col"].to_numpy(), halflives, min_periods)
+
+    assert res.shape == (len(halflives), len(df), 2)
+    for i, halflife in enumerate(halflives):
+        expected = df.groupby("key_col", group_keys=False).apply(lambda x: x.ewm(
+            halflife=halflife, times=x["date"].values, min_periods=min_periods)[["data_1", "data_2"]].mean())
+        np.testing.assert_allclose(res[i], expected.to_numpy(), rtol=1e-12)
+
+
+@pytest.mark.parametrize("group_keys", [False, True])
+@pytest.mark.parametrize("dropna", [False, True])
+@pytest.mark.parametrize("keys", ["key_col", ["key_col", "sub_key"]])
+def test_ewm_same_as_apply(df_ewm, group_keys, dropna, keys):
+    # 以前の実装(グループごとのapply)と、indexを含めて同じ結果となる
+    df = df_ewm.assign(sub_key=np.arange(len(df_ewm)) % 3)
+    grp_df = df.sample(frac=1, random_state=3).groupby(keys, group_keys=group_keys, dropna=dropna)
+    expected = grp_df.apply(lambda x: x.ewm(
+        halflife="7D", times=x["date"].values, min_periods=1)[["data_1", "data_2"]].mean())
+
+    pd.testing.assert_frame_equal(ewm(grp_df, "7D", 1, ["data_1", "data_2"]), expected, check_exact=False, rtol=1e-12)
+
+
+@pytest.mark.parametrize("method", ["sum", "mean"])
+@pytest.mark.parametrize("min_periods", [1, 3])
+def test_grouped_rolling(df_ewm, method, min_periods):
+    # 日付の重複・欠損値・キーの欠損を含めて、groupby().rolling()と同じ結果となる
+    df = df_ewm.sample(frac=1, random_state=4)
+    windows = ["1D", "7D", "28D"]
+    res = grouped_rolling(df, "key_col", ["data_1", "data_2"], windows, method, min_periods)
+
+    assert len(res) == len(windows)
+    sorted_df = df.sort_values(["key_col", "date"], kind="stable")
+    for window, result in zip(windows, res):
+        rolling = sorted_df.groupby("key_col").rolling(window, on="date", min_periods=min_periods)
+        expected = pd.DataFrame(
+            getattr(rolling[["data_1", "data_2"]], method)().to_numpy(),
+            index=sorted_df.index[sorted_df["key_col"].notna()], columns=["data_1", "data_2"]).reindex(df.index)
+        pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-10)
+
+
+def test_rolling_window_sums_zero_window():
+    # 窓内の値が全て0の場合、合計は誤差なく0となる
+    values = np.array([[1e10], [0.0], [0.0], [0.5]])
+    times = pd.to_datetime(["2022-01-01", "2022-01-10", "2022-01-11", "2022-01-20"]).to_numpy()
+    sums, counts = rolling_window_sums(values, times, np.zeros(4, dtype=np.int64), ["7D"])
+
+    np.testing.assert_array_equal(sums[0, :, 0], [1e10, 0.0, 0.0, 0.5])
+    np.testing.assert_array_equal(counts[0, :, 0], [1, 1, 2, 1])
+
+
+@pytest.mark.parametrize("key_column", ["ad_id", "campaign_id", "unit_id"])
+def test_merge_window_feats(df, key_column):
+    df = pd.concat([df, df.assign(ad_id=2)], ignore_index=True)
+    windows = [("7D", "ewm", "ewm7"), ("7D", "rolling", "weekly"), ("28D", "rolling", "monthly")]
+
+    expected = df.copy()
+    for freq, method, prefix in windows:
+        expected = merge_agg_feats(expected, freq, method, prefix, key_column, FEATURE_COLUMNS)
+    result = merge_window_feats(df.copy(), windows, key_column, FEATURE_COLUMNS)
+
+    pd.testing.assert_frame_equal(result[expected.columns], expected, check_exact=False, rtol=1e-10)
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_shift_join(df_ewm, shuffle):
+    # 同じキー・日付の行の重複、featsにないキー、並んでいないfeatsを含めて、merge_asofと同じ行を結合する
+    df = df_ewm.dropna(subset=["key_col"]).astype({"key_col": int}).reset_index(drop=True)
+    feats = df.sample(frac=0.5, random_state=5)[["key_col", "date", "data_1"]].rename(columns={"data_1": "feat"})
+    feats = feats[feats["key_col"] != 3]
+    if shuffle:
+        df = df.sample(frac=1, random_state=6)
+
+    expected = pd.merge_asof(
+        df.assign(index=df.index).sort_values(["date", "key_col"]), feats.sort_values(["date", "key_col"]),
+        on="date", by="key_col", allow_exact_matches=False, direction="backward")
+    expected = expected.sort_values("index").reset_index(drop=True).drop("index", axis=1)
+
+    pd.testing.assert_frame_equal(shift_join(df, feats, "key_col"), expected)
+
+
+@pytest.mark.parametrize("fill_value", [None, 0.0])
+def test_rollup_means(df_ewm, fill_value):
+    # 階層ごとにgroupbyした平均と同じ値となる(欠損値のキーも1つのキーとする)
+    df = df_ewm.assign(parent_col=df_ewm["key_col"] // 5)
+    levels = {"key": ["key_col"], "parent": ["parent_col"], "both": ["parent_col", "key_col"]}
+    means = rollup_means(df, levels, ["data_1", "data_2"], fill_value=fill_value)
+
+    assert list(means) == list(levels)
+    values = df[["data_1", "data_2"]] if fill_value is None else df[["data_1", "data_2"]].fillna(fill_value)
+    for name, key_columns in levels.items():
+        expected = pd.concat([df.drop(["data_1", "data_2"], axis=1), values], axis=1).groupby(
+            key_columns + ["date"], dropna=False)[["data_1", "data_2"]].mean().reset_index()
+        pd.testing.assert_frame_equal(means[name], expected, check_exact=False, rtol=1e-12)
+
+
+def test_lag_rows(df_ewm):
+    # 同じキー・日付の行の重複、日付の欠け、欠損値のキーを含めて、対象日の行のラグは全行で計算した値と同じとなる
+    df = df_ewm.assign(parent_col=df_ewm["key_col"] // 5).reset_index(drop=True)
+    target_date = pd.Timestamp("2022-02-20")
+    key_columns_list = [["key_col"], ["parent_col"]]
+
+    def lag_feats(df):
+        for key_columns in key_columns_list:
+            prefix = key_columns[0]
+            df = calc_mean(df, ["data_1"], key_columns=key_columns, prefix=prefix)
+            df = calc_lag(df, f"{prefix}_data_1", days=3, key_columns=key_columns,
+                          col_name_format=f"{prefix}_lag{{day}}_data_1")
+        return df[df["date"] == target_date].reset_index(drop=True)
+
+    rows = lag_rows(df, target_date, key_columns_list, days=3)
+
+    assert len(rows) < len(df[df["date"] <= target_date])
+    pd.testing.assert_frame_equal(lag_feats(rows), lag_feats(df))
+
+
+@pytest.mark.parametrize("key_column", ["campaign_id", "unit_id"])
+def test_merge_window_feats_means(df, key_column):
+    df = pd.concat([df, df.assign(ad_id=2, campaign_id=2)], ignore_index=True)
+    windows = [("7D", "ewm", "ewm7"), ("7D", "rolling", "weekly"), ("28D", "rolling", "monthly")]
+    means = rollup_means(df, {"campaign_id": ["campaign_id"], "unit_id": ["unit_id"]}, agg_feature_cols, fill_value=0.0)
+
+    expected = merge_window_feats(df.copy(), windows, key_column, FEATURE_COLUMNS)
+    result = merge_window_feats(df.copy(), windows, key_column, FEATURE_COLUMNS, means=means[key_column])
+
+    pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-12)
+
+
 def test_calc_unit_weekly_cpc_for_cap(df):
     today = df['date'].max()
     df['portfolio_id'] = df['portfolio_id'].astype(pd.Int64Dtype())
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from spai.utils.kpi import DailyPanel, calc_lag, ewm, grouped_rolling, segmented_ewm
+from spai.utils.kpi.panel import factorize
+
+
+@pytest.fixture
+def daily_df():
+    np.random.seed(0)
+    ads, days = 20, 60
+    df = pd.DataFrame({
+        "ad_type": "sp",
+        "ad_id": np.repeat(np.arange(ads), days).astype(float),
+        "date": np.tile(pd.date_range("2022-01-01", periods=days), ads),
+        "data_1": np.random.rand(ads * days),
+        "data_2": np.random.poisson(3, ads * days).astype(float),
+    })
+    df.loc[df.sample(frac=0.1, random_state=1).index, "data_1"] = np.nan
+    return df.sample(frac=1, random_state=2)
+
+
+def test_from_frame(daily_df):
+    panel = DailyPanel.from_frame(daily_df, ["ad_id"], ["data_1", "data_2"])
+
+    assert panel.values.shape == (20, 60, 2)
+    assert not panel.has_gaps
+    np.testing.assert_array_equal(panel.scatter(panel.values), daily_df[["data_1", "data_2"]].to_numpy())
+
+
+def test_from_frame_not_daily(daily_df):
+    # キーと日付の組が重複する場合と、時刻が0時でない場合は配列にできない
+    assert DailyPanel.from_frame(pd.concat([daily_df, daily_df.head(1)]), ["ad_id"], ["data_1"]) is None
+    hourly_df = daily_df.assign(date=daily_df["date"] + pd.Timedelta("1H"))
+    assert DailyPanel.from_frame(hourly_df, ["ad_id"], ["data_1"]) is None
+
+
+@pytest.mark.parametrize("method", ["sum", "mean"])
+@pytest.mark.parametrize("drop_rows", [False, True])
+def test_grouped_rolling_dense(daily_df, method, drop_rows):
+    # 欠けのある日付を含めて、longと同じ順に足し合わせた同じ値となる
+    if drop_rows:
+        daily_df = daily_df.sample(frac=0.7, random_state=3)
+    daily_df = daily_df.sort_values(["ad_id", "date"])
+    args = (daily_df, "ad_id", ["data_1", "data_2"], ["1D", "7D", "28D"], method, 2)
+
+    for dense, long in zip(grouped_rolling(*args, backend="dense"), grouped_rolling(*args, backend="long")):
+        pd.testing.assert_frame_equal(dense, long, check_exact=True)
+
+
+def test_grouped_rolling_dense_not_daily(daily_df):
+    with pytest.raises(ValueError):
+        grouped_rolling(daily_df, "ad_id", ["data_1"], ["12H"], backend="dense")
+
+
+@pytest.mark.parametrize("min_periods", [0, 3])
+def test_ewm(daily_df, min_periods):
+    daily_df = daily_df.sample(frac=0.7, random_state=3).sort_values(["ad_id", "date"])
+    panel = DailyPanel.from_frame(daily_df, ["ad_id"], ["data_1", "data_2"])
+    expected = segmented_ewm(
+        daily_df[["data_1", "data_2"]].to_numpy(), daily_df["date"].to_numpy(), daily_df["ad_id"].to_numpy(),
+        ["4D", "7D"], min_periods)
+
+    np.testing.assert_allclose(panel.ewm(["4D", "7D"], min_periods), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize("group_keys", [False, True])
+@pytest.mark.parametrize("keys", [["ad_id"], ["ad_type", "ad_id"]])
+def test_ewm_dense(daily_df, group_keys, keys):
+    # 欠けのある日付を含めて、longと同じ値・indexとなる
+    daily_df = daily_df.sample(frac=0.7, random_state=3).sort_values(["ad_id", "date"])
+    grp_df = daily_df.groupby(keys, group_keys=group_keys)
+    args = (grp_df, "7D", 1, ["data_1", "data_2"])
+
+    pd.testing.assert_frame_equal(
+        ewm(*args, backend="dense"), ewm(*args, backend="long"), check_exact=False, rtol=1e-12)
+
+
+def test_ewm_dense_not_daily(daily_df):
+    grp_df = pd.concat([daily_df, daily_df.head(1)]).groupby("ad_id")
+    with pytest.raises(ValueError):
+        ewm(grp_df, "7D", 1, ["data_1"], backend="dense")
+
+
+def test_calc_lag_dense(daily_df):
+    expected = calc_lag(daily_df, "data_1", days=3, col_name_format="lag{day}")
+    result = calc_lag(daily_df, "data_1", days=3, col_name_format="lag{day}", backend="dense")
+
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+
+def test_calc_lag_dense_with_gaps(daily_df):
+    daily_df = daily_df[daily_df["date"] != "2022-01-10"]
+    with pytest.raises(ValueError):
+        calc_lag(daily_df, "data_1", days=3, col_name_format="lag{day}", backend="dense")
+
+
+@pytest.mark.parametrize("values", [[1.0, np.nan, 2.0, 1.0], ["a", None, "b", "a"]])
+def test_factorize(values):
+    codes, uniques = factorize(values)
+    np.testing.assert_array_equal(codes, [0, -1, 1, 0])
+    assert len(uniques) == 2
+
+    # 欠損値は最後のキーとする(pandas>=1.5のuse_na_sentinel=Falseと同じ)
+    codes, uniques = factorize(values, dropna=False)
+    np.testing.assert_array_equal(codes, [0, 2, 1, 0])
+    assert len(uniques) == 3 and pd.isna(uniques[2])
@@ -7,8 +7,10 @@ from pytz import timezone
 import pandas as pd
 
 from spai.service.spa.service import SPAPredictionService
-from spai.service.spa.preprocess import SPAPreprocessor
-from spai.service.spa.estimator import SPAEstimator
+from spai.service.spa.preprocess import SPAPreprocessor, get_dtypes
+from spai.service.spa.estimator import SPAEstimator, SPAModel
+from spai.service.spa.config import FEATURE_COLUMNS, CATEGORICAL_COLUMNS
+from spai.ai.bundle import ModelBundle
 
 from common_module.aws_util import write_df_to_s3
 from common_module.bigquery_util import BigQueryService
@@ -17,8 +19,8 @@ from common_module.logger_util import get_custom_logger
 from common_module.system_util import get_s3_key
 from common_module.datamanage_util import (
     output_preprocess_to_s3_manager,
-    write_latest_model_manager,
-    write_latest_labelencoder_manager,
+    write_latest_bundle_manager,
+    SPA_LATEST_BUNDLE_KEY,
 )
 
 
@@ -112,13 +114,24 @@ def train(date: str):
 
     # SPA train 前処理＆実行
     logger.info("start fit")
+    # モデルとLabelEncoderは1つのbundleにまとめ、モデルの学習後に1回で出力する
+    bundle = ModelBundle({
+        "kpi": "spa",
+        "version": today.strftime("%Y-%m-%d"),
+        "model_class": SPAModel.__name__,
+        "feature_columns": FEATURE_COLUMNS,
+        "categorical_columns": CATEGORICAL_COLUMNS,
+        "input_dtypes": get_dtypes()[0],
+    })
+    label_encoder_writer, model_writer = write_latest_bundle_manager(
+        BUCKET,
+        get_s3_key("spa/model/", today, "bundle.bin"),
+        SPA_LATEST_BUNDLE_KEY,
+        bundle,
+    )
     SPAPredictionService(
         preprocessor=SPAPreprocessor(
-            label_encoder_writer=write_latest_labelencoder_manager(
-                BUCKET,
-                "spa/model/latest_le/",
-                f"spa/preprocess/{today.year}/{today.month:02}/{today.day:02}/le/"
-            ),
+            label_encoder_writer=label_encoder_writer,
             label_encoder_reader=None,
             output=output_preprocess_to_s3_manager(
                 BUCKET, f"spa/preprocess/{today.year}/{today.month:02}/{today.day:02}/train_data.csv",
@@ -127,11 +140,7 @@ def train(date: str):
             batch_size=DASK_BATCH_SIZE,
         ),
         estimator=SPAEstimator(
-            model_writer=write_latest_model_manager(
-                BUCKET,
-                get_s3_key("spa/model/", today, "model.bin"),
-                "spa/model/latest.bin",
-            ),
+            model_writer=model_writer,
             is_tune=True,
         ),
     ).train(df, df_keyword_queries)